@@ -35,6 +35,10 @@ def create_app():
         load_dotenv()
     app = Flask(__name__)
     
+    # JSON responses: orjson when installed, stdlib otherwise
+    from app.utils.json_provider import get_json_provider_class
+    app.json = get_json_provider_class()(app)
+    
     # Setup logging
     setup_logging(app)
     
@@ -47,6 +51,25 @@ def create_app():
     bcrypt.init_app(app)
     init_s3(app)
     
+    # Create the indexes the model queries rely on and report drift
+    if os.getenv("ENSURE_INDEXES_ON_STARTUP", "true").lower() == "true":
+        ensure_app_indexes(app)
+    
+    # CLI commands (flask indexes ensure / drift, flask orders ...)
+    from app.cli import register_cli
+    register_cli(app)
+    
+    # Expire unpaid orders in-process; off by default. `flask orders expiry-worker` is the
+    # deployment path: under gunicorn every worker would start its own sweeper
+    if os.getenv("ORDER_EXPIRY_SCHEDULER", "false").lower() == "true":
+        if int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+            app.logger.warning(
+                "OrderExpirySchedulerSkipped | reason=MultipleWorkers | hint=run `flask orders expiry-worker`"
+            )
+        else:
+            from app.services.order_expiry_service import OrderExpiryService
+            OrderExpiryService.startScheduler(app)
+    
     # Initialize Firebase
     if not firebase_admin._apps:
         firebase_admin.initialize_app(cred)
@@ -91,4 +114,15 @@ def create_app():
     from app.routes.user.payment_routes import user_payment_bp
     app.register_blueprint(user_payment_bp, url_prefix="/api/users/payment")
        
-    return app
\ No newline at end of file
+    return app
+
+def ensure_app_indexes(app):
+    """Create declared indexes and log any drift, without blocking startup on failure"""
+    from app.core.indexes import ensure_indexes, find_index_drift
+    try:
+        ensure_indexes(mongo.db, app.logger)
+        drift = find_index_drift(mongo.db)
+        if drift:
+            app.logger.warning("IndexDriftDetected | drift=%s", drift)
+    except Exception as e:
+        app.logger.error(f"Failed to ensure MongoDB indexes: {e}")
@@ -0,0 +1,69 @@
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from app.extensions import mongo
+from app.core.constansts import ORDER_EXPIRY_INTERVAL_SECONDS
+from app.core.indexes import ensure_indexes, find_index_drift
+
+indexes_cli = AppGroup("indexes", help="Manage MongoDB indexes.")
+orders_cli = AppGroup("orders", help="Maintain order documents.")
+
+@indexes_cli.command("ensure")
+def ensure_indexes_command():
+    """Create the indexes declared in app/core/indexes.py"""
+    result = ensure_indexes(mongo.db, current_app.logger)
+    click.echo(json.dumps(result, indent=2))
+    if result["failed"]:
+        raise SystemExit(1)
+
+@indexes_cli.command("drift")
+def index_drift_command():
+    """Report differences between declared and live indexes"""
+    drift = find_index_drift(mongo.db)
+    if not drift:
+        click.echo("No index drift.")
+        return
+    click.echo(json.dumps(drift, indent=2))
+    raise SystemExit(1)
+
+@orders_cli.command("backfill-payment-fields")
+@click.option("--batch-size", default=500, show_default=True, help="Orders updated per bulk write.")
+def backfill_payment_fields_command(batch_size):
+    """Copy paymentStatus/paymentMode from the latest payment onto each order"""
+    from app.services.payment_service import PaymentService
+    result = PaymentService.syncOrderPaymentFields(batchSize=batch_size)
+    click.echo(json.dumps(result, indent=2))
+
+@orders_cli.command("verify-payment-fields")
+def verify_payment_fields_command():
+    """Report orders whose paymentStatus/paymentMode differ from their latest payment"""
+    from app.services.payment_service import PaymentService
+    result = PaymentService.syncOrderPaymentFields(dryRun=True)
+    click.echo(json.dumps(result, indent=2))
+    if result["mismatched"]:
+        raise SystemExit(1)
+
+@orders_cli.command("expiry-worker")
+@click.option("--interval", default=ORDER_EXPIRY_INTERVAL_SECONDS, show_default=True, help="Seconds between sweeps.")
+@click.option("--once", is_flag=True, help="Run a single sweep and exit.")
+def expiry_worker_command(interval, once):
+    """Expire PENDING_PAYMENT orders past their expireAt (standalone worker)"""
+    from app.services.order_expiry_service import OrderExpiryService
+    while True:
+        run = OrderExpiryService.sweep(logger=current_app.logger)
+        click.echo(json.dumps(run))
+        if once:
+            return
+        time.sleep(interval)
+
+@orders_cli.command("expiry-metrics")
+def expiry_metrics_command():
+    """Show the expiry sweeper metrics (totals and last run, shared by all sweepers)"""
+    from app.services.order_expiry_service import OrderExpiryService
+    click.echo(json.dumps(OrderExpiryService.metrics(), indent=2))
+
+def register_cli(app):
+    app.cli.add_command(indexes_cli)
+    app.cli.add_command(orders_cli)
@@ -7,6 +7,71 @@ MENU_ITEMS_COLLECTION = "menuItems"
 ORDERS_COLLECTION = "orders"
 REVIEWS_COLLECTION = "reviews"
 
+# ------------------------
+# Pagination
+# ------------------------
+# count=estimate stops counting matching documents after this many
+ESTIMATED_COUNT_CAP = 1000
+
+# ------------------------
+# Menu Items
+# ------------------------
+# Maximum number of items in one bulk stock update request
+MAX_BULK_STOCK_UPDATES = 200
+
+# ------------------------
+# Cart
+# ------------------------
+# Conditional cart updates are retried this many times when a concurrent request changes the cart
+CART_UPDATE_MAX_ATTEMPTS = 3
+
+# ------------------------
+# Orders
+# ------------------------
+# Order events kept in memory for resuming /streamOrders when change streams are unavailable
+ORDER_EVENTS_BUFFER_SIZE = 1000
+# Idle /streamOrders connections get a keep-alive comment this often
+ORDER_STREAM_HEARTBEAT_SECONDS = 15
+# updatedSince queries reach back this far before the watermark, to catch writes
+# committed late or stamped by a worker with a slightly slow clock
+ORDER_DELTA_OVERLAP_SECONDS = 5
+# Maximum number of changed orders returned by one updatedSince request
+ORDER_DELTA_MAX_RESULTS = 500
+# Deleted orders are reported to updatedSince clients for this long
+ORDER_TOMBSTONE_TTL_SECONDS = 7 * 24 * 60 * 60
+# Expired PENDING_PAYMENT orders handled per transaction by the expiry sweeper
+ORDER_EXPIRY_BATCH_SIZE = 200
+# Upper bound of batches per sweep, so one run cannot hold the worker indefinitely
+ORDER_EXPIRY_MAX_BATCHES = 50
+# Pause between sweeps of the scheduler job and the expiry worker
+ORDER_EXPIRY_INTERVAL_SECONDS = 30
+
+# ------------------------
+# Twilio Verify
+# ------------------------
+# Timeouts of each call to Twilio Verify
+TWILIO_VERIFY_CONNECT_TIMEOUT_SECONDS = 3.05
+TWILIO_VERIFY_READ_TIMEOUT_SECONDS = 10
+# Extra attempts for calls Twilio did not act on (connection failures, 429, 502-504)
+TWILIO_VERIFY_MAX_RETRIES = 2
+# Keep-alive connections kept to Twilio per process
+TWILIO_VERIFY_POOL_SIZE = 10
+# Consecutive failures that open the circuit, and how long it stays open
+TWILIO_VERIFY_BREAKER_FAILURE_THRESHOLD = 5
+TWILIO_VERIFY_BREAKER_RESET_SECONDS = 30
+
+# ------------------------
+# Caching
+# ------------------------
+RESTAURANT_SUMMARY_CACHE_TTL_SECONDS = 60
+RESTAURANT_SUMMARY_CACHE_MAX_SIZE = 10_000
+# Firebase phone -> uid lookups of the phone auth flows (found / not found)
+AUTH_DIRECTORY_POSITIVE_TTL_SECONDS = 300
+AUTH_DIRECTORY_NEGATIVE_TTL_SECONDS = 30
+AUTH_DIRECTORY_CACHE_MAX_SIZE = 10_000
+# Threads running Firebase lookups next to the MongoDB query
+AUTH_DIRECTORY_LOOKUP_WORKERS = 8
+
 # ------------------------
 # AWS S3 Configuration
 # ------------------------
@@ -18,6 +83,19 @@ S3_FOLDER_USERS = "users"
 S3_FOLDER_MENU_ITEMS = "menu_items"
 S3_FOLDER_PROFILE_PICS = "profile_pictures"
 
+# Concurrent image uploads per process
+S3_UPLOAD_WORKERS = 8
+# Images below this size are sent in a single PutObject
+S3_MULTIPART_THRESHOLD_BYTES = 16 * 1024 * 1024
+# Direct-to-S3 uploads (presigned POST)
+S3_PRESIGNED_POST_EXPIRES_SECONDS = 600
+S3_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Resized WebP copies of menu item images (longest side in px, largest first)
+IMAGE_VARIANT_SIZES = {"full": 1600, "medium": 800, "thumb": 240}
+IMAGE_VARIANT_WEBP_QUALITY = 80
+IMAGE_VARIANT_WORKERS = 4
+
 # ------------------------
 # Other Constants (optional)
 # ------------------------
@@ -0,0 +1,130 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+from app.core.constansts import ORDER_TOMBSTONE_TTL_SECONDS
+
+# ------------------------
+# Indexes required by the model queries, per collection.
+# Applied by ensure_indexes() at startup and by `flask indexes ensure`.
+# ------------------------
+INDEXES = {
+    "users": [
+        # User.find_by_phone (phone login / registration checks)
+        IndexModel([("phone", ASCENDING)], name="phone_1"),
+        # User.find_by_email; unique among string emails only: phone signups store email None,
+        # which a plain unique index would count as one shared value
+        IndexModel(
+            [("email", ASCENDING)], name="email_1", unique=True,
+            partialFilterExpression={"email": {"$type": "string"}}
+        ),
+    ],
+    "restaurants": [
+        # Restaurant.find_by_phone
+        IndexModel([("phone", ASCENDING)], name="phone_1"),
+        # Restaurant.find_by_email; unique among string emails only, as for users
+        IndexModel(
+            [("email", ASCENDING)], name="email_1", unique=True,
+            partialFilterExpression={"email": {"$type": "string"}}
+        ),
+        # Restaurant.find_by_city (city feed)
+        IndexModel([("address.city", ASCENDING)], name="address.city_1"),
+    ],
+    "menuItems": [
+        # MenuItem._find_items_page: equality/$in on restaurantId, sort/keyset on (created_at, _id)
+        IndexModel(
+            [("restaurantId", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="restaurantId_1_created_at_-1__id_-1"
+        ),
+        # MenuItem.find_item_by_name
+        IndexModel([("restaurantId", ASCENDING), ("name", ASCENDING)], name="restaurantId_1_name_1"),
+    ],
+    "carts": [
+        # Cart.find_cart_by_userId; unique: one cart per user (Cart.create_cart_if_absent relies on it)
+        IndexModel([("userId", ASCENDING)], name="userId_1", unique=True),
+    ],
+    "orders": [
+        # Order.find_orders_by_restaurantId: restaurantId + status $in, sort/keyset on (createdAt, _id)
+        IndexModel(
+            [("restaurantId", ASCENDING), ("status", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)],
+            name="restaurantId_1_status_1_createdAt_-1__id_-1"
+        ),
+        # Order.find_pending_order_by_userId
+        IndexModel([("userId", ASCENDING), ("status", ASCENDING)], name="userId_1_status_1"),
+        # Order.find_order_by_paymentId
+        IndexModel([("paymentId", ASCENDING)], name="paymentId_1"),
+        # Order.find_expired_pending_orders (expiry sweeper)
+        IndexModel([("status", ASCENDING), ("expireAt", ASCENDING)], name="status_1_expireAt_1"),
+        # Order.find_orders_by_restaurantId(updated_since=...): dashboard delta sync
+        IndexModel([("restaurantId", ASCENDING), ("updatedAt", ASCENDING)], name="restaurantId_1_updatedAt_1"),
+    ],
+    "orderTombstones": [
+        # Order.find_tombstones_since
+        IndexModel([("restaurantId", ASCENDING), ("deletedAt", ASCENDING)], name="restaurantId_1_deletedAt_1"),
+        # Tombstones expire once no delta client can still need them
+        IndexModel([("deletedAt", ASCENDING)], name="deletedAt_1", expireAfterSeconds=ORDER_TOMBSTONE_TTL_SECONDS),
+    ],
+    "payments": [
+        # Payment.find_payment_by_orderId / find_payments_by_orderIds
+        IndexModel([("orderId", ASCENDING)], name="orderId_1"),
+    ],
+}
+
+def ensure_indexes(db, logger=None):
+    """
+    Create every declared index. Indexes that already exist with the same
+    definition are left untouched, so this is safe to run on every start.
+    A collection that fails (e.g. an existing index with other options under
+    the same name) is reported and the remaining collections are still processed.
+    Returns {"created": {collection: [index names]}, "failed": {collection: error}}
+    """
+    created = {}
+    failed = {}
+    for collection_name, indexes in INDEXES.items():
+        try:
+            created[collection_name] = db[collection_name].create_indexes(indexes)
+        except PyMongoError as e:
+            failed[collection_name] = str(e)
+            if logger:
+                logger.error(
+                    "EnsureIndexesFailed | collection=%s | error=%s",
+                    collection_name, str(e)
+                )
+            continue
+        if logger:
+            logger.info(
+                "EnsureIndexesSuccess | collection=%s | indexes=%s",
+                collection_name, created[collection_name]
+            )
+    return {"created": created, "failed": failed}
+
+def find_index_drift(db):
+    """
+    Compare the declared indexes with the live database.
+    Returns {collection: {"missing": [...], "mismatched": [...], "unexpected": [...]}}
+    only for collections that drifted. Indexes on undeclared collections are
+    reported as unexpected.
+    """
+    drift = {}
+    collection_names = set(db.list_collection_names()) | set(INDEXES)
+
+    for collection_name in sorted(collection_names):
+        declared = {
+            index.document["name"]: list(index.document["key"].items())
+            for index in INDEXES.get(collection_name, [])
+        }
+        live = {
+            name: [(field, direction) for field, direction in info["key"]]
+            for name, info in db[collection_name].index_information().items()
+            if name != "_id_"
+        }
+
+        missing = [name for name in declared if name not in live]
+        mismatched = [name for name in declared if name in live and live[name] != declared[name]]
+        unexpected = [name for name in live if name not in declared]
+
+        if missing or mismatched or unexpected:
+            drift[collection_name] = {
+                "missing": missing,
+                "mismatched": mismatched,
+                "unexpected": unexpected,
+            }
+    return drift
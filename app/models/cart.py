@@ -2,8 +2,11 @@ from datetime import datetime
 from enum import Enum
 from typing import Any, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app import mongo
 from app.utils.mongo_utils import flatten
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
 from app.utils.serializers import serialize_doc
 
 class CartStatus(Enum):
@@ -33,19 +36,32 @@ class Cart:
             "updatedAt": self.updatedAt,
         }
         result = mongo.db.carts.insert_one(cart_data)
+        forget_in_request("carts")
         return str(result.inserted_id)
     
     @staticmethod
-    def find_cart_by_id(cartId):
-        """Find cart by cart id"""
-        cart = mongo.db.carts.find_one({"_id": ObjectId(cartId)})
-        return serialize_doc(cart) if cart else None    
+    def exists_for_user(userId: str):
+        """Check that the user has a cart (covered by the userId index, memoized per request)"""
+        return memoize_in_request(
+            "carts", ("userId", userId),
+            lambda: mongo.db.carts.find_one({"userId": userId}, {"_id": 0, "userId": 1}) is not None
+        )
+    
+    @staticmethod
+    def find_cart_by_id(cartId, projection=None):
+        """Find cart by cart id (full documents are served from the request identity map)"""
+        def load():
+            cart = mongo.db.carts.find_one({"_id": ObjectId(cartId)}, projection)
+            return serialize_doc(cart) if cart else None
+        return load_in_request("carts", ("_id", cartId), load, bypass=projection is not None)    
     
     @staticmethod
-    def find_cart_by_userId(userId: str,session: Optional[Any]=None):
-        """Find cart by user id"""
-        cart = mongo.db.carts.find_one({"userId": userId},session=session)
-        return serialize_doc(cart) if cart else None 
+    def find_cart_by_userId(userId: str,session: Optional[Any]=None, projection=None):
+        """Find cart by user id (full documents outside transactions are served from the request identity map)"""
+        def load():
+            cart = mongo.db.carts.find_one({"userId": userId}, projection, session=session)
+            return serialize_doc(cart) if cart else None
+        return load_in_request("carts", ("userId", userId), load, bypass=session is not None or projection is not None) 
     
     @staticmethod
     def lock_cart(cartId: str,session: Any):
@@ -60,6 +76,7 @@ class Cart:
             {"$set": flattened_data},
             session = session
         )
+        forget_in_request("carts")
         return result.modified_count > 0
     
     @staticmethod
@@ -75,8 +92,20 @@ class Cart:
             {"$set": flattened_data},
             session = session
         )
+        forget_in_request("carts")
         return result.modified_count > 0
     
+    @staticmethod
+    def unlock_carts(cartIds, session: Any):
+        """Unlock several carts in one write, returns the modified count"""
+        result = mongo.db.carts.update_many(
+            {"_id": {"$in": [ObjectId(cartId) for cartId in cartIds]}, "status": CartStatus.LOCKED.value},
+            {"$set": {"status": CartStatus.ACTIVE.value, "updatedAt": datetime.utcnow()}},
+            session=session
+        )
+        forget_in_request("carts")
+        return result.modified_count
+    
     @staticmethod
     def update_cart(cartId, update_data):
         """Update cart data"""
@@ -87,10 +116,180 @@ class Cart:
             {"_id": ObjectId(cartId)},
             {"$set": flattened_data}
         )
+        forget_in_request("carts")
         return result.modified_count > 0
     
+    @staticmethod
+    def update_and_fetch(cartId, update_data, projection=None):
+        """Update cart data and return the updated cart in one round trip (None if not found)"""
+        update_data['updatedAt'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        cart = mongo.db.carts.find_one_and_update(
+            {"_id": ObjectId(cartId)},
+            {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("carts")
+        return serialize_doc(cart) if cart else None
+    
+    @staticmethod
+    def increment_item_quantity(userId: str, menuItemId: str, price, quantity: int = 1, restaurantId: Optional[str] = None):
+        """
+        Atomically add `quantity` units to an existing cart line priced at `price`.
+        Matches only an ACTIVE cart holding the line, so the check and the write
+        happen in one round trip. Returns the updated cart, or None if nothing matched.
+        """
+        query = {
+            "userId": userId,
+            "status": CartStatus.ACTIVE.value,
+            "items": {"$elemMatch": {"menuItemId": menuItemId, "price": price}}
+        }
+        if restaurantId is not None:
+            query["restaurantId"] = restaurantId
+        cart = mongo.db.carts.find_one_and_update(
+            query,
+            {
+                "$inc": {
+                    "items.$.quantity": quantity,
+                    "items.$.totalPrice": price * quantity,
+                    "totalAmount": price * quantity
+                },
+                "$set": {"updatedAt": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("carts")
+        return serialize_doc(cart) if cart else None
+    
+    @staticmethod
+    def decrement_item_quantity(userId: str, menuItemId: str, price):
+        """
+        Atomically remove one unit from a cart line priced at `price` that has more than one unit.
+        Returns the updated cart, or None if nothing matched.
+        """
+        cart = mongo.db.carts.find_one_and_update(
+            {
+                "userId": userId,
+                "status": CartStatus.ACTIVE.value,
+                "items": {"$elemMatch": {"menuItemId": menuItemId, "price": price, "quantity": {"$gt": 1}}}
+            },
+            {
+                "$inc": {
+                    "items.$.quantity": -1,
+                    "items.$.totalPrice": -price,
+                    "totalAmount": -price
+                },
+                "$set": {"updatedAt": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("carts")
+        return serialize_doc(cart) if cart else None
+    
+    @staticmethod
+    def push_item(userId: str, restaurantId: str, item: dict):
+        """
+        Atomically append a new line to the user's ACTIVE cart of the same restaurant,
+        only if the menu item is not already in it.
+        Returns the updated cart, or None if nothing matched.
+        """
+        cart = mongo.db.carts.find_one_and_update(
+            {
+                "userId": userId,
+                "restaurantId": restaurantId,
+                "status": CartStatus.ACTIVE.value,
+                "items.menuItemId": {"$ne": item["menuItemId"]}
+            },
+            {
+                "$push": {"items": item},
+                "$inc": {"totalAmount": item["totalPrice"]},
+                "$set": {"updatedAt": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("carts")
+        return serialize_doc(cart) if cart else None
+    
+    @staticmethod
+    def remove_item(userId: str, menuItemId: str, last_unit_only: bool = False):
+        """
+        Atomically remove a line from the user's ACTIVE cart and recompute totalAmount
+        from the remaining lines (pipeline update).
+        If last_unit_only is True the line is removed only while its quantity is 1.
+        Returns the updated cart, or None if nothing matched.
+        """
+        line_query = {"menuItemId": menuItemId}
+        if last_unit_only:
+            line_query["quantity"] = {"$lte": 1}
+        cart = mongo.db.carts.find_one_and_update(
+            {
+                "userId": userId,
+                "status": CartStatus.ACTIVE.value,
+                "items": {"$elemMatch": line_query}
+            },
+            [
+                {"$set": {
+                    "items": {"$filter": {
+                        "input": "$items",
+                        "cond": {"$ne": ["$$this.menuItemId", menuItemId]}
+                    }},
+                    "updatedAt": datetime.utcnow()
+                }},
+                {"$set": {"totalAmount": {"$sum": "$items.totalPrice"}}}
+            ],
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("carts")
+        return serialize_doc(cart) if cart else None
+    
+    @staticmethod
+    def create_cart_if_absent(restaurantId: str, userId: str, item: dict):
+        """
+        Create the user's cart holding `item` only if the user has no cart yet (upsert).
+        Returns the created cart, or None if a cart already existed.
+        Race-free through the unique carts.userId_1 index: of two concurrent first adds,
+        one upsert inserts and the other gets a DuplicateKeyError (reported as "already exists").
+        """
+        now = datetime.utcnow()
+        cart_data = {
+            "restaurantId": restaurantId,
+            "userId": userId,
+            "items": [item],
+            "totalAmount": item["totalPrice"],
+            "status": CartStatus.ACTIVE.value,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        try:
+            result = mongo.db.carts.update_one(
+                {"userId": userId},
+                {"$setOnInsert": cart_data},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            result = None
+        forget_in_request("carts")
+        if result is None or result.upserted_id is None:
+            return None
+        cart_data["_id"] = result.upserted_id
+        return serialize_doc(cart_data)
+    
+    @staticmethod
+    def delete_cart_if_empty(cartId: str):
+        """Delete the cart only if it is ACTIVE and has no items left"""
+        result = mongo.db.carts.delete_one({
+            "_id": ObjectId(cartId),
+            "status": CartStatus.ACTIVE.value,
+            "items": {"$size": 0}
+        })
+        forget_in_request("carts")
+        return result.deleted_count > 0
+    
     @staticmethod
     def delete_cart(cartId, session: Any):
         """Delete Cart from Carts collection of MongoDB"""
         result = mongo.db.carts.delete_one({"_id": ObjectId(cartId)}, session=session)
+        forget_in_request("carts")
         return result.deleted_count > 0
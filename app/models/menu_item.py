@@ -1,6 +1,10 @@
 from flask import current_app
 from app import mongo
-from app.utils.mongo_utils import flatten
+from app.core.constansts import ESTIMATED_COUNT_CAP
+from app.utils.mongo_utils import find_page_with_total, flatten
+from app.utils.pagination import keyset_condition
+from pymongo import ReturnDocument, UpdateOne
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
 from flask_bcrypt import Bcrypt
 from bson.objectid import ObjectId
 from datetime import datetime
@@ -15,6 +19,11 @@ def get_bcrypt():
     return current_app.extensions['bcrypt']
 
 class MenuItem:
+    # Named projections (views)
+    # Price and stock checked when adding to / changing the cart
+    STOCK_VIEW = {"restaurantId": 1, "price": 1, "availableQuantity": 1}
+    ID_VIEW = {"_id": 1}
+    
     def __init__(self, restaurantId, name, description, price, images, ingredients):
         self.restaurantId = restaurantId
         self.name = name
@@ -40,85 +49,87 @@ class MenuItem:
             "updated_at": self.updated_at,
         }
         result = mongo.db.menuItems.insert_one(item_data)
+        forget_in_request("menuItems")
         return str(result.inserted_id)
     
     @staticmethod
-    def find_item_by_id(item_id):
-        """Find item by item id"""
-        item = mongo.db.menuItems.find_one({"_id": ObjectId(item_id)})
-        return serialize_doc(item) if item else None
+    def exists(item_id):
+        """Check that a menu item exists (_id-only probe, memoized per request)"""
+        return memoize_in_request(
+            "menuItems", ("_id", item_id),
+            lambda: mongo.db.menuItems.find_one({"_id": ObjectId(item_id)}, MenuItem.ID_VIEW) is not None
+        )
+    
+    @staticmethod
+    def exists_by_name(restaurant_id, name):
+        """Check that a restaurant already has an item with this name (covered by the restaurantId_1_name_1 index)"""
+        return memoize_in_request(
+            "menuItems", ("name", restaurant_id, name),
+            lambda: mongo.db.menuItems.find_one(
+                {"restaurantId": restaurant_id, "name": name}, {"_id": 0, "restaurantId": 1, "name": 1}
+            ) is not None
+        )
+    
+    @staticmethod
+    def find_item_by_id(item_id, projection=None):
+        """Find item by item id (full documents are served from the request identity map)"""
+        def load():
+            item = mongo.db.menuItems.find_one({"_id": ObjectId(item_id)}, projection)
+            return serialize_doc(item) if item else None
+        return load_in_request("menuItems", ("_id", item_id), load, bypass=projection is not None)
+    
+    @staticmethod
+    def find_items_by_ids(item_ids, projection=None):
+        """Find menuItems by a list of item ids with a single $in query"""
+        object_ids = [ObjectId(item_id) for item_id in set(item_ids)]
+        items = list(mongo.db.menuItems.find({"_id": {"$in": object_ids}}, projection))
+        return serialize_doc(items)
     
     @staticmethod
-    def find_item_by_name(restaurant_id, name):
+    def find_item_by_name(restaurant_id, name, projection=None):
         """Find item by item id"""
-        item = mongo.db.menuItems.find_one({"restaurantId": restaurant_id, "name": name})
+        item = mongo.db.menuItems.find_one({"restaurantId": restaurant_id, "name": name}, projection)
         return serialize_doc(item) if item else None
         
     @staticmethod
-    def find_items_by_restaurant_id(restaurant_id, skip=None, limit=None, count_only=False):
+    def find_items_page_by_restaurant_id(restaurant_id, skip=None, limit=None, cursor=None, count_mode="exact", projection=None):
         """
-        Find menuItems by restaurant Id with pagination support
+        Find one page of menuItems of a restaurant and the total count (see find_page_with_total)
         Args:
             restaurant_id: ID of the restaurant
             skip: Number of documents to skip (for pagination)
             limit: Maximum number of documents to return (for pagination)
-            count_only: If True, returns only the count of documents
+            cursor: Opaque keyset cursor of the previous page (takes precedence over skip)
+            projection: Fields to return (must keep created_at when paging by cursor)
+            count_mode: "exact", "estimate" (capped count) or "none" (no count)
         Returns:
-            If count_only is True: returns the total count
-            If count_only is False: returns the paginated items
+            (items, total_count, total_is_exact), total_count is None when not counted
         """
-        query = {"restaurantId": restaurant_id}
-        
-        if count_only:
-            return mongo.db.menuItems.count_documents(query)
-            
-        # Create the base cursor
-        cursor = mongo.db.menuItems.find(query)
-        
-        # Apply pagination if specified
-        if skip is not None:
-            cursor = cursor.skip(skip)
-        if limit is not None:
-            cursor = cursor.limit(limit)
-            
-        # Add sorting by creation date (newest first)
-        cursor = cursor.sort("created_at", -1)
-            
-        items = list(cursor)
-        return serialize_doc(items)
+        return MenuItem._find_items_page({"restaurantId": restaurant_id}, skip, limit, cursor, count_mode, projection)
     
     @staticmethod
-    def find_items_by_restaurant_ids(restaurant_ids, skip=None, limit=None, count_only=False):
+    def find_items_page_by_restaurant_ids(restaurant_ids, skip=None, limit=None, cursor=None, count_mode="exact", projection=None):
         """
-        Find menuItems by restaurant Id with pagination support
-        Args:
-            restaurant_id: ID of the restaurant
-            skip: Number of documents to skip (for pagination)
-            limit: Maximum number of documents to return (for pagination)
-            count_only: If True, returns only the count of documents
+        Find one page of menuItems of several restaurants and the total count (see find_page_with_total)
         Returns:
-            If count_only is True: returns the total count
-            If count_only is False: returns the paginated items
+            (items, total_count, total_is_exact), total_count is None when not counted
         """
-        query = {"restaurantId": {"$in": restaurant_ids}}
-        
-        if count_only:
-            return mongo.db.menuItems.count_documents(query)
-            
-        # Create the base cursor
-        cursor = mongo.db.menuItems.find(query)
-        
-        # Apply pagination if specified
-        if skip is not None:
-            cursor = cursor.skip(skip)
-        if limit is not None:
-            cursor = cursor.limit(limit)
-            
-        # Add sorting by creation date (newest first)
-        cursor = cursor.sort("created_at", -1)
-            
-        items = list(cursor)
-        return serialize_doc(items)
+        return MenuItem._find_items_page({"restaurantId": {"$in": restaurant_ids}}, skip, limit, cursor, count_mode, projection)
+    
+    @staticmethod
+    def _find_items_page(query, skip, limit, cursor, count_mode, projection=None):
+        items, total_count, total_is_exact = find_page_with_total(
+            mongo.db.menuItems,
+            query,
+            sort=[("created_at", -1), ("_id", -1)],
+            skip=None if cursor else skip,
+            limit=limit,
+            page_query=keyset_condition("created_at", cursor) if cursor else None,
+            count_mode=count_mode,
+            count_cap=ESTIMATED_COUNT_CAP,
+            projection=projection
+        )
+        return serialize_doc(items), total_count, total_is_exact
     
     @staticmethod
     def update_item(item_id, update_data):
@@ -130,10 +141,159 @@ class MenuItem:
             {"_id": ObjectId(item_id)}, 
             {"$set": flattened_data}
         )
+        forget_in_request("menuItems")
         return result.modified_count > 0    
     
+    @staticmethod
+    def update_and_fetch(item_id, update_data, projection=None):
+        """Update item data and return the updated item in one round trip (None if not found)"""
+        update_data['updated_at'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        item = mongo.db.menuItems.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("menuItems")
+        return serialize_doc(item) if item else None
+    
+    @staticmethod
+    def set_image_variants(item_id, variants):
+        """
+        Record the {source, full, medium, thumb} variant URLs of some of an item's images,
+        replacing older entries for the same sources. Entries whose source is no longer in
+        images are dropped, so a variant finishing after its image was removed is not kept.
+        Returns the updated item (None if not found).
+        """
+        sources = [variant["source"] for variant in variants]
+        current_images = {"$ifNull": ["$images", []]}
+        item = mongo.db.menuItems.find_one_and_update(
+            {"_id": ObjectId(item_id)},
+            [{"$set": {"imageVariants": {"$concatArrays": [
+                {"$filter": {
+                    "input": {"$ifNull": ["$imageVariants", []]},
+                    "cond": {"$and": [
+                        {"$not": [{"$in": ["$$this.source", sources]}]},
+                        {"$in": ["$$this.source", current_images]}
+                    ]}
+                }},
+                {"$filter": {
+                    "input": {"$literal": variants},
+                    "cond": {"$in": ["$$this.source", current_images]}
+                }}
+            ]}}}],
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("menuItems")
+        return serialize_doc(item) if item else None
+
+    @staticmethod
+    def adjust_available_quantity(item_id, delta: int, restaurant_id=None):
+        """
+        Atomically add `delta` (may be negative) to availableQuantity.
+        A decrease only matches while availableQuantity >= -delta, so stock never goes below zero.
+        Returns the updated item, or None if the item does not exist or has too little stock.
+        """
+        query = {"_id": ObjectId(item_id)}
+        if restaurant_id is not None:
+            query["restaurantId"] = restaurant_id
+        if delta < 0:
+            query["availableQuantity"] = {"$gte": -delta}
+        item = mongo.db.menuItems.find_one_and_update(
+            query,
+            {
+                "$inc": {"availableQuantity": delta},
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("menuItems")
+        return serialize_doc(item) if item else None
+    
+    @staticmethod
+    def bulk_update_available_quantities(restaurant_id, updates):
+        """
+        Set or adjust availableQuantity of many items of a restaurant with one bulk_write.
+        Args:
+            restaurant_id: ID of the restaurant owning the items
+            updates: list of {"id": item_id, "availableQuantity": n} (set) or {"id": item_id, "delta": n} (adjust)
+        Returns:
+            (matched_count, modified_count). Adjustments that would take stock below zero do not match.
+        """
+        now = datetime.utcnow()
+        operations = []
+        for update in updates:
+            query = {"_id": ObjectId(update["id"]), "restaurantId": restaurant_id}
+            if "delta" in update:
+                if update["delta"] < 0:
+                    query["availableQuantity"] = {"$gte": -update["delta"]}
+                operation = {"$inc": {"availableQuantity": update["delta"]}, "$set": {"updated_at": now}}
+            else:
+                operation = {"$set": {"availableQuantity": update["availableQuantity"], "updated_at": now}}
+            operations.append(UpdateOne(query, operation))
+        
+        if not operations:
+            return 0, 0
+        result = mongo.db.menuItems.bulk_write(operations, ordered=False)
+        forget_in_request("menuItems")
+        return result.matched_count, result.modified_count
+    
+    @staticmethod
+    def reserve_stock(lines, session=None):
+        """
+        Reserve stock for order lines with one unordered bulk_write of guarded $inc operations.
+        Each line only matches while availableQuantity covers its quantity.
+        Args:
+            lines: list of {"menuItemId": id, "quantity": n} (cart/order items)
+            session: MongoDB session; run inside a transaction so a partial reservation is rolled back
+        Returns:
+            True if every line was reserved, False otherwise
+        """
+        quantities = MenuItem._quantities_by_item(lines)
+        if not quantities:
+            return True
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(menuItemId), "availableQuantity": {"$gte": quantity}},
+                {"$inc": {"availableQuantity": -quantity}, "$set": {"updated_at": now}}
+            )
+            for menuItemId, quantity in quantities.items()
+        ]
+        result = mongo.db.menuItems.bulk_write(operations, ordered=False, session=session)
+        forget_in_request("menuItems")
+        return result.matched_count == len(operations)
+    
+    @staticmethod
+    def release_stock(lines, session=None):
+        """Give back stock reserved by reserve_stock for the same lines"""
+        quantities = MenuItem._quantities_by_item(lines)
+        if not quantities:
+            return
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(menuItemId)},
+                {"$inc": {"availableQuantity": quantity}, "$set": {"updated_at": now}}
+            )
+            for menuItemId, quantity in quantities.items()
+        ]
+        mongo.db.menuItems.bulk_write(operations, ordered=False, session=session)
+        forget_in_request("menuItems")
+    
+    @staticmethod
+    def _quantities_by_item(lines):
+        """Sum line quantities per menu item"""
+        quantities = {}
+        for line in lines:
+            quantities[line["menuItemId"]] = quantities.get(line["menuItemId"], 0) + line["quantity"]
+        return quantities
+    
     @staticmethod
     def delete_item(item_id):
         """Delete MenuItem from MenuItems Collection of MongoDB"""
         result = mongo.db.menuItems.delete_one({"_id": ObjectId(item_id)})
+        forget_in_request("menuItems")
         return result.deleted_count > 0      
@@ -2,9 +2,14 @@ from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app import mongo
+from app.services.order_events import OrderEvents
 from app.services.pricing_service import PricingService
-from app.utils.mongo_utils import flatten
+from app.core.constansts import ESTIMATED_COUNT_CAP
+from app.utils.mongo_utils import find_page_with_total, flatten
+from app.utils.pagination import apply_keyset_cursor, keyset_condition
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
 from app.utils.serializers import serialize_doc
 
 class OrderStatus(Enum):
@@ -58,6 +63,8 @@ class Order:
             "updatedAt": self.updatedAt,
         }
         result = mongo.db.orders.insert_one(order_data, session=session)
+        forget_in_request("orders")
+        OrderEvents.publish("created", order_data, session=session)
         return str(result.inserted_id)
     
     @staticmethod
@@ -81,31 +88,70 @@ class Order:
         return order_id
     
     @staticmethod
-    def find_order_by_id(orderId:str,session: Optional[Any] = None):
-        """Find order by order id"""
-        order = mongo.db.orders.find_one({"_id": ObjectId(orderId)}, session=session)
-        return serialize_doc(order) if order else None 
+    def exists(orderId: str):
+        """Check that an order exists (_id-only probe, memoized per request)"""
+        return memoize_in_request(
+            "orders", ("_id", orderId),
+            lambda: mongo.db.orders.find_one({"_id": ObjectId(orderId)}, {"_id": 1}) is not None
+        )
     
     @staticmethod
-    def find_order_by_paymentId(paymentId,session: Any):
+    def find_order_by_id(orderId:str,session: Optional[Any] = None, projection=None):
+        """Find order by order id (full documents outside transactions are served from the request identity map)"""
+        def load():
+            order = mongo.db.orders.find_one({"_id": ObjectId(orderId)}, projection, session=session)
+            return serialize_doc(order) if order else None
+        return load_in_request("orders", ("_id", orderId), load, bypass=session is not None or projection is not None) 
+    
+    @staticmethod
+    def find_order_by_paymentId(paymentId,session: Any, projection=None):
         """Find order by payment id"""
-        order = mongo.db.orders.find_one({"paymentId": paymentId}, session=session)
+        order = mongo.db.orders.find_one({"paymentId": paymentId}, projection, session=session)
         return serialize_doc(order) if order else None  
     
     @staticmethod
-    def find_orders_by_userId(userId):
+    def find_orders_by_userId(userId, projection=None):
         """Find order by user id"""
-        order = mongo.db.orders.find({"userId": userId})
+        order = mongo.db.orders.find({"userId": userId}, projection)
         return serialize_doc(order) if order else None    
     
     @staticmethod
-    def find_pending_order_by_userId(userId: str, session: Any):
+    def find_pending_order_by_userId(userId: str, session: Any, projection=None):
         """Find order by user id"""
-        order = mongo.db.orders.find_one({"userId": userId, "status": OrderStatus.PENDING_PAYMENT.value},session=session)
+        order = mongo.db.orders.find_one({"userId": userId, "status": OrderStatus.PENDING_PAYMENT.value}, projection, session=session)
         return serialize_doc(order) if order else None 
     
     @staticmethod
-    def find_orders_by_restaurantId(restaurantId:str, statuses=None, skip=None, limit=None, count_only=False):
+    def find_expired_pending_orders(now: datetime, limit: int, session: Optional[Any] = None):
+        """PENDING_PAYMENT orders whose expireAt has passed, oldest expiry first (status_1_expireAt_1 index)"""
+        orders = mongo.db.orders.find(
+            {"status": OrderStatus.PENDING_PAYMENT.value, "expireAt": {"$lte": now}},
+            session=session
+        ).sort("expireAt", 1).limit(limit)
+        return serialize_doc(list(orders))
+    
+    @staticmethod
+    def expire_orders(orderIds, now: datetime, session: Optional[Any] = None):
+        """
+        Mark pending orders EXPIRED in one write (their payments fail, their stock is given back).
+        Orders that left PENDING_PAYMENT meanwhile are not touched. Returns the modified count.
+        """
+        result = mongo.db.orders.update_many(
+            {"_id": {"$in": [ObjectId(orderId) for orderId in orderIds]}, "status": OrderStatus.PENDING_PAYMENT.value},
+            {"$set": {
+                "status": OrderStatus.EXPIRED.value,
+                # PaymentStatus.FAILED, mirrored from the payment (see Payment.mirror_on_order)
+                "paymentStatus": "FAILED",
+                "inventoryReserved": False,
+                "updatedAt": now
+            }},
+            session=session
+        )
+        forget_in_request("orders")
+        return result.modified_count
+    
+    @staticmethod
+    def find_orders_by_restaurantId(restaurantId:str, statuses=None, skip=None, limit=None, cursor=None, projection=None, updated_since=None, updated_after_id=None):
         """
         Find menuItems by restaurant Id with pagination support
         Args:
@@ -113,51 +159,137 @@ class Order:
             statuses: List of statuses Ex. ["CONFIRMED", "PREPARING"]
             skip: Number of documents to skip (for pagination)
             limit: Maximum number of documents to return (for pagination)
-            count_only: If True, returns only the count of documents
+            cursor: Opaque keyset cursor of the previous page (takes precedence over skip)
+            projection: Fields to return (must keep createdAt when paging by cursor)
+            updated_since: Delta mode, only orders with updatedAt >= updated_since, oldest change
+                first (statuses, skip and cursor are ignored so orders leaving a status are returned too)
+            updated_after_id: Delta mode keyset resume, orders updated at exactly updated_since are
+                only returned after this _id (and the range becomes updatedAt > updated_since otherwise)
         Returns:
-            If count_only is True: returns the total count
-            If count_only is False: returns the paginated items
+            The paginated orders (see find_orders_page_by_restaurantId for the total count)
         """
         query = {"restaurantId": restaurantId}
         
+        if updated_since is not None:
+            # Range read on the {restaurantId, updatedAt} index
+            if updated_after_id is not None:
+                query["$or"] = [
+                    {"updatedAt": {"$gt": updated_since}},
+                    {"updatedAt": updated_since, "_id": {"$gt": updated_after_id}},
+                ]
+            else:
+                query["updatedAt"] = {"$gte": updated_since}
+            orders_cursor = mongo.db.orders.find(query, projection).sort([("updatedAt", 1), ("_id", 1)])
+            if limit is not None:
+                orders_cursor = orders_cursor.limit(limit)
+            return serialize_doc(list(orders_cursor))
+        
         if statuses:
             query["status"] = {"$in": statuses}
         
-        if count_only:
-            return mongo.db.orders.count_documents(query)
+        # Resume after the cursor instead of skipping earlier documents
+        if cursor:
+            query = apply_keyset_cursor(query, "createdAt", cursor)
+            skip = None
             
         # Create the base cursor
-        cursor = mongo.db.orders.find(query)
+        orders_cursor = mongo.db.orders.find(query, projection)
         
         # Apply pagination if specified
         if skip is not None:
-            cursor = cursor.skip(skip)
+            orders_cursor = orders_cursor.skip(skip)
         if limit is not None:
-            cursor = cursor.limit(limit)
+            orders_cursor = orders_cursor.limit(limit)
             
-        # Add sorting by creation date (newest first)
-        cursor = cursor.sort("createdAt", -1)
+        # Add sorting by creation date (newest first), _id keeps the order stable for cursors
+        orders_cursor = orders_cursor.sort([("createdAt", -1), ("_id", -1)])
             
-        items = list(cursor)
+        items = list(orders_cursor)
         return serialize_doc(items)    
     
+    @staticmethod
+    def find_orders_page_by_restaurantId(restaurantId: str, statuses=None, skip=None, limit=None, cursor=None, count_mode="exact", projection=None):
+        """
+        Find one page of orders of a restaurant and the total count (see find_page_with_total)
+        Args:
+            restaurantId, statuses, skip, limit, cursor, projection: same as find_orders_by_restaurantId
+            count_mode: "exact", "estimate" (capped count, for hot restaurants) or "none" (no count)
+        Returns:
+            (orders, total_count, total_is_exact), total_count is None when not counted
+        """
+        query = {"restaurantId": restaurantId}
+        
+        if statuses:
+            query["status"] = {"$in": statuses}
+        
+        orders, total_count, total_is_exact = find_page_with_total(
+            mongo.db.orders,
+            query,
+            sort=[("createdAt", -1), ("_id", -1)],
+            skip=None if cursor else skip,
+            limit=limit,
+            page_query=keyset_condition("createdAt", cursor) if cursor else None,
+            count_mode=count_mode,
+            count_cap=ESTIMATED_COUNT_CAP,
+            projection=projection
+        )
+        return serialize_doc(orders), total_count, total_is_exact
+    
     @staticmethod
     def update_order(orderId: str, update_data: Any, session: Optional[Any] = None):
         """Update order data"""
         update_data['updatedAt'] = datetime.utcnow()
         # Flatten nested fields into dot-notation
         flattened_data = flatten(update_data)
-        result = mongo.db.orders.update_one(
+        # updatedAt always changes, so a matched order is a modified one; the returned
+        # document feeds the order stream
+        order = mongo.db.orders.find_one_and_update(
             {"_id": ObjectId(orderId)},
             {"$set": flattened_data},
+            return_document=ReturnDocument.AFTER,
             session=session
         )
-        return result.modified_count > 0
+        forget_in_request("orders")
+        OrderEvents.publish("updated", order, session=session)
+        return order is not None
+    
+    @staticmethod
+    def update_and_fetch(orderId: str, update_data: Any, session: Optional[Any] = None, projection=None):
+        """Update order data and return the updated order in one round trip (None if not found)"""
+        update_data['updatedAt'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        order = mongo.db.orders.find_one_and_update(
+            {"_id": ObjectId(orderId)},
+            {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        forget_in_request("orders")
+        OrderEvents.publish("updated", order, session=session)
+        return serialize_doc(order) if order else None
     
     @staticmethod
     def delete_order(orderId, session: Any):
-        """Delete Order from Orders collection of MongoDB"""
-        result = mongo.db.orders.delete_one({"_id": ObjectId(orderId)},session=session)
-        return result.deleted_count > 0
+        """Delete Order from Orders collection of MongoDB, leaving a tombstone for delta sync clients"""
+        order = mongo.db.orders.find_one_and_delete({"_id": ObjectId(orderId)}, projection={"restaurantId": 1}, session=session)
+        forget_in_request("orders")
+        if order:
+            mongo.db.orderTombstones.insert_one(
+                {"orderId": orderId, "restaurantId": order["restaurantId"], "deletedAt": datetime.utcnow()},
+                session=session
+            )
+        OrderEvents.publish("deleted", order, session=session)
+        return order is not None
+    
+    @staticmethod
+    def find_tombstones_since(restaurantId: str, since: datetime):
+        """Ids of orders of a restaurant deleted at or after since"""
+        tombstones = mongo.db.orderTombstones.find(
+            {"restaurantId": restaurantId, "deletedAt": {"$gte": since}},
+            {"_id": 0, "orderId": 1}
+        )
+        return [tombstone["orderId"] for tombstone in tombstones]
     
 
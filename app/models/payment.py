@@ -1,11 +1,14 @@
 from typing import Any, Optional
 from bson import ObjectId
+from pymongo import ReturnDocument
 from app import mongo
 from datetime import datetime
 from enum import Enum
 
 from app.models import restaurant
+from app.models.order import Order
 from app.utils.mongo_utils import flatten
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
 from app.utils.serializers import serialize_doc
 
 class PaymentMode(Enum):
@@ -31,6 +34,9 @@ class SettlementToUserStatus(Enum): # Incase of order is undelivered
     SUCCESS = "SUCCESS"
     FAILED = "FAILED"     
 
+# Payment fields mirrored on the order so order reads need no payments lookup
+ORDER_MIRRORED_FIELDS = ("paymentStatus", "paymentMode")
+
 class Payment:
     def __init__(self, userId: str, restaurantId: str, orderId: str, finalAmount: float, paymentStatus: str, paymentWindowExpireAt: datetime):
         self.userId = userId
@@ -56,51 +62,138 @@ class Payment:
             "updatedAt": self.updatedAt
         }
         result = mongo.db.payments.insert_one(payment_data,session=session)
+        forget_in_request("payments")
         return str(result.inserted_id)
 
     @staticmethod
-    def find_payment_by_id(paymentId,session: Optional[Any] = None):
-        """Find payment by payment id"""
-        payment = mongo.db.payments.find_one({"_id": ObjectId(paymentId)},session=session)
-        return serialize_doc(payment) if payment else None
+    def exists(paymentId: str):
+        """Check that a payment exists (_id-only probe, memoized per request)"""
+        return memoize_in_request(
+            "payments", ("_id", paymentId),
+            lambda: mongo.db.payments.find_one({"_id": ObjectId(paymentId)}, {"_id": 1}) is not None
+        )
     
     @staticmethod
-    def find_payments_by_orderIds(orderIds):
-        """Find payments by order ids"""
+    def find_payment_by_id(paymentId,session: Optional[Any] = None, projection=None):
+        """Find payment by payment id (full documents outside transactions are served from the request identity map)"""
+        def load():
+            payment = mongo.db.payments.find_one({"_id": ObjectId(paymentId)}, projection, session=session)
+            return serialize_doc(payment) if payment else None
+        return load_in_request("payments", ("_id", paymentId), load, bypass=session is not None or projection is not None)
+    
+    @staticmethod
+    def find_payments_by_orderIds(orderIds, projection=None):
+        """Find payments by order ids (orderId and paymentStatus only unless a projection is given)"""
         cursor = mongo.db.payments.find(
             {"orderId": {"$in": orderIds}},
-            {"orderId": 1, "paymentStatus": 1}
+            projection or {"orderId": 1, "paymentStatus": 1}
         )
         return list(cursor)
         
     
     @staticmethod
-    def find_payment_by_userId(userId: str,session: Any):
+    def find_payment_by_userId(userId: str,session: Any, projection=None):
         """Find payment by user id"""
-        payment = mongo.db.payments.find_one({"userId": userId},session=session)
+        payment = mongo.db.payments.find_one({"userId": userId}, projection, session=session)
         return serialize_doc(payment) if payment else None
     
     @staticmethod
-    def find_payment_by_orderId(orderId: str,session: Optional[Any] = None):
-        """Find payment by order id"""
-        payment = mongo.db.payments.find_one({"orderId": orderId},session=session)
-        return serialize_doc(payment) if payment else None
+    def find_payment_by_orderId(orderId: str,session: Optional[Any] = None, projection=None):
+        """Find payment by order id (full documents outside transactions are served from the request identity map)"""
+        def load():
+            payment = mongo.db.payments.find_one({"orderId": orderId}, projection, session=session)
+            return serialize_doc(payment) if payment else None
+        return load_in_request("payments", ("orderId", orderId), load, bypass=session is not None or projection is not None)
+    
+    @staticmethod
+    def mirror_on_order(orderId, update_data: Any, session: Optional[Any] = None):
+        """Copy the mirrored payment fields of update_data onto the order (same session, so same transaction)"""
+        mirrored = {field: update_data[field] for field in ORDER_MIRRORED_FIELDS if field in update_data}
+        if not mirrored or not orderId:
+            return False
+        return Order.update_order(orderId=str(orderId), update_data=mirrored, session=session)
     
     @staticmethod
     def update_payment(paymentId: str, update_data: Any,session: Optional[Any] = None):
-        """Update payment data"""
+        """Update payment data (paymentStatus/paymentMode are mirrored on the order)"""
+        update_data['updatedAt'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        payment = mongo.db.payments.find_one_and_update(
+            {"_id": ObjectId(paymentId)},
+            {"$set": flattened_data},
+            projection={"orderId": 1},
+            session=session
+        )
+        forget_in_request("payments")
+        if payment:
+            Payment.mirror_on_order(payment.get("orderId"), update_data, session=session)
+        return payment is not None    
+    
+    @staticmethod
+    def update_and_fetch(paymentId: str, update_data: Any, session: Optional[Any] = None, projection=None):
+        """Update payment data and return the updated payment in one round trip (None if not found)"""
         update_data['updatedAt'] = datetime.utcnow()
         # Flatten nested fields into dot-notation
         flattened_data = flatten(update_data)
-        result = mongo.db.payments.update_one(
+        if projection and all(projection.values()):
+            # The order mirror needs orderId from an inclusion projection
+            projection = {**projection, "orderId": 1}
+        payment = mongo.db.payments.find_one_and_update(
             {"_id": ObjectId(paymentId)},
             {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        forget_in_request("payments")
+        if payment:
+            Payment.mirror_on_order(payment.get("orderId"), update_data, session=session)
+        return serialize_doc(payment) if payment else None
+    
+    @staticmethod
+    def fail_pending_payments(paymentIds, session: Optional[Any] = None):
+        """Mark still-PENDING payments FAILED in one write (the order mirror is set by the caller), returns the modified count"""
+        result = mongo.db.payments.update_many(
+            {"_id": {"$in": [ObjectId(paymentId) for paymentId in paymentIds]}, "paymentStatus": PaymentStatus.PENDING.value},
+            {"$set": {"paymentStatus": PaymentStatus.FAILED.value, "updatedAt": datetime.utcnow()}},
             session=session
         )
-        return result.modified_count > 0    
+        forget_in_request("payments")
+        return result.modified_count
+    
+    @staticmethod
+    def find_order_mirror_drift():
+        """
+        Orders whose mirrored payment fields differ from their latest payment.
+        Yields {"_id": orderId, "paymentStatus", "paymentMode", "order": {current order fields}}
+        """
+        return mongo.db.payments.aggregate([
+            {"$sort": {"createdAt": -1}},
+            {"$group": {
+                "_id": "$orderId",
+                "paymentStatus": {"$first": "$paymentStatus"},
+                "paymentMode": {"$first": "$paymentMode"}
+            }},
+            {"$lookup": {
+                "from": "orders",
+                "let": {"orderId": {"$toObjectId": "$_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$_id", "$$orderId"]}}},
+                    {"$project": {"_id": 0, "paymentStatus": 1, "paymentMode": 1}}
+                ],
+                "as": "order"
+            }},
+            {"$unwind": "$order"},
+            {"$match": {"$expr": {"$or": [
+                {"$ne": ["$order.paymentStatus", "$paymentStatus"]},
+                {"$ne": ["$order.paymentMode", "$paymentMode"]}
+            ]}}}
+        ], allowDiskUse=True)
     
     @staticmethod
     def delete_payment(paymentId, session: Any):
         """Delete Payment from Payments collection of MongoDB"""
         result = mongo.db.payments.delete_one({"_id": ObjectId(paymentId)},session=session)
+        forget_in_request("payments")
         return result.deleted_count > 0
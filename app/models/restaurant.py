@@ -4,7 +4,12 @@ from app.utils.mongo_utils import flatten
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
+from cachetools import TTLCache
+from app.core.constansts import RESTAURANT_SUMMARY_CACHE_MAX_SIZE, RESTAURANT_SUMMARY_CACHE_TTL_SECONDS
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
+import threading
 import re
 
 # Get extensions from current app context
@@ -14,7 +19,27 @@ def get_mongo():
 def get_bcrypt():
     return current_app.extensions['bcrypt']
 
+# Process-local cache of restaurant summaries used to attach restaurantName to listings.
+# Entries are dropped on update/delete in this process and expire after the TTL elsewhere.
+_summary_cache = TTLCache(maxsize=RESTAURANT_SUMMARY_CACHE_MAX_SIZE, ttl=RESTAURANT_SUMMARY_CACHE_TTL_SECONDS)
+_summary_cache_lock = threading.Lock()
+_summary_cache_generation = 0
+
+def invalidate_restaurant_summary(restaurant_id):
+    """Drop a restaurant summary from the cache"""
+    global _summary_cache_generation
+    with _summary_cache_lock:
+        _summary_cache.pop(restaurant_id, None)
+        _summary_cache_generation += 1
+
 class Restaurant:
+    # Named projections (views)
+    ID_VIEW = {"_id": 1}
+    # Name and photo shown next to menu items and cart lines
+    SUMMARY_VIEW = {"name": 1, "photoUrl": 1}
+    # Everything except the unbounded menuItems / receivedOrders / receivedFeedback arrays
+    PROFILE_VIEW = {"menuItems": 0, "receivedOrders": 0, "receivedFeedback": 0}
+    
     def __init__(self, id, email, ownerName, phone, authProvider, photoUrl):
         self.id = id
         self.email = email
@@ -66,28 +91,93 @@ class Restaurant:
                 "last_login_at": self.last_login_at
         }
         result = mongo.db.restaurants.insert_one(restaurant_data)
+        forget_in_request("restaurants")
         return str(result.inserted_id)
 
     @staticmethod
-    def find_by_email(email):
+    def find_by_email(email, projection=None):
         """Find restaurant by email"""
-        return mongo.db.restaurants.find_one({"email": email})
+        return mongo.db.restaurants.find_one({"email": email}, projection)
 
     @staticmethod
-    def find_by_phone(phone):
+    def find_by_phone(phone, projection=None):
         """Find restaurant by phone"""
-        return mongo.db.restaurants.find_one({"phone": phone})
+        return mongo.db.restaurants.find_one({"phone": phone}, projection)
+    
+    @staticmethod
+    def find_by_id(restaurant_id, projection=None):
+        """Find restaurant by ID (full documents are served from the request identity map)"""
+        return load_in_request(
+            "restaurants", ("_id", restaurant_id),
+            lambda: mongo.db.restaurants.find_one({"_id": restaurant_id}, projection),
+            bypass=projection is not None
+        )
+    
+    @staticmethod
+    def exists(restaurant_id):
+        """Check that a restaurant exists (_id-only probe, memoized per request)"""
+        return memoize_in_request(
+            "restaurants", ("_id", restaurant_id),
+            lambda: mongo.db.restaurants.find_one({"_id": restaurant_id}, Restaurant.ID_VIEW) is not None
+        )
+    
+    @staticmethod
+    def exists_by_phone(phone):
+        """Check that a restaurant with this phone exists (covered by the phone index, memoized per request)"""
+        return memoize_in_request(
+            "restaurants", ("phone", phone),
+            lambda: mongo.db.restaurants.find_one({"phone": phone}, {"_id": 0, "phone": 1}) is not None
+        )
     
     @staticmethod
-    def find_by_id(restaurant_id):
-        """Find restaurant by ID"""
-        return mongo.db.restaurants.find_one({"_id": restaurant_id})
+    def exists_by_email(email):
+        """Check that a restaurant with this email exists (covered by the email index, memoized per request)"""
+        return memoize_in_request(
+            "restaurants", ("email", email),
+            lambda: mongo.db.restaurants.find_one({"email": email}, {"_id": 0, "email": 1}) is not None
+        )
+    
+    @staticmethod
+    def find_by_ids(restaurant_ids, projection=None):
+        """Find restaurants by a list of IDs with a single $in query"""
+        return list(
+            mongo.db.restaurants.find({"_id": {"$in": list(set(restaurant_ids))}}, projection)
+        )
     
     @staticmethod
-    def find_by_city(city):
+    def find_summaries_by_ids(restaurant_ids):
+        """
+        Find restaurant summaries (name, photoUrl) keyed by restaurant ID.
+        Served from the process-local TTL cache; misses are loaded with a single $in query.
+        Returned summaries are shared, treat them as read-only.
+        """
+        ids = set(restaurant_ids)
+        summaries = {}
+        with _summary_cache_lock:
+            generation = _summary_cache_generation
+            for restaurant_id in ids:
+                summary = _summary_cache.get(restaurant_id)
+                if summary is not None:
+                    summaries[restaurant_id] = summary
+
+        missing_ids = ids - summaries.keys()
+        if missing_ids:
+            loaded = {
+                restaurant["_id"]: restaurant
+                for restaurant in Restaurant.find_by_ids(missing_ids, projection=Restaurant.SUMMARY_VIEW)
+            }
+            summaries.update(loaded)
+            with _summary_cache_lock:
+                # Skip caching if an update/delete raced with the load above
+                if generation == _summary_cache_generation:
+                    _summary_cache.update(loaded)
+        return summaries
+    
+    @staticmethod
+    def find_by_city(city, projection=None):
         """Find restaurant by city"""
         restaurants = list(
-            mongo.db.restaurants.find({"address.city": city})
+            mongo.db.restaurants.find({"address.city": city}, projection)
         )
         return restaurants
     
@@ -120,12 +210,32 @@ class Restaurant:
             {"_id": restaurant_id}, 
             {"$set": flattened_data}
         )
+        invalidate_restaurant_summary(restaurant_id)
+        forget_in_request("restaurants")
         return result.modified_count > 0
     
+    @staticmethod
+    def update_and_fetch(restaurant_id, update_data, projection=None):
+        """Update restaurant data and return the updated document in one round trip (None if not found)"""
+        update_data['updated_at'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        restaurant = mongo.db.restaurants.find_one_and_update(
+            {"_id": restaurant_id},
+            {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        invalidate_restaurant_summary(restaurant_id)
+        forget_in_request("restaurants")
+        return restaurant
+    
     @staticmethod
     def delete_restaurant(restaurant_id):
         """Delete restaurant data from MongoDB"""
         result = mongo.db.restaurants.delete_one({"_id": restaurant_id})
+        invalidate_restaurant_summary(restaurant_id)
+        forget_in_request("restaurants")
         return result.deleted_count > 0
     
     @staticmethod
@@ -135,4 +245,17 @@ class Restaurant:
             {"_id": restaurant_id},
             {"$set": {"last_login_at": datetime.utcnow()}}
         )
-        return result.modified_count > 0   
\ No newline at end of file
+        forget_in_request("restaurants")
+        return result.modified_count > 0
+    
+    @staticmethod
+    def update_last_login_and_fetch(restaurant_id, projection=None):
+        """Update last_login_at for restaurant and return the updated document in one round trip (None if not found)"""
+        restaurant = mongo.db.restaurants.find_one_and_update(
+            {"_id": restaurant_id},
+            {"$set": {"last_login_at": datetime.utcnow()}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("restaurants")
+        return restaurant
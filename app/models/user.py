@@ -1,9 +1,11 @@
 from flask import current_app
 from app import mongo
 from app.utils.mongo_utils import flatten 
+from app.utils.request_cache import forget_in_request, load_in_request, memoize_in_request
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 import re
 
@@ -15,6 +17,11 @@ def get_bcrypt():
     return current_app.extensions['bcrypt']
 
 class User:
+    # Named projections (views)
+    ID_VIEW = {"_id": 1}
+    # City used to find nearby restaurants
+    CITY_VIEW = {"address.city": 1}
+    
     def __init__(self, id, email, name, phone, authProvider):
         self.id = id
         self.email = email
@@ -54,22 +61,51 @@ class User:
                 "last_login_at": self.last_login_at
         }
         result = mongo.db.users.insert_one(user_data)
+        forget_in_request("users")
         return str(result.inserted_id)
 
     @staticmethod
-    def find_by_email(email):
+    def find_by_email(email, projection=None):
         """Find user by email"""
-        return mongo.db.users.find_one({"email": email})
+        return mongo.db.users.find_one({"email": email}, projection)
 
     @staticmethod
-    def find_by_phone(phone):
+    def find_by_phone(phone, projection=None):
         """Find user by phone"""
-        return mongo.db.users.find_one({"phone": phone})
+        return mongo.db.users.find_one({"phone": phone}, projection)
+    
+    @staticmethod
+    def find_by_id(user_id, projection=None):
+        """Find user by ID (full documents are served from the request identity map)"""
+        return load_in_request(
+            "users", ("_id", user_id),
+            lambda: mongo.db.users.find_one({"_id": user_id}, projection),
+            bypass=projection is not None
+        )
+    
+    @staticmethod
+    def exists(user_id):
+        """Check that a user exists (_id-only probe, memoized per request)"""
+        return memoize_in_request(
+            "users", ("_id", user_id),
+            lambda: mongo.db.users.find_one({"_id": user_id}, User.ID_VIEW) is not None
+        )
+    
+    @staticmethod
+    def exists_by_phone(phone):
+        """Check that a user with this phone exists (covered by the phone index, memoized per request)"""
+        return memoize_in_request(
+            "users", ("phone", phone),
+            lambda: mongo.db.users.find_one({"phone": phone}, {"_id": 0, "phone": 1}) is not None
+        )
     
     @staticmethod
-    def find_by_id(user_id):
-        """Find user by ID"""
-        return mongo.db.users.find_one({"_id": user_id})
+    def exists_by_email(email):
+        """Check that a user with this email exists (covered by the email index, memoized per request)"""
+        return memoize_in_request(
+            "users", ("email", email),
+            lambda: mongo.db.users.find_one({"email": email}, {"_id": 0, "email": 1}) is not None
+        )
     
     @staticmethod
     def validate_email(email):
@@ -100,12 +136,29 @@ class User:
             {"_id": user_id}, 
             {"$set": flattened_data}
         )
+        forget_in_request("users")
         return result.modified_count > 0
     
+    @staticmethod
+    def update_and_fetch(user_id, update_data, projection=None):
+        """Update user data and return the updated document in one round trip (None if not found)"""
+        update_data['updated_at'] = datetime.utcnow()
+        # Flatten nested fields into dot-notation
+        flattened_data = flatten(update_data)
+        user = mongo.db.users.find_one_and_update(
+            {"_id": user_id},
+            {"$set": flattened_data},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("users")
+        return user
+    
     @staticmethod
     def delete_user(user_id):
         """Delete user data from MongoDB"""
         result = mongo.db.users.delete_one({"_id": user_id})
+        forget_in_request("users")
         return result.deleted_count > 0
     
     @staticmethod
@@ -115,4 +168,17 @@ class User:
             {"_id": user_id},
             {"$set": {"last_login_at": datetime.utcnow()}}
         )
-        return result.modified_count > 0   
\ No newline at end of file
+        forget_in_request("users")
+        return result.modified_count > 0
+    
+    @staticmethod
+    def update_last_login_and_fetch(user_id, projection=None):
+        """Update last_login_at for user and return the updated document in one round trip (None if not found)"""
+        user = mongo.db.users.find_one_and_update(
+            {"_id": user_id},
+            {"$set": {"last_login_at": datetime.utcnow()}},
+            projection=projection,
+            return_document=ReturnDocument.AFTER
+        )
+        forget_in_request("users")
+        return user
@@ -1,10 +1,30 @@
 import traceback
 from flask import Blueprint, json, request, jsonify, session, current_app
-from app.core.constansts import ALLOWED_IMAGE_EXTENSIONS, S3_FOLDER_MENU_ITEMS, S3_FOLDER_RESTAURANTS
+from app.core.constansts import (
+    ALLOWED_IMAGE_EXTENSIONS,
+    MAX_BULK_STOCK_UPDATES,
+    S3_FOLDER_MENU_ITEMS,
+    S3_FOLDER_RESTAURANTS,
+    S3_MAX_IMAGE_BYTES,
+    S3_PRESIGNED_POST_EXPIRES_SECONDS,
+)
 from app.models.menu_item import MenuItem
 from app.models.restaurant import Restaurant
-from app.utils.aws_utils import MAX_IMAGES, delete_images_from_s3, delete_s3_folder, upload_images_to_s3
+from app.services.image_variant_service import ImageVariantService
+from app.utils.aws_utils import (
+    MAX_IMAGES,
+    allowed_file,
+    delete_images_from_s3,
+    delete_s3_folder,
+    find_uploaded_image,
+    image_prefix,
+    presign_image_upload,
+    presigned_key,
+    s3_url,
+    upload_image_batch,
+)
 from app.utils.decorators import login_required, admin_required
+from app.utils.pagination import COUNT_MODES, build_pagination, decode_cursor
 from firebase_admin import auth as firebase_auth
 from bson.objectid import ObjectId
 from werkzeug.utils import secure_filename
@@ -28,6 +48,10 @@ def get_all_menu_items():
         # Get pagination parameters with defaults
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 10))
+        # Opaque keyset cursor from the previous page (takes precedence over page)
+        cursor = request.args.get('cursor')
+        # Total count mode: exact | estimate (capped) | none
+        count_mode = request.args.get('count', 'exact')
 
         # Validate pagination parameters
         if page < 1:
@@ -39,38 +63,37 @@ def get_all_menu_items():
         if page_size > 100:  # Limit maximum page size
             current_app.logger.warning(f"Failed to fetch menu items | restaurantId={restaurant_id} | Page size cannot exceed 100")
             return jsonify({"error": "Page size cannot exceed 100"}), 400
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                current_app.logger.warning(f"Failed to fetch menu items | restaurantId={restaurant_id} | Invalid cursor")
+                return jsonify({"error": "Invalid cursor"}), 400
+        if count_mode not in COUNT_MODES:
+            current_app.logger.warning(f"Failed to fetch menu items | restaurantId={restaurant_id} | Invalid count mode")
+            return jsonify({"error": f"count must be one of {', '.join(COUNT_MODES)}"}), 400
 
         if not restaurant_id:
             current_app.logger.warning(f"Failed to fetch menu items | restaurantId={restaurant_id} | restaurant_id is required")
             return jsonify({"error": "restaurant_id is required"}), 400
 
-        restaurant = Restaurant.find_by_id(restaurant_id)
-        if not restaurant:
+        if not Restaurant.exists(restaurant_id):
             current_app.logger.warning(f"Failed to fetch menu items | restaurantId={restaurant_id} | Invalid Request! Restaurant does not exist")
             return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404
 
-        # Get total count of menu items
-        total_count = MenuItem.find_items_by_restaurant_id(restaurant_id, count_only=True)
-        # if total_count == 0:
-        #     return jsonify({"error": "MenuItems not found"}), 404
-            
-        total_pages = (total_count + page_size - 1) // page_size
-
         # Calculate skip and limit for pagination
         skip = (page - 1) * page_size
-        menuItems = MenuItem.find_items_by_restaurant_id(restaurant_id, skip=skip, limit=page_size)
+        # Get the page and the total count of menu items (two indexed queries, see find_page_with_total)
+        menuItems, total_count, total_is_exact = MenuItem.find_items_page_by_restaurant_id(
+            restaurant_id, skip=skip, limit=page_size, cursor=cursor, count_mode=count_mode
+        )
+        # if total_count == 0:
+        #     return jsonify({"error": "MenuItems not found"}), 404
         current_app.logger.info("Fetched menu items successfully | restaurantId={restaurantId}")
         return jsonify({
             "message": "Fetched menu items successfully",
             "menuItems": menuItems,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_items": total_count,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+            "pagination": build_pagination(page, page_size, menuItems, "created_at", total_count, total_is_exact, cursor)
         }), 200
 
     except Exception as e:
@@ -106,8 +129,7 @@ def add_new_Item():
         ingredients = data['ingredients']   
         
         # For checking the restaurant exists
-        restaurant = Restaurant.find_by_id(restaurantId)        
-        if not restaurant:
+        if not Restaurant.exists(restaurantId):
             current_app.logger.warning(
                 "AddMenuItemFailed | restaurantId=%s | reason=RestaurantNotFound",
                 restaurantId
@@ -115,8 +137,7 @@ def add_new_Item():
             return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404  
         
         # For checking the item already exist
-        success = MenuItem.find_item_by_name(restaurantId, name)
-        if success:
+        if MenuItem.exists_by_name(restaurantId, name):
             current_app.logger.warning(
                 "AddMenuItemFailed | restaurantId=%s | name=%s | reason=ItemAlreadyExists",
                 restaurantId, name
@@ -164,32 +185,14 @@ def increaseItemQuantity():
             
         id = data['id']    
         
-        # Get available quantity of items
-        item = MenuItem.find_item_by_id(id)
-        if not item:
+        # Increase item quantity by 1 and get updated menuItem data in one call
+        updated_item = MenuItem.adjust_available_quantity(id, 1)
+        if not updated_item:
             current_app.logger.warning(
                 "IncreaseItemQuantityFailed | reason=ItemNotFound",
             )
             return jsonify({"error": "Item not found"}), 404
         
-        # Increase item quantity by 1
-        newAvailableQuantity = item['availableQuantity'] + 1
-        
-        item_data = {
-            "id": item['id'],
-            "availableQuantity": newAvailableQuantity
-        }
-        
-        success = MenuItem.update_item(id, item_data)
-        if not success:
-            current_app.logger.warning(
-                "IncreaseItemQuantityFailed | reason=FailedToUpdateItem",
-            )
-            return jsonify({"error": "Failed to increase item quantity"}), 500
-        
-        # Get updated menuItem data
-        updated_item = MenuItem.find_item_by_id(id)
-        
         current_app.logger.info(
             "IncreaseItemQuantitySuccess | id=%s",
             id
@@ -223,35 +226,21 @@ def decreaseItemQuantity():
             
         id = data['id']    
         
-        # Get available quantity of items
-        item = MenuItem.find_item_by_id(id)
-        if not item:
+        # Decrease item quantity by 1 only while it is above zero, and get updated menuItem data in one call
+        updated_item = MenuItem.adjust_available_quantity(id, -1)
+        if not updated_item:
+            # Nothing matched: either the item does not exist or its quantity is already zero
+            if not MenuItem.exists(id):
+                current_app.logger.warning(
+                    "DecreaseItemQuantityFailed | reason=ItemNotFound",
+                )
+                return jsonify({"error": "Item not found"}), 404
             current_app.logger.warning(
-                "DecreaseItemQuantityFailed | reason=ItemNotFound",
+                "DecreaseItemQuantityFailed | id=%s | reason=QuantityAlreadyZero",
+                id
             )
-            return jsonify({"error": "Item not found"}), 404
-        
-        # Decrease item quantity by 1
-        if(item['availableQuantity'] != 0):
-            newAvailableQuantity = item['availableQuantity'] - 1
-        else:
             return jsonify({"error": "Failed to decrease item quantity, Item quantity is already zero."}), 500
         
-        item_data = {
-            "id": item['id'],
-            "availableQuantity": newAvailableQuantity
-        }
-        
-        success = MenuItem.update_item(id, item_data)
-        if not success:
-            current_app.logger.warning(
-                "DecreaseItemQuantityFailed | reason=FailedToUpdateItem",
-            )
-            return jsonify({"error": "Failed to decrease item quantity"}), 500
-        
-        # Get updated menuItem data
-        updated_item = MenuItem.find_item_by_id(id)
-        
         current_app.logger.info(
             "DecreaseItemQuantitySuccess | id=%s",
             id
@@ -269,6 +258,85 @@ def decreaseItemQuantity():
         )
         return jsonify({"error": "Failed to decrease item quantity", "details": str(e)}), 500        
 
+@restaurant_menu_item_bp.route('/updateItemQuantities', methods=['PUT'])
+def updateItemQuantities():
+    """Set or adjust available quantity of many menu items at once"""
+    try:
+        data = request.get_json()
+        
+        required_fields = ['restaurantId', 'items']
+        for field in required_fields:
+            if field not in data or not data[field]:
+                current_app.logger.warning(
+                    f"UpdateItemQuantitiesFailed | reason={field}Required",
+                )
+                return jsonify({"error": f"{field} is required"}), 400
+        
+        restaurantId = data['restaurantId']
+        items = data['items']
+        
+        if not isinstance(items, list):
+            current_app.logger.warning("UpdateItemQuantitiesFailed | reason=ItemsMustBeList")
+            return jsonify({"error": "items must be a list"}), 400
+        if len(items) > MAX_BULK_STOCK_UPDATES:
+            current_app.logger.warning("UpdateItemQuantitiesFailed | reason=TooManyItems")
+            return jsonify({"error": f"Cannot update more than {MAX_BULK_STOCK_UPDATES} items at once"}), 400
+        
+        # Each entry either sets availableQuantity or adjusts it by delta
+        updates = []
+        for entry in items:
+            if not isinstance(entry, dict) or not ObjectId.is_valid(str(entry.get('id'))):
+                current_app.logger.warning("UpdateItemQuantitiesFailed | reason=InvalidItemId | entry=%s", entry)
+                return jsonify({"error": "Each item needs a valid id", "item": entry}), 400
+            if ('availableQuantity' in entry) == ('delta' in entry):
+                current_app.logger.warning("UpdateItemQuantitiesFailed | reason=InvalidOperation | entry=%s", entry)
+                return jsonify({"error": "Each item needs exactly one of availableQuantity or delta", "item": entry}), 400
+            if 'availableQuantity' in entry:
+                value = entry['availableQuantity']
+                if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+                    current_app.logger.warning("UpdateItemQuantitiesFailed | reason=InvalidQuantity | entry=%s", entry)
+                    return jsonify({"error": "availableQuantity must be a non-negative integer", "item": entry}), 400
+                updates.append({"id": entry['id'], "availableQuantity": value})
+            else:
+                value = entry['delta']
+                if not isinstance(value, int) or isinstance(value, bool):
+                    current_app.logger.warning("UpdateItemQuantitiesFailed | reason=InvalidDelta | entry=%s", entry)
+                    return jsonify({"error": "delta must be an integer", "item": entry}), 400
+                updates.append({"id": entry['id'], "delta": value})
+        
+        matched, modified = MenuItem.bulk_update_available_quantities(restaurantId, updates)
+        
+        # Read back the new stock levels of all requested items with one $in query
+        updated_items = [
+            item for item in MenuItem.find_items_by_ids([update['id'] for update in updates])
+            if item['restaurantId'] == restaurantId
+        ]
+        found_ids = {item['id'] for item in updated_items}
+        not_found = sorted({update['id'] for update in updates} - found_ids)
+        
+        current_app.logger.info(
+            "UpdateItemQuantitiesSuccess | restaurantId=%s | requested=%s | matched=%s | modified=%s",
+            restaurantId, len(updates), matched, modified
+        )
+        return jsonify({
+            "message": "Item quantities updated successfully",
+            "requested": len(updates),
+            "matched": matched,
+            "modified": modified,
+            # Not applied: item not found in this restaurant, or a decrease larger than the available quantity
+            "notApplied": len(updates) - matched,
+            "notFound": not_found,
+            "menuItems": updated_items
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(
+            "UpdateItemQuantitiesException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Failed to update item quantities", "details": str(e)}), 500
+
 @restaurant_menu_item_bp.route('/deleteItem', methods=['DELETE'])
 def delete_item():
     """Delete menu item either by (restaurant_id + name) or by item id."""
@@ -281,8 +349,7 @@ def delete_item():
             name = data['name'].strip()
 
             # Validate restaurant existence
-            restaurant = Restaurant.find_by_id(restaurant_id)
-            if not restaurant:
+            if not Restaurant.exists(restaurant_id):
                 current_app.logger.warning(
                     "DeleteItemFailed | reason=RestaurantNotExist",
                 )
@@ -418,8 +485,14 @@ def upload_menu_item_images():
             return jsonify({"error": "Menu item not found."}), 404
         
         update_data = {}
+
+        # Kept for the WebP variants, so they are not read back from S3
+        image_bytes = []
+        for image in images:
+            image_bytes.append(image.read())
+            image.stream.seek(0)
         
-        uploaded_urls, existing_urls, error = upload_images_to_s3(
+        batch = upload_image_batch(
             s3_client=s3_client,
             bucket_name=S3_BUCKET,
             region=S3_REGION,
@@ -427,28 +500,35 @@ def upload_menu_item_images():
             restaurant_id=restaurant_id,
             folder=folder,
             item_id=item_id,
-            sub_folder=sub_folder
+            sub_folder=sub_folder,
+            image_bytes=image_bytes
         )        
 
-        if error:
+        if batch["error"]:
             current_app.logger.error(
                 "UploadItemImageException | error=%s",
-                error
+                batch["error"]
             )    
-            return jsonify({"error": error}), 400
+            return jsonify({"error": batch["error"], "results": batch["results"]}), 400
         
+        uploaded_urls = batch["uploaded_urls"]
         update_data['images'] = uploaded_urls
         
-        success = MenuItem.update_item(item_id, update_data)
+        # Update and fetch updated menu item
+        updated_item = MenuItem.update_and_fetch(item_id, update_data)
         
-        if not success:
+        if not updated_item:
             current_app.logger.warning(
                 "UploadItemImageFailed | reason=FailedToUpdateItem",
             )    
             return jsonify({"error": "Failed to update item"}), 500
-        
-        # Fetch updated menu item
-        updated_item = MenuItem.find_item_by_id(item_id)
+
+        # Resized WebP copies of the new images, built after the response
+        ImageVariantService.processItemImagesInBackground(
+            current_app._get_current_object(),
+            item_id,
+            variant_sources(batch, image_bytes, menu_item)
+        )
 
         current_app.logger.info(
             "UploadItemImage | itemId=%s",
@@ -457,6 +537,7 @@ def upload_menu_item_images():
         return jsonify({
             "message": f"Uploaded {len(uploaded_urls)} image(s) successfully.",
             "uploaded_urls": uploaded_urls,
+            "results": batch["results"],
             "menuItem": updated_item
         }), 200
 
@@ -468,6 +549,182 @@ def upload_menu_item_images():
         )
         return jsonify({"error": "Image upload failed. Please check server logs."}), 500
                                                   
+@restaurant_menu_item_bp.route('/presignItemImages', methods=['POST'])
+def presign_item_images():
+    """
+    Issue presigned POST policies so the client uploads menu item images straight to S3
+    (under restaurants/{restaurant_id}/menu_items/{item_id}/), then calls /confirmItemImages.
+    Each upload gets a fresh key (filename only supplies the extension), so nothing live is overwritten.
+    Required: item_id, restaurant_id, files ([{"filename", "contentType"}], up to 3)
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        item_id = data.get("item_id")
+        restaurant_id = data.get("restaurant_id")
+        files = data.get("files") or []
+
+        if not item_id or not restaurant_id:
+            current_app.logger.warning(
+                "PresignItemImagesFailed | reason=ItemIdAndRestaurantIdRequired",
+            )
+            return jsonify({"error": "item_id and restaurant_id are required."}), 400
+        if not isinstance(files, list) or len(files) == 0:
+            current_app.logger.warning(
+                "PresignItemImagesFailed | reason=NoFilesProvided",
+            )
+            return jsonify({"error": "No files provided."}), 400
+        if len(files) > MAX_IMAGES:
+            current_app.logger.warning(
+                "PresignItemImagesFailed | reason=Max%sAreAllowed",
+                MAX_IMAGES
+            )
+            return jsonify({"error": f"Maximum {MAX_IMAGES} images are allowed."}), 400
+
+        keys = []
+        prefix = image_prefix(S3_FOLDER_RESTAURANTS, restaurant_id, item_id, S3_FOLDER_MENU_ITEMS)
+        for file in files:
+            filename = str(file.get("filename") or "") if isinstance(file, dict) else ""
+            content_type = str(file.get("contentType") or "") if isinstance(file, dict) else ""
+            if not filename or not allowed_file(filename) or not content_type.startswith("image/"):
+                current_app.logger.warning(
+                    "PresignItemImagesFailed | reason=UnsupportedFileType",
+                )
+                return jsonify({"error": f"Unsupported file: {filename or file}"}), 400
+            keys.append((filename, presigned_key(prefix, filename), content_type))
+
+        menu_item = MenuItem.find_item_by_id(item_id)
+        if not menu_item or menu_item.get("restaurantId") != restaurant_id:
+            current_app.logger.warning(
+                "PresignItemImagesFailed | reason=MenuItemNotFound",
+            )
+            return jsonify({"error": "Menu item not found."}), 404
+
+        uploads = [
+            {"filename": filename, "key": s3_key, **presign_image_upload(s3_client, S3_BUCKET, s3_key, content_type)}
+            for filename, s3_key, content_type in keys
+        ]
+
+        current_app.logger.info(
+            "PresignItemImages | itemId=%s | files=%s",
+            item_id,
+            len(uploads)
+        )
+        return jsonify({
+            "uploads": uploads,
+            "expiresIn": S3_PRESIGNED_POST_EXPIRES_SECONDS,
+            "maxBytes": S3_MAX_IMAGE_BYTES
+        }), 200
+
+    except (NoCredentialsError, ClientError) as e:
+        current_app.logger.error(
+            "PresignItemImagesException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Failed to prepare image upload. Please check server logs."}), 500
+
+@restaurant_menu_item_bp.route('/confirmItemImages', methods=['POST'])
+def confirm_item_images():
+    """
+    Record images uploaded with /presignItemImages on the menu item, after checking
+    with head_object that every object exists.
+    Required: item_id, restaurant_id, keys
+    Optional: replace (default false): true replaces the item's images (old ones are
+    deleted from S3) like /uploadItemImages, false appends like /updateItem
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        item_id = data.get("item_id")
+        restaurant_id = data.get("restaurant_id")
+        keys = data.get("keys") or []
+        replace = bool(data.get("replace", False))
+
+        if not item_id or not restaurant_id:
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=ItemIdAndRestaurantIdRequired",
+            )
+            return jsonify({"error": "item_id and restaurant_id are required."}), 400
+        if not isinstance(keys, list) or len(keys) == 0:
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=NoKeysProvided",
+            )
+            return jsonify({"error": "No keys provided."}), 400
+
+        # Only keys presigned for this item can be attached to it
+        prefix = image_prefix(S3_FOLDER_RESTAURANTS, restaurant_id, item_id, S3_FOLDER_MENU_ITEMS)
+        if any(not isinstance(key, str) or not key.startswith(prefix) for key in keys):
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=KeyOutsideItemFolder",
+            )
+            return jsonify({"error": "Keys must belong to this menu item."}), 400
+
+        menu_item = MenuItem.find_item_by_id(item_id)
+        if not menu_item or menu_item.get("restaurantId") != restaurant_id:
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=MenuItemNotFound",
+            )
+            return jsonify({"error": "Menu item not found."}), 404
+
+        current_images = [] if replace else (menu_item.get("images") or [])
+        confirmed_urls = []
+        for key in dict.fromkeys(keys):
+            head = find_uploaded_image(s3_client, S3_BUCKET, key)
+            if not head or not head.get("ContentType", "").startswith("image/"):
+                current_app.logger.warning(
+                    "ConfirmItemImagesFailed | reason=ImageNotUploaded | key=%s",
+                    key
+                )
+                return jsonify({"error": f"Image not uploaded: {key}"}), 400
+            url = s3_url(S3_BUCKET, S3_REGION, key)
+            if url not in current_images:
+                confirmed_urls.append(url)
+
+        final_image_list = current_images + confirmed_urls
+        if len(final_image_list) > MAX_IMAGES:
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=Max%sAreAllowed",
+                MAX_IMAGES
+            )
+            return jsonify({"error": f"Maximum {MAX_IMAGES} images are allowed."}), 400
+
+        updated_item = MenuItem.update_and_fetch(item_id, {"images": final_image_list})
+        if not updated_item:
+            current_app.logger.warning(
+                "ConfirmItemImagesFailed | reason=FailedToUpdateItem",
+            )
+            return jsonify({"error": "Failed to update item"}), 500
+
+        if replace:
+            images_to_delete = [img for img in (menu_item.get("images") or []) if img not in final_image_list]
+            if images_to_delete:
+                delete_images_from_s3(images_to_delete, s3_client)
+
+        # The WebP variants are built after the response, reading the uploads back from S3
+        ImageVariantService.processItemImagesInBackground(
+            current_app._get_current_object(),
+            item_id,
+            [(key, None) for key in dict.fromkeys(keys) if s3_url(S3_BUCKET, S3_REGION, key) in confirmed_urls]
+        )
+
+        current_app.logger.info(
+            "ConfirmItemImages | itemId=%s | confirmed=%s",
+            item_id,
+            len(confirmed_urls)
+        )
+        return jsonify({
+            "message": f"Confirmed {len(confirmed_urls)} image(s) successfully.",
+            "uploaded_urls": confirmed_urls,
+            "menuItem": updated_item
+        }), 200
+
+    except (NoCredentialsError, ClientError) as e:
+        current_app.logger.error(
+            "ConfirmItemImagesException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Failed to confirm images. Please check server logs."}), 500
+
 @restaurant_menu_item_bp.route('/updateItem', methods=['PUT'])
 def update_item():
     """Update specific menu item"""
@@ -504,7 +761,6 @@ def update_item():
 
         # 🖼️ Handle image uploads
         uploaded_urls = []
-        error = None
 
         # Get existing images from frontend
         existing_remote_images_from_client = []
@@ -528,24 +784,28 @@ def update_item():
         # update_data['images'] = fetched_list_from_mongodb - images_to_delete
         update_data['images'] = [img for img in fetched_list_from_mongodb if img not in images_to_delete]
             
-        success = MenuItem.update_item(item_id, update_data)
-        if not success:
+        updated_item = MenuItem.update_and_fetch(item_id, update_data)
+        if not updated_item:
             current_app.logger.warning(
                 "UpdateItemFailed | reason=FailedToUpdateItems",
             )   
             return jsonify({"error": "Failed to update item"}), 500
         
         # Step 4
-        updated_item = MenuItem.find_item_by_id(item_id)
-        
         current_images = updated_item.get('images') or []
         
         # Identify files to upload (those sent in `request.files`)
         new_images_to_upload = files.getlist("images") or []
 
         # Upload new images to S3
+        new_variant_sources = []
         if new_images_to_upload:
-            uploaded_urls, existing_urls, error = upload_images_to_s3(
+            image_bytes = []
+            for image in new_images_to_upload:
+                image_bytes.append(image.read())
+                image.stream.seek(0)
+
+            batch = upload_image_batch(
                 s3_client=s3_client,
                 bucket_name=S3_BUCKET,
                 region=S3_REGION,
@@ -553,29 +813,38 @@ def update_item():
                 restaurant_id=item['restaurantId'],
                 folder=folder,
                 item_id=item_id,
-                sub_folder=sub_folder
+                sub_folder=sub_folder,
+                image_bytes=image_bytes
             )
 
-            if error:
+            if batch["error"]:
                 current_app.logger.warning(
                     "UpdateItemFailed | reason=ImageUploadFailed",
                 )
-                return jsonify({"error": error}), 400 
+                return jsonify({"error": batch["error"]}), 400 
+
+            uploaded_urls = batch["uploaded_urls"]
+            new_variant_sources = variant_sources(batch, image_bytes, item)
 
         # Step 5
-        final_image_list = current_images + uploaded_urls
+        # Content-addressed uploads: re-sending a current image gives back its URL
+        final_image_list = list(dict.fromkeys(current_images + uploaded_urls))
         update_data['images'] = final_image_list
 
-        # Step 6
-        success = MenuItem.update_item(item_id, update_data)
-        if not success:
+        # Step 6: update and fetch updated item to return
+        updated_item = MenuItem.update_and_fetch(item_id, update_data)
+        if not updated_item:
             current_app.logger.warning(
                 "UpdateItemFailed | reason=FailedToUpdateItem",
             )
             return jsonify({"error": "Failed to update item"}), 500
 
-        # ✅ Fetch updated item to return
-        updated_item = MenuItem.find_item_by_id(item_id)
+        # Step 7: WebP variants of the new images (also drops those of removed images), built after the response
+        if new_variant_sources or images_to_delete:
+            ImageVariantService.processItemImagesInBackground(
+                current_app._get_current_object(), item_id, new_variant_sources
+            )
+
         current_app.logger.info(
             "UpdateItemSuccess | id=%s",
             item_id
@@ -596,6 +865,16 @@ def update_item():
             "details": str(e)
         }), 500
                                                        
+def variant_sources(batch, image_bytes, menu_item):
+    """(key, bytes) of the uploaded images that still need WebP variants"""
+    known = {variant["source"] for variant in (menu_item.get("imageVariants") or [])}
+    sources = {}
+    for result, data in zip(batch["results"], image_bytes):
+        # Content already stored (skipped upload) keeps the variants built for it
+        if result["key"] not in sources and not (result["skipped"] and result["url"] in known):
+            sources[result["key"]] = data
+    return list(sources.items())
+
 def normalize_menu_item_data(form, allowed_fields):
     import json
     data = {k: form.get(k) for k in allowed_fields if form.get(k) is not None}
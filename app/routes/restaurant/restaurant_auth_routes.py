@@ -1,14 +1,13 @@
 import random
 import traceback
 import boto3
-import requests
-from requests.auth import HTTPBasicAuth
 from flask import Blueprint, app, request, jsonify, session, current_app
+from app.services.auth_directory_service import AuthDirectoryService
+from app.services.twilio_verify_client import TwilioVerifyError, get_twilio_verify_client
 from firebase_admin import auth as firebase_auth
 from app.models.restaurant import Restaurant
 from bson.objectid import ObjectId
 from datetime import datetime, time
-import os
 
 restaurant_auth_bp = Blueprint('restaurant_auth', __name__)
 
@@ -44,7 +43,7 @@ def register():
             return jsonify({"error": "Invalid email format"}), 400
         
         # Check if restaurant already exists
-        if Restaurant.find_by_id(id):
+        if Restaurant.exists(id):
             current_app.logger.warning(
                 "RestaurantRegistrationFailed | id=%s | reason=RestaurantAlreadyExists",
                 id
@@ -89,59 +88,49 @@ def send_verification_code_for_registration():
 
         phone = data['phone'].strip()
 
-        # ✅ Check if user already exists in MongoDB
-        if Restaurant.find_by_phone(phone):
+        # ✅ Check MongoDB and Firebase together (Firebase answers are cached)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, Restaurant.exists_by_phone)
+        if exists_in_mongo:
             current_app.logger.warning(
                 "RestaurantSendVerificationCodeForRegistrationFailed | payload=%s | reason=RestaurantAlreadyExistInMongoDB",
                 data
             )
             return jsonify({"error": "Restaurant with this phone already exists in MongoDB"}), 409
 
-        # ✅ Check if user already exists in Firebase
-        try:
-            fb_user = firebase_auth.get_user_by_phone_number(phone)
-            if fb_user:
-                current_app.logger.warning(
-                    "RestaurantSendVerificationCodeForRegistrationFailed | payload=%s | reason=RestaurantAlreadyExistInFirebase",
-                    data
-                )
-                return jsonify({"error": "Restaurant with this phone already exists in Firebase"}), 409
-        except firebase_auth.UserNotFoundError:
-            pass  # ✅ Safe, means phone is not registered in Firebase
+        if firebase_uid:
+            current_app.logger.warning(
+                "RestaurantSendVerificationCodeForRegistrationFailed | payload=%s | reason=RestaurantAlreadyExistInFirebase",
+                data
+            )
+            return jsonify({"error": "Restaurant with this phone already exists in Firebase"}), 409
 
         # 🔹 If no user in MongoDB or Firebase → send Twilio OTP
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
-
-        url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/Verifications"
-
-        response = requests.post(
-            url,
-            data={
-                "To": phone,
-                "Channel": "sms"
-            },
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
+        status_code, details = get_twilio_verify_client().sendVerification(phone)
 
         # Twilio returns 201 Created on success
-        if response.status_code == 201:
+        if status_code == 201:
             current_app.logger.info(
                 "RestaurantSendVerificationCodeForRegistrationSuccess",
             )
             return jsonify({
                 "message": "Verification code sent successfully",
-                "details": response.json()
+                "details": details
             }), 201
         else:
             current_app.logger.warning(
-                f"RestaurantSendVerificationCodeForRegistrationFailed | reason={response.status_code}",
+                f"RestaurantSendVerificationCodeForRegistrationFailed | reason={status_code}",
             )    
             return jsonify({
                 "error": "Failed to send verification code",
-                "details": response.json()
-            }), response.status_code
+                "details": details
+            }), status_code
+
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "RestaurantSendVerificationCodeForRegistrationFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
 
     except Exception as e:
         current_app.logger.error(
@@ -249,21 +238,9 @@ def verify_code_and_register_with_phone():
             return jsonify({"error": "Invalid phone number format. Use E.164 format (e.g. +919876543210)"}), 400
 
         # ✅ Step 1: Verify OTP with Twilio
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
+        status_code, result = get_twilio_verify_client().checkVerification(phone, code)
 
-        verify_url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/VerificationCheck"
-
-        response = requests.post(
-            verify_url,
-            data={"To": phone, "Code": code},
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
-
-        result = response.json()
-
-        if response.status_code != 200 or result.get("status") != "approved":
+        if status_code != 200 or result.get("status") != "approved":
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndRegisterWithPhoneFailed | reason=PhoneVerificationFailed",
             )
@@ -273,7 +250,9 @@ def verify_code_and_register_with_phone():
             }), 400
 
         # ✅ Step 2: Check if restaurant already exists in MongoDB
-        if Restaurant.find_by_phone(phone):
+        # Firebase is asked at the same time (never from the cache: this decides which account is used)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, Restaurant.exists_by_phone, fresh=True)
+        if exists_in_mongo:
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndRegisterWithPhoneFailed | payload=%s | reason=RestaurantAlreadyExistInMongoDB",
                 data
@@ -281,13 +260,12 @@ def verify_code_and_register_with_phone():
             return jsonify({"error": "Restaurant with this phone already exists"}), 409
 
         # ✅ Step 3: Check Firebase user
-        try:
-            existing_user = firebase_auth.get_user_by_phone_number(phone)
-            if not Restaurant.find_by_id(existing_user.uid):
-                restaurant = Restaurant(existing_user.uid, None, ownerName, phone, authProvider)
+        if firebase_uid:
+            if not Restaurant.exists(firebase_uid):
+                restaurant = Restaurant(firebase_uid, None, ownerName, phone, authProvider)
                 saved_id = restaurant.save()
             else:
-                saved_id = existing_user.uid
+                saved_id = firebase_uid
 
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndRegisterWithPhoneFailed | payload=%s | reason=RestaurantAlreadyExistInFirebase",
@@ -295,7 +273,7 @@ def verify_code_and_register_with_phone():
             )  
             return jsonify({
                 "message": "Restaurant already exists in Firebase",
-                "firebaseUid": existing_user.uid,
+                "firebaseUid": firebase_uid,
                 "restaurant": {
                     "id": saved_id,
                     "ownerName": ownerName,
@@ -304,12 +282,13 @@ def verify_code_and_register_with_phone():
                 }
             }), 200
 
-        except firebase_auth.UserNotFoundError:
+        else:
             # ✅ Step 4: No user → create new in Firebase
             fb_user = firebase_auth.create_user(
                 phone_number=phone,
                 display_name=ownerName
             )
+            AuthDirectoryService.rememberFirebaseUser(phone, fb_user.uid)
 
             restaurant = Restaurant(fb_user.uid, None, ownerName, phone, authProvider, None)
             saved_id = restaurant.save()
@@ -327,6 +306,13 @@ def verify_code_and_register_with_phone():
                 }
             }), 201
 
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "RestaurantVerifyCodeAndRegisterWithPhoneFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
+
     except Exception as e:
         current_app.logger.error(
             "RestaurantVerifyCodeAndRegisterWithPhoneException | error=%s\n%s",
@@ -485,11 +471,14 @@ def login():
             )    
             return jsonify({"error": "Authentication provider mismatch"}), 401
 
-        # Update last_login_at
-        Restaurant.update_last_login(restaurant["_id"])
-
-        # Fetch updated restaurant
-        updated_restaurant = Restaurant.find_by_id(restaurant["_id"])
+        # Update last_login_at and fetch updated restaurant
+        updated_restaurant = Restaurant.update_last_login_and_fetch(restaurant["_id"])
+        if not updated_restaurant:
+            current_app.logger.warning(
+                "RestaurantLoginFailed | payload=%s | reason=RestaurantNotFound",
+                data
+            )
+            return jsonify({"error": "Restaurant not found"}), 404
         current_app.logger.info(
             "RestaurantLoginSuccess",
         )        
@@ -533,18 +522,16 @@ def send_verification_code_for_login():
 
         phone = data['phone'].strip()
 
-        # ✅ Check if user not exists in MongoDB
-        if not Restaurant.find_by_phone(phone):
+        # ✅ Check MongoDB and Firebase together (Firebase answers are cached)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, Restaurant.exists_by_phone)
+        if not exists_in_mongo:
             current_app.logger.warning(
                 "RestaurantSendVerificationCodeForLoginFailed | payload=%s | reason=RestaurantNotExistInMongoDB",
                 data
             )
             return jsonify({"error": "Restaurant with this phone does not exists in MongoDB"}), 404
 
-        # ✅ Check if user not already exists in Firebase
-        try:
-            firebase_auth.get_user_by_phone_number(phone)
-        except firebase_auth.UserNotFoundError:
+        if not firebase_uid:
             current_app.logger.warning(
                 "RestaurantSendVerificationCodeForLoginFailed | payload=%s | reason=RestaurantNotExistInFirebase",
                 data
@@ -552,38 +539,32 @@ def send_verification_code_for_login():
             return jsonify({"error": "Restaurant with this phone does not exists in Firebase"}), 404
 
         # 🔹 If no user in MongoDB or Firebase → send Twilio OTP
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
-
-        url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/Verifications"
-
-        response = requests.post(
-            url,
-            data={
-                "To": phone,
-                "Channel": "sms"
-            },
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
+        status_code, details = get_twilio_verify_client().sendVerification(phone)
 
         # Twilio returns 201 Created on success
-        if response.status_code == 201:
+        if status_code == 201:
             current_app.logger.info(
                 "RestaurantSendVerificationCodeForLoginSuccess",
             )
             return jsonify({
                 "message": "Verification code sent successfully",
-                "details": response.json()
+                "details": details
             }), 200
         else:
             current_app.logger.warning(
-                "RestaurantSendVerificationCodeForLoginFailed | reason={response.status_code}",
+                "RestaurantSendVerificationCodeForLoginFailed | reason={status_code}",
             )
             return jsonify({
                 "error": "Failed to send verification code",
-                "details": response.json()
-            }), response.status_code
+                "details": details
+            }), status_code
+
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "RestaurantSendVerificationCodeForLoginFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
 
     except Exception as e:
         current_app.logger.error(
@@ -621,21 +602,9 @@ def verify_code_and_login_with_phone():
             return jsonify({"error": "Invalid phone number format. Use E.164 format (e.g. +919876543210)"}), 400
 
         # ✅ Step 1: Verify OTP with Twilio
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
+        status_code, result = get_twilio_verify_client().checkVerification(phone, code)
 
-        verify_url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/VerificationCheck"
-
-        response = requests.post(
-            verify_url,
-            data={"To": phone, "Code": code},
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
-
-        result = response.json()
-
-        if response.status_code != 200 or result.get("status") != "approved":
+        if status_code != 200 or result.get("status") != "approved":
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndLoginWithPhoneFailed | reason=PhoneVerificationFailed",
             )
@@ -645,7 +614,9 @@ def verify_code_and_login_with_phone():
             }), 400
 
         # ✅ Step 2: Check if user not exists in MongoDB
-        if not Restaurant.find_by_phone(phone):
+        # Firebase is asked at the same time (never from the cache: this decides which account is used)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, Restaurant.exists_by_phone, fresh=True)
+        if not exists_in_mongo:
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=RestaurantAlreadyExistInMongoDB",
                 data
@@ -653,17 +624,21 @@ def verify_code_and_login_with_phone():
             return jsonify({"error": "Restaurant with this phone does not exists in MongoDB"}), 404
 
         # ✅ Step 3: Check Firebase user
-        try:
-            existing_user = firebase_auth.get_user_by_phone_number(phone)
-            if Restaurant.find_by_id(existing_user.uid):
-                restaurant = Restaurant.find_by_id(existing_user.uid)
-                Restaurant.update_last_login(restaurant["_id"])    
+        if firebase_uid:
+            # Update last_login_at and fetch updated restaurant
+            restaurant = Restaurant.update_last_login_and_fetch(firebase_uid)
+            if not restaurant:
+                current_app.logger.warning(
+                    "RestaurantVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=RestaurantNotFound",
+                    data
+                )
+                return jsonify({"error": "Restaurant not found"}), 404
             current_app.logger.info(
                 "RestaurantVerifyCodeAndLoginWithPhoneSuccess",
             )  
             return jsonify({
                 "message": "Restaurant login successful!",
-                "firebaseUid": existing_user.uid,
+                "firebaseUid": firebase_uid,
                 "restaurant": {
                     "id": restaurant["_id"],
                     "ownerName": restaurant["ownerName"],
@@ -679,7 +654,7 @@ def verify_code_and_login_with_phone():
                 }
             }), 200
 
-        except firebase_auth.UserNotFoundError:
+        else:
             # User not exist in firebase
             current_app.logger.warning(
                 "RestaurantVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=RestaurantNotExists",
@@ -687,6 +662,13 @@ def verify_code_and_login_with_phone():
             )
             return jsonify({"message": "Restaurant with this phone does not exists"}), 404
 
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "RestaurantVerifyCodeAndLoginWithPhoneFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
+
     except Exception as e:
         current_app.logger.error(
             "RestaurantVerifyCodeAndLoginWithPhoneException | error=%s\n%s",
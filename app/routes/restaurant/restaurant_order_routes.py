@@ -1,8 +1,12 @@
 import traceback
-from flask import Blueprint, current_app, jsonify, request
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
 from app.models.order import Order, OrderStatus
 from app.models.payment import Payment
 from app.models.restaurant import Restaurant
+from app.services.order_events import OrderEvents
+from datetime import datetime, timedelta
+from app.core.constansts import ORDER_DELTA_MAX_RESULTS, ORDER_DELTA_OVERLAP_SECONDS, ORDER_TOMBSTONE_TTL_SECONDS
+from app.utils.pagination import COUNT_MODES, build_pagination, decode_cursor, encode_cursor, format_watermark, parse_watermark
 
 
 restaurant_order_bp = Blueprint('restaurant_order', __name__)
@@ -10,7 +14,20 @@ restaurant_order_bp = Blueprint('restaurant_order', __name__)
 def get_mongo():
     return current_app.extensions['pymongo'][0]
 
-# TODO(Future Scope): Use websockets for realtime fetching orders 
+def attach_missing_payment_status(orders):
+    """Orders carry paymentStatus; only orders written before it was mirrored need the payments lookup"""
+    missing = [order["id"] for order in orders if "paymentStatus" not in order]
+    if not missing:
+        return
+    payment_map = {
+        payment["orderId"]: payment["paymentStatus"]
+        for payment in Payment.find_payments_by_orderIds(missing)
+    }
+    for order in orders:
+        if "paymentStatus" not in order:
+            order["paymentStatus"] = payment_map.get(order["id"])
+
+# Realtime updates after the first page: /streamOrders
 @restaurant_order_bp.route('/getAllOrders', methods=['GET'])
 def getAllOrders():
     """Get all orders of selected statuses with pagination support"""
@@ -22,6 +39,12 @@ def getAllOrders():
         # Get pagination parameters with defaults
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 10))
+        # Opaque keyset cursor from the previous page (takes precedence over page)
+        cursor = request.args.get('cursor')
+        # Total count mode: exact | estimate (capped, for busy restaurants) | none
+        count_mode = request.args.get('count', 'exact')
+        # Delta mode: watermark returned by the previous response
+        updated_since = request.args.get('updatedSince')
 
         # Validate pagination parameters
         if page < 1:
@@ -33,52 +56,47 @@ def getAllOrders():
         if page_size > 100:  # Limit maximum page size
             current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Page size cannot exceed 100")
             return jsonify({"error": "Page size cannot exceed 100"}), 400
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Invalid cursor")
+                return jsonify({"error": "Invalid cursor"}), 400
+        if count_mode not in COUNT_MODES:
+            current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Invalid count mode")
+            return jsonify({"error": f"count must be one of {', '.join(COUNT_MODES)}"}), 400
 
         if not restaurant_id:
             current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | restaurant_id is required")
             return jsonify({"error": "restaurant_id is required"}), 400
         
+        if updated_since:
+            return getOrderChanges(restaurant_id, updated_since)
+        
         if not statuses:
             current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | status is required")
             return jsonify({"error": "status is required"}), 400
 
-        restaurant = Restaurant.find_by_id(restaurant_id)
-        if not restaurant:
+        if not Restaurant.exists(restaurant_id):
             current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Invalid Request! Restaurant does not exist")
             return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404
 
-        # Get total count of orders
-        total_count = Order.find_orders_by_restaurantId(restaurantId=restaurant_id,statuses=statuses, count_only=True)
-            
-        total_pages = (total_count + page_size - 1) // page_size
-
+        # Taken before reading so changes made meanwhile are picked up by the next delta request
+        watermark = format_watermark(datetime.utcnow())
         # Calculate skip and limit for pagination
         skip = (page - 1) * page_size
-        orders = Order.find_orders_by_restaurantId(restaurant_id, statuses=statuses, skip=skip, limit=page_size)
-        order_ids = [order["id"] for order in orders]
-
-        payments = Payment.find_payments_by_orderIds(order_ids)
-
-        payment_map = {
-            payment["orderId"]: payment["paymentStatus"]
-            for payment in payments
-        }
-
-        for order in orders:
-            order["paymentStatus"] = payment_map.get(order["id"])
+        # Get the page and the total count of orders (two indexed queries, see find_page_with_total)
+        orders, total_count, total_is_exact = Order.find_orders_page_by_restaurantId(
+            restaurant_id, statuses=statuses, skip=skip, limit=page_size, cursor=cursor, count_mode=count_mode
+        )
+        attach_missing_payment_status(orders)
 
         current_app.logger.info("Fetched orders successfully | restaurantId={restaurantId}")
         return jsonify({
             "message": "Fetched orders successfully",
             "orders": orders,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_items": total_count,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+            "pagination": build_pagination(page, page_size, orders, "createdAt", total_count, total_is_exact, cursor),
+            "watermark": watermark
         }), 200
 
     except Exception as e:
@@ -92,6 +110,51 @@ def getAllOrders():
             "details": str(e)
         }), 500
 
+def getOrderChanges(restaurant_id, updated_since):
+    """getAllOrders in delta mode: orders changed and deleted since the updatedSince watermark"""
+    try:
+        since, after_id = parse_watermark(updated_since)
+    except ValueError:
+        current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Invalid updatedSince")
+        return jsonify({"error": "Invalid updatedSince"}), 400
+
+    now = datetime.utcnow()
+    if since < now - timedelta(seconds=ORDER_TOMBSTONE_TTL_SECONDS):
+        # Deletions this old are no longer recorded
+        current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | updatedSince is too old")
+        return jsonify({"error": "updatedSince is too old, fetch all orders again"}), 410
+
+    if not Restaurant.exists(restaurant_id):
+        current_app.logger.warning(f"Failed to fetch orders | restaurantId={restaurant_id} | Invalid Request! Restaurant does not exist")
+        return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404
+
+    if after_id is None:
+        # Read back a little before the watermark; clients apply changes by id, so repeats are harmless
+        read_from = since - timedelta(seconds=ORDER_DELTA_OVERLAP_SECONDS)
+    else:
+        # Continuing a truncated batch: resume strictly after its last (updatedAt, _id), no overlap,
+        # so even more than ORDER_DELTA_MAX_RESULTS changes with one updatedAt make progress
+        read_from = since
+    orders = Order.find_orders_by_restaurantId(
+        restaurant_id, limit=ORDER_DELTA_MAX_RESULTS, updated_since=read_from, updated_after_id=after_id
+    )
+    deleted_order_ids = Order.find_tombstones_since(restaurant_id, read_from)
+
+    has_more = len(orders) == ORDER_DELTA_MAX_RESULTS
+    # A truncated batch resumes after its last change (keyset), a complete one from the time of the read
+    watermark = encode_cursor(orders[-1], "updatedAt") if has_more else format_watermark(now)
+
+    attach_missing_payment_status(orders)
+
+    current_app.logger.info(f"Fetched order changes successfully | restaurantId={restaurant_id} | changed={len(orders)} | deleted={len(deleted_order_ids)}")
+    return jsonify({
+        "message": "Fetched order changes successfully",
+        "orders": orders,
+        "deletedOrderIds": deleted_order_ids,
+        "watermark": watermark,
+        "hasMore": has_more
+    }), 200
+
 @restaurant_order_bp.route('/updateOrderStatus', methods=['POST'])
 def updateOrderStatus():
     """Update status of Order"""
@@ -110,8 +173,7 @@ def updateOrderStatus():
         restaurantId = data['restaurantId']
         status=data['status']    
 
-        restaurant = Restaurant.find_by_id(restaurantId)
-        if not restaurant:
+        if not Restaurant.exists(restaurantId):
             current_app.logger.warning(f"Failed to update orders | restaurantId={restaurantId} | Invalid Request! Restaurant does not exist")
             return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404
         
@@ -136,21 +198,14 @@ def updateOrderStatus():
         
         update_data = {"status": status}
         
-        success = Order.update_order(orderId, update_data)
-        if not success:
+        order = Order.update_and_fetch(orderId, update_data)
+        if not order:
             current_app.logger.warning(
                 "UpdateOrderStatusFailed | reason=FailedToUpdateOrderStatus",
             )
             return jsonify({"error": "Failed to update order status."}), 500
         
-        order = Order.find_order_by_id(orderId)
-        if not order:
-            current_app.logger.warning(f"Failed to update order | restaurantId={restaurantId} | Invalid Request! Failed to fetch order again.")
-            return jsonify({"error": "Invalid Request! Failed to fetch order again."}), 500
-        
-        payment = Payment.find_payment_by_orderId(order["id"])
-
-        order["paymentStatus"] = payment["paymentStatus"]
+        attach_missing_payment_status([order])
         
         current_app.logger.info(
             "UpdateOrderStatusSuccess | id=%s",
@@ -167,5 +222,47 @@ def updateOrderStatus():
             str(e),
             traceback.format_exc()
         )
-        return jsonify({"error": "Failed to update order status", "details": str(e)}), 500    
-    
\ No newline at end of file
+        return jsonify({"error": "Failed to update order status", "details": str(e)}), 500
+
+@restaurant_order_bp.route('/streamOrders', methods=['GET'])
+def streamOrders():
+    """Stream new and changed orders of a restaurant as server-sent events"""
+    try:
+        restaurant_id = request.args.get('restaurant_id')
+        # Browsers resend the id of the last received event on reconnect
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+
+        if not restaurant_id:
+            current_app.logger.warning("StreamOrdersFailed | reason=MissingRestaurantId")
+            return jsonify({"error": "restaurant_id is required"}), 400
+
+        if not Restaurant.exists(restaurant_id):
+            current_app.logger.warning(f"StreamOrdersFailed | reason=RestaurantNotFound | restaurantId={restaurant_id}")
+            return jsonify({"error": "Restaurant not found"}), 404
+
+        source = OrderEvents.source()
+        if source is None:
+            current_app.logger.warning(f"StreamOrdersFailed | reason=NoSharedEventSource | restaurantId={restaurant_id}")
+            return jsonify({
+                "error": "Order streaming is unavailable on this server, poll getAllOrders with updatedSince instead"
+            }), 503
+        events = OrderEvents.streamRestaurantOrders(restaurant_id, last_event_id, current_app.json.dumps, source)
+
+        current_app.logger.info(f"StreamOrdersStarted | restaurantId={restaurant_id} | source={source} | resumed={bool(last_event_id)}")
+        return Response(
+            stream_with_context(events),
+            mimetype="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                # Keep reverse proxies from buffering the stream
+                "X-Accel-Buffering": "no"
+            }
+        )
+
+    except Exception as e:
+        current_app.logger.error(
+            "StreamOrdersException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Failed to stream orders", "details": str(e)}), 500
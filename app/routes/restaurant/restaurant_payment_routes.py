@@ -3,6 +3,8 @@ from flask import Blueprint, current_app, jsonify, request
 from app.models.order import Order
 from app.models.payment import Payment, PaymentStatus
 from app.models.restaurant import Restaurant
+from app.core.exceptions import BusinessException
+from app.services.payment_service import PaymentService
 
 restaurant_payment_bp = Blueprint('restaurant_payment', __name__)
 
@@ -27,8 +29,7 @@ def updatePaymentStatus():
         restaurantId = data['restaurantId']
         paymentStatus=data['paymentStatus']    
 
-        restaurant = Restaurant.find_by_id(restaurantId)
-        if not restaurant:
+        if not Restaurant.exists(restaurantId):
             current_app.logger.warning(f"Failed to update orders | restaurantId={restaurantId} | Invalid Request! Restaurant does not exist")
             return jsonify({"error": "Invalid Request! Restaurant does not exist"}), 404
         
@@ -56,23 +57,8 @@ def updatePaymentStatus():
                 "allowed_statuses": [s.value for s in PaymentStatus]
             }), 400           
         
-        update_data = {"paymentStatus": paymentStatus}
-        
-        success = Payment.update_payment(payment["id"], update_data)
-        if not success:
-            current_app.logger.warning(
-                "UpdatePaymentStatusFailed | reason=FailedToUpdatePaymentStatus",
-            )
-            return jsonify({"error": "Failed to update payment status."}), 500
-        
-        order = Order.find_order_by_id(orderId)
-        if not order:
-            current_app.logger.warning(f"Failed to update order | restaurantId={restaurantId} | Invalid Request! Failed to fetch order again.")
-            return jsonify({"error": "Invalid Request! Failed to fetch order again."}), 500
-        
-        payment = Payment.find_payment_by_orderId(order["id"])
-
-        order["paymentStatus"] = payment["paymentStatus"]
+        # Updates the payment and its paymentStatus mirror on the order together
+        order = PaymentService.updatePaymentStatus(payment["id"], paymentStatus)
         
         current_app.logger.info(
             "UpdateOrderStatusSuccess | id=%s",
@@ -83,6 +69,13 @@ def updatePaymentStatus():
             "order": order
         }), 200
         
+    except BusinessException as e:
+        current_app.logger.warning(
+            "UpdatePaymentStatusFailed | reason=%s",
+            str(e.code)
+        )
+        return jsonify({"error_code": str(e.code), "message": str(e.message)}), 404
+
     except Exception as e:
         current_app.logger.error(
             "UpdateOrderStatusException | error=%s\n%s",
@@ -1,9 +1,11 @@
 import traceback
 from flask import Blueprint, app, request, jsonify, session, current_app
 from app.models.restaurant import Restaurant
-from app.utils.aws_utils import delete_images_from_s3
+from app.core.constansts import S3_MAX_IMAGE_BYTES, S3_PRESIGNED_POST_EXPIRES_SECONDS
+from app.utils.aws_utils import allowed_file, delete_images_from_s3, find_uploaded_image, presign_image_upload, presigned_key, s3_url
 from app.utils.decorators import login_required, admin_required
 from firebase_admin import auth as firebase_auth
+from app.services.auth_directory_service import AuthDirectoryService
 from bson.objectid import ObjectId
 from werkzeug.utils import secure_filename
 from app.extensions import s3_client, S3_BUCKET, S3_REGION
@@ -79,16 +81,14 @@ def update_profile():
         
         id = data['id']       
         
-        # Update restaurant
-        success = Restaurant.update_restaurant(id, update_data)
-        if not success:
+        # Update restaurant and get updated restaurant data
+        restaurant = Restaurant.update_and_fetch(id, update_data)
+        if not restaurant:
             current_app.logger.warning(
                 "UpdateRestaurantProfileFailed | reason=FailedToUpdateRestaurantProfile",
             )
             return jsonify({"error": "Failed to update profile"}), 500
         
-        # Get updated restaurant data
-        restaurant = Restaurant.find_by_id(id)
         restaurant_data = {
             "id": restaurant['_id'],
             "email": restaurant['email'],
@@ -141,6 +141,7 @@ def delete_restaurant():
         # --- Step 1: Delete from Firebase ---
         try:
             firebase_auth.delete_user(id)
+            AuthDirectoryService.forgetFirebaseUid(id)
         except firebase_auth.UserNotFoundError:
             current_app.logger.warning(
                 "DeleteRestaurantFailed | reason=UserNotFoundInFirebase",
@@ -324,17 +325,15 @@ def upload_restaurant_profile_picture():
         # Generate public URL
         file_url = f"https://{S3_BUCKET}.s3.{S3_REGION}.amazonaws.com/{s3_key}"
 
-        # Update restaurant document
+        # Update restaurant document and fetch updated restaurant data
         update_data = {"photoUrl": file_url}
-        success = Restaurant.update_restaurant(restaurant_id, update_data)
-        if not success:
+        restaurant = Restaurant.update_and_fetch(restaurant_id, update_data)
+        if not restaurant:
             current_app.logger.warning(
                 "UploadRestaurantProfilePictureFailed | reason=FailedToUpdateRestaurantImageURL",
             )
             return jsonify({"error": "Failed to update restaurant image URL."}), 501
 
-        # Fetch updated restaurant data
-        restaurant = Restaurant.find_by_id(restaurant_id)
         restaurant_data = {
             "id": restaurant["_id"],
             "email": restaurant["email"],
@@ -368,6 +367,168 @@ def upload_restaurant_profile_picture():
         )
         return jsonify({"error": "Upload failed, please check server logs."}), 500
 
+def profile_picture_prefix(folder, restaurant_id, sub_folder):
+    """Folder of a restaurant's presigned profile pictures, next to upload_restaurant_profile_picture's profile.<ext>"""
+    if sub_folder:
+        return f"{folder.rstrip('/')}/{restaurant_id}/{sub_folder.rstrip('/')}/profile/"
+    return f"{folder.rstrip('/')}/{restaurant_id}/profile/"
+
+@restaurant_bp.route("/presign_restaurant_profile_picture", methods=["POST"])
+def presign_restaurant_profile_picture():
+    """
+    Issue a presigned POST policy so the client uploads the profile picture straight to S3,
+    then calls /confirm_restaurant_profile_picture. The key is fresh for every upload
+    (filename only supplies the extension), so the live picture is never overwritten.
+    Required: restaurant_id, folder, filename, contentType
+    Optional: sub_folder
+    """
+    data = request.get_json(silent=True) or {}
+    restaurant_id = data.get("restaurant_id")
+    folder = data.get("folder")
+    sub_folder = (data.get("sub_folder") or "").strip()
+    filename = str(data.get("filename") or "")
+    content_type = str(data.get("contentType") or "")
+
+    if not restaurant_id:
+        current_app.logger.warning(
+            "PresignRestaurantProfilePictureFailed | reason=RestaurantIdRequired",
+        )
+        return jsonify({"error": "restaurant_id is required."}), 400
+    if not folder:
+        current_app.logger.warning(
+            "PresignRestaurantProfilePictureFailed | reason=FolderRequired",
+        )
+        return jsonify({"error": "folder is required."}), 400
+    if not filename or not allowed_file(filename) or not content_type.startswith("image/"):
+        current_app.logger.warning(
+            "PresignRestaurantProfilePictureFailed | reason=UnsupportedFileType",
+        )
+        return jsonify({"error": "Unsupported file type."}), 400
+    if not Restaurant.exists(restaurant_id):
+        current_app.logger.warning(
+            "PresignRestaurantProfilePictureFailed | reason=RestaurantNotFound",
+        )
+        return jsonify({"error": "Restaurant not found."}), 404
+
+    try:
+        s3_key = presigned_key(profile_picture_prefix(folder, restaurant_id, sub_folder), filename)
+        upload = presign_image_upload(s3_client, S3_BUCKET, s3_key, content_type)
+
+        current_app.logger.info(
+            "PresignRestaurantProfilePicture | restaurantId=%s",
+            restaurant_id
+        )
+        return jsonify({
+            "key": s3_key,
+            "url": upload["url"],
+            "fields": upload["fields"],
+            "expiresIn": S3_PRESIGNED_POST_EXPIRES_SECONDS,
+            "maxBytes": S3_MAX_IMAGE_BYTES
+        }), 200
+
+    except (NoCredentialsError, ClientError) as e:
+        current_app.logger.error(
+            "PresignRestaurantProfilePictureException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Failed to prepare upload, please check server logs."}), 500
+
+@restaurant_bp.route("/confirm_restaurant_profile_picture", methods=["POST"])
+def confirm_restaurant_profile_picture():
+    """
+    Record a profile picture uploaded with /presign_restaurant_profile_picture, after checking
+    with head_object that it exists. The previous picture is deleted once the new one is recorded.
+    Required: restaurant_id, folder, key
+    Optional: sub_folder
+    """
+    data = request.get_json(silent=True) or {}
+    restaurant_id = data.get("restaurant_id")
+    folder = data.get("folder")
+    sub_folder = (data.get("sub_folder") or "").strip()
+    s3_key = data.get("key")
+
+    if not restaurant_id:
+        current_app.logger.warning(
+            "ConfirmRestaurantProfilePictureFailed | reason=RestaurantIdRequired",
+        )
+        return jsonify({"error": "restaurant_id is required."}), 400
+    if not folder:
+        current_app.logger.warning(
+            "ConfirmRestaurantProfilePictureFailed | reason=FolderRequired",
+        )
+        return jsonify({"error": "folder is required."}), 400
+
+    # Only keys presigned for the restaurant's own profile folder can be confirmed
+    prefix = profile_picture_prefix(folder, restaurant_id, sub_folder)
+    name = s3_key[len(prefix):] if isinstance(s3_key, str) and s3_key.startswith(prefix) else ""
+    if not name or "/" in name or not allowed_file(name):
+        current_app.logger.warning(
+            "ConfirmRestaurantProfilePictureFailed | reason=InvalidKey",
+        )
+        return jsonify({"error": "key does not belong to this restaurant's profile picture."}), 400
+
+    try:
+        head = find_uploaded_image(s3_client, S3_BUCKET, s3_key)
+        if not head or not head.get("ContentType", "").startswith("image/"):
+            current_app.logger.warning(
+                "ConfirmRestaurantProfilePictureFailed | reason=ImageNotUploaded",
+            )
+            return jsonify({"error": "Image not uploaded."}), 400
+
+        previous = Restaurant.find_by_id(restaurant_id, projection=Restaurant.SUMMARY_VIEW)
+        if not previous:
+            current_app.logger.warning(
+                "ConfirmRestaurantProfilePictureFailed | reason=RestaurantNotFound",
+            )
+            return jsonify({"error": "Restaurant not found."}), 404
+
+        file_url = s3_url(S3_BUCKET, S3_REGION, s3_key)
+        restaurant = Restaurant.update_and_fetch(restaurant_id, {"photoUrl": file_url})
+        if not restaurant:
+            current_app.logger.warning(
+                "ConfirmRestaurantProfilePictureFailed | reason=FailedToUpdateRestaurantImageURL",
+            )
+            return jsonify({"error": "Failed to update restaurant image URL."}), 501
+
+        # The replaced picture, if it was one of this restaurant's own uploads
+        previous_url = previous.get("photoUrl")
+        own_prefix = s3_url(S3_BUCKET, S3_REGION, f"{folder.rstrip('/')}/{restaurant_id}/")
+        if previous_url and previous_url != file_url and previous_url.startswith(own_prefix):
+            delete_images_from_s3([previous_url], s3_client)
+
+        restaurant_data = {
+            "id": restaurant["_id"],
+            "email": restaurant["email"],
+            "ownerName": restaurant["ownerName"],
+            "name": restaurant["name"],
+            "phone": restaurant["phone"],
+            "authProvider": restaurant["authProvider"],
+            "address": restaurant["address"],
+            "photoUrl": restaurant["photoUrl"],
+            "description": restaurant["description"],
+            "menuItems": restaurant["menuItems"],
+        }
+
+        current_app.logger.info(
+            "ConfirmRestaurantProfilePictureSuccess | restaurantId=%s",
+            restaurant_id
+        )
+        return jsonify({
+            "message": "Image uploaded successfully (old image replaced if existed).",
+            "file_url": file_url,
+            "path_in_bucket": s3_key,
+            "restaurant": restaurant_data
+        }), 200
+
+    except (NoCredentialsError, ClientError) as e:
+        current_app.logger.error(
+            "ConfirmRestaurantProfilePictureException | error=%s\n%s",
+            str(e),
+            traceback.format_exc()
+        )
+        return jsonify({"error": "Upload failed, please check server logs."}), 500
+
 @restaurant_bp.route("/remove_restaurant_profile_picture", methods=["DELETE"])
 def remove_restaurant_profile_picture():
     """
@@ -420,15 +581,13 @@ def remove_restaurant_profile_picture():
 
         # Clear the restaurant's photoUrl in DB
         update_data = {"photoUrl": ""}
-        success = Restaurant.update_restaurant(restaurant_id, update_data)
-        if not success:
+        restaurant = Restaurant.update_and_fetch(restaurant_id, update_data)
+        if not restaurant:
             current_app.logger.warning(
                 "RemoveRestaurantProfilePictureFailed | reason=FailedToUpdateRestaurantRecord",
             )
             return jsonify({"error": "Failed to update restaurant record."}), 501
 
-        # Fetch updated restaurant
-        restaurant = Restaurant.find_by_id(restaurant_id)
         restaurant_data = {
             "id": restaurant["_id"],
             "email": restaurant["email"],
@@ -1,12 +1,11 @@
 import traceback
-import requests
-from requests.auth import HTTPBasicAuth
 from flask import Blueprint, app, request, jsonify, session, current_app
+from app.services.auth_directory_service import AuthDirectoryService
+from app.services.twilio_verify_client import TwilioVerifyError, get_twilio_verify_client
 from firebase_admin import auth as firebase_auth
 from app.models.user import User
 from bson.objectid import ObjectId
 from datetime import datetime
-import os
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -41,7 +40,7 @@ def register():
             return jsonify({"error": "Invalid email format"}), 400
         
         # Check if user already exists
-        if User.find_by_id(id):
+        if User.exists(id):
             current_app.logger.warning(
                 "UserRegistrationFailed | id=%s | reason=UserAlreadyExists",
                 id
@@ -86,59 +85,49 @@ def send_verification_code_for_registration():
 
         phone = data['phone'].strip()
 
-        # ✅ Check if user already exists in MongoDB
-        if User.find_by_phone(phone):
+        # ✅ Check MongoDB and Firebase together (Firebase answers are cached)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, User.exists_by_phone)
+        if exists_in_mongo:
             current_app.logger.warning(
                 "UserSendVerificationCodeForRegistrationFailed | payload=%s | reason=UserAlreadyExistInMongoDB",
                 data
             )
             return jsonify({"error": "User with this phone already exists in MongoDB"}), 409
 
-        # ✅ Check if user already exists in Firebase
-        try:
-            fb_user = firebase_auth.get_user_by_phone_number(phone)
-            if fb_user:
-                current_app.logger.warning(
-                    "UserSendVerificationCodeForRegistrationFailed | payload=%s | reason=UserAlreadyExistInFirebase",
-                    data
-                )
-                return jsonify({"error": "User with this phone already exists in Firebase"}), 409
-        except firebase_auth.UserNotFoundError:
-            pass  # ✅ Safe, means phone is not registered in Firebase
+        if firebase_uid:
+            current_app.logger.warning(
+                "UserSendVerificationCodeForRegistrationFailed | payload=%s | reason=UserAlreadyExistInFirebase",
+                data
+            )
+            return jsonify({"error": "User with this phone already exists in Firebase"}), 409
 
         # 🔹 If no user in MongoDB or Firebase → send Twilio OTP
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
-
-        url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/Verifications"
-
-        response = requests.post(
-            url,
-            data={
-                "To": phone,
-                "Channel": "sms"
-            },
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
+        status_code, details = get_twilio_verify_client().sendVerification(phone)
 
         # Twilio returns 201 Created on success
-        if response.status_code == 201:
+        if status_code == 201:
             current_app.logger.info(
                 "UserSendVerificationCodeForRegistrationSuccess",
             )
             return jsonify({
                 "message": "Verification code sent successfully",
-                "details": response.json()
+                "details": details
             }), 201
         else:
             current_app.logger.warning(
-                f"UserSendVerificationCodeForRegistrationFailed | reason={response.status_code}",
+                f"UserSendVerificationCodeForRegistrationFailed | reason={status_code}",
             )
             return jsonify({
                 "error": "Failed to send verification code",
-                "details": response.json()
-            }), response.status_code
+                "details": details
+            }), status_code
+
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "UserSendVerificationCodeForRegistrationFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
 
     except Exception as e:
         current_app.logger.error(
@@ -177,21 +166,9 @@ def verify_code_and_register_with_phone():
             return jsonify({"error": "Invalid phone number format. Use E.164 format (e.g. +919876543210)"}), 400
 
         # ✅ Step 1: Verify OTP with Twilio
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
+        status_code, result = get_twilio_verify_client().checkVerification(phone, code)
 
-        verify_url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/VerificationCheck"
-
-        response = requests.post(
-            verify_url,
-            data={"To": phone, "Code": code},
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
-
-        result = response.json()
-
-        if response.status_code != 200 or result.get("status") != "approved":
+        if status_code != 200 or result.get("status") != "approved":
             current_app.logger.warning(
                 "UserVerifyCodeAndRegisterWithPhoneFailed | reason=PhoneVerificationFailed",
             )
@@ -201,7 +178,9 @@ def verify_code_and_register_with_phone():
             }), 400
 
         # ✅ Step 2: Check if user already exists in MongoDB
-        if User.find_by_phone(phone):
+        # Firebase is asked at the same time (never from the cache: this decides which account is used)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, User.exists_by_phone, fresh=True)
+        if exists_in_mongo:
             current_app.logger.warning(
                 "UserVerifyCodeAndRegisterWithPhoneFailed | payload=%s | reason=UserAlreadyExistInMongoDB",
                 data
@@ -209,13 +188,12 @@ def verify_code_and_register_with_phone():
             return jsonify({"error": "User with this phone already exists"}), 409
 
         # ✅ Step 3: Check Firebase user
-        try:
-            existing_user = firebase_auth.get_user_by_phone_number(phone)
-            if not User.find_by_id(existing_user.uid):
-                user = User(existing_user.uid, None, name, phone, authProvider)
+        if firebase_uid:
+            if not User.exists(firebase_uid):
+                user = User(firebase_uid, None, name, phone, authProvider)
                 saved_id = user.save()
             else:
-                saved_id = existing_user.uid
+                saved_id = firebase_uid
 
             current_app.logger.warning(
                 "UserVerifyCodeAndRegisterWithPhoneFailed | payload=%s | reason=UserAlreadyExistInFirebase",
@@ -223,7 +201,7 @@ def verify_code_and_register_with_phone():
             )  
             return jsonify({
                 "message": "User already exists in Firebase",
-                "firebaseUid": existing_user.uid,
+                "firebaseUid": firebase_uid,
                 "user": {
                     "id": saved_id,
                     "name": name,
@@ -232,12 +210,13 @@ def verify_code_and_register_with_phone():
                 }
             }), 200
 
-        except firebase_auth.UserNotFoundError:
+        else:
             # ✅ Step 4: No user → create new in Firebase
             fb_user = firebase_auth.create_user(
                 phone_number=phone,
                 display_name=name
             )
+            AuthDirectoryService.rememberFirebaseUser(phone, fb_user.uid)
 
             user = User(fb_user.uid, None, name, phone, authProvider)
             saved_id = user.save()
@@ -255,6 +234,13 @@ def verify_code_and_register_with_phone():
                 }
             }), 201
 
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "UserVerifyCodeAndRegisterWithPhoneFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
+
     except Exception as e:
         current_app.logger.error(
             "UserVerifyCodeAndRegisterWithPhoneException | error=%s\n%s",
@@ -317,11 +303,14 @@ def login():
             )
             return jsonify({"error": "Authentication provider mismatch"}), 401
 
-        # Update last_login_at
-        User.update_last_login(user["_id"])
-
-        # Fetch updated user
-        updated_user = User.find_by_id(user["_id"])
+        # Update last_login_at and fetch updated user
+        updated_user = User.update_last_login_and_fetch(user["_id"])
+        if not updated_user:
+            current_app.logger.warning(
+                "UserLoginFailed | payload=%s | reason=UserNotFound",
+                data
+            )
+            return jsonify({"error": "User not found"}), 404
         current_app.logger.info(
             "UserLoginSuccess",
         )
@@ -361,18 +350,16 @@ def send_verification_code_for_login():
 
         phone = data['phone'].strip()
 
-        # ✅ Check if user not exists in MongoDB
-        if not User.find_by_phone(phone):
+        # ✅ Check MongoDB and Firebase together (Firebase answers are cached)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, User.exists_by_phone)
+        if not exists_in_mongo:
             current_app.logger.warning(
                 "UserSendVerificationCodeForLoginFailed | payload=%s | reason=UserNotExistInMongoDB",
                 data
             )
             return jsonify({"error": "User with this phone does not exists in MongoDB"}), 404
 
-        # ✅ Check if user not already exists in Firebase
-        try:
-            firebase_auth.get_user_by_phone_number(phone)
-        except firebase_auth.UserNotFoundError:
+        if not firebase_uid:
             current_app.logger.warning(
                 "UserSendVerificationCodeForLoginFailed | payload=%s | reason=UserNotExistInFirebase",
                 data
@@ -380,38 +367,32 @@ def send_verification_code_for_login():
             return jsonify({"error": "User with this phone does not exists in Firebase"}), 404
 
         # 🔹 If no user in MongoDB or Firebase → send Twilio OTP
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
-
-        url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/Verifications"
-
-        response = requests.post(
-            url,
-            data={
-                "To": phone,
-                "Channel": "sms"
-            },
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
+        status_code, details = get_twilio_verify_client().sendVerification(phone)
 
         # Twilio returns 201 Created on success
-        if response.status_code == 201:
+        if status_code == 201:
             current_app.logger.info(
                 "UserSendVerificationCodeForLoginSuccess",
             )
             return jsonify({
                 "message": "Verification code sent successfully",
-                "details": response.json()
+                "details": details
             }), 200
         else:
             current_app.logger.warning(
-                "UserSendVerificationCodeForLoginFailed | reason={response.status_code}",
+                "UserSendVerificationCodeForLoginFailed | reason={status_code}",
             )
             return jsonify({
                 "error": "Failed to send verification code",
-                "details": response.json()
-            }), response.status_code
+                "details": details
+            }), status_code
+
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "UserSendVerificationCodeForLoginFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
 
     except Exception as e:
         current_app.logger.error(
@@ -449,21 +430,9 @@ def verify_code_and_login_with_phone():
             return jsonify({"error": "Invalid phone number format. Use E.164 format (e.g. +919876543210)"}), 400
 
         # ✅ Step 1: Verify OTP with Twilio
-        TWILIO_SID = os.getenv("TWILIO_SID")
-        TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
-        VERIFY_SERVICE_SID = os.getenv("VERIFY_SERVICE_SID")
+        status_code, result = get_twilio_verify_client().checkVerification(phone, code)
 
-        verify_url = f"https://verify.twilio.com/v2/Services/{VERIFY_SERVICE_SID}/VerificationCheck"
-
-        response = requests.post(
-            verify_url,
-            data={"To": phone, "Code": code},
-            auth=HTTPBasicAuth(TWILIO_SID, TWILIO_AUTH_TOKEN)
-        )
-
-        result = response.json()
-
-        if response.status_code != 200 or result.get("status") != "approved":
+        if status_code != 200 or result.get("status") != "approved":
             current_app.logger.warning(
                 "UserVerifyCodeAndLoginWithPhoneFailed | reason=PhoneVerificationFailed",
             )
@@ -473,7 +442,9 @@ def verify_code_and_login_with_phone():
             }), 400
 
         # ✅ Step 2: Check if user not exists in MongoDB
-        if not User.find_by_phone(phone):
+        # Firebase is asked at the same time (never from the cache: this decides which account is used)
+        exists_in_mongo, firebase_uid = AuthDirectoryService.lookupPhone(phone, User.exists_by_phone, fresh=True)
+        if not exists_in_mongo:
             current_app.logger.warning(
                 "UserVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=UserAlreadyExistInMongoDB",
                 data
@@ -481,17 +452,21 @@ def verify_code_and_login_with_phone():
             return jsonify({"error": "User with this phone does not exists in MongoDB"}), 404
 
         # ✅ Step 3: Check Firebase user
-        try:
-            existing_user = firebase_auth.get_user_by_phone_number(phone)
-            if User.find_by_id(existing_user.uid):
-                user = User.find_by_id(existing_user.uid)
-                User.update_last_login(user["_id"])    
+        if firebase_uid:
+            # Update last_login_at and fetch updated user
+            user = User.update_last_login_and_fetch(firebase_uid)
+            if not user:
+                current_app.logger.warning(
+                    "UserVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=UserNotFound",
+                    data
+                )
+                return jsonify({"error": "User not found"}), 404
             current_app.logger.info(
                 "UserVerifyCodeAndLoginWithPhoneSuccess",
             )
             return jsonify({
                 "message": "User login successful!",
-                "firebaseUid": existing_user.uid,
+                "firebaseUid": firebase_uid,
                 "user": {
                     "id": user["_id"],
                     "name": user["name"],
@@ -502,7 +477,7 @@ def verify_code_and_login_with_phone():
                 }
             }), 200
 
-        except firebase_auth.UserNotFoundError:
+        else:
             # User not exist in firebase
             current_app.logger.warning(
                 "UserVerifyCodeAndLoginWithPhoneFailed | payload=%s | reason=UserNotExists",
@@ -510,6 +485,13 @@ def verify_code_and_login_with_phone():
             )
             return jsonify({"message": "User with this phone does not exists"}), 404
 
+    except TwilioVerifyError as e:
+        current_app.logger.warning(
+            "UserVerifyCodeAndLoginWithPhoneFailed | reason=TwilioUnavailable | error=%s",
+            str(e)
+        )
+        return jsonify({"error": "Verification service is temporarily unavailable"}), 503
+
     except Exception as e:
         current_app.logger.error(
             "UserVerifyCodeAndLoginWithPhoneException | error=%s\n%s",
@@ -2,9 +2,10 @@ import traceback
 from enum import Enum
 from bson import ObjectId
 from flask import Blueprint, current_app, jsonify, request
+from app.core.constansts import CART_UPDATE_MAX_ATTEMPTS
 from app.models.cart import Cart, CartStatus
 from app.models.menu_item import MenuItem
-from app.models.restaurant import Restaurant
+from app.services.cart_service import CartService
 from app.services.pricing_service import PricingService
 
 user_cart_bp = Blueprint('cart', __name__)
@@ -51,12 +52,8 @@ def get_all_cart_items():
         limit = page_size
         cartItems = cart['items'][skip : skip + limit]
         
-        for cartItem in cartItems:
-            # Get menu item details and restaurant name details
-            menuItem = MenuItem.find_item_by_id(cartItem["menuItemId"])
-            restaurant = Restaurant.find_by_id(menuItem["restaurantId"])
-            menuItem['restaurantName'] = restaurant['name']
-            cartItem['menuItem'] = menuItem
+        # Get menu item details and restaurant name details for the whole page
+        CartService.hydrateCartItems(cartItems)
         current_app.logger.info("Fetched cart items successfully | userId={userId}")
         return jsonify({
             "message": "Fetched cart items successfully",
@@ -79,6 +76,13 @@ def get_all_cart_items():
         )
         return jsonify({"error": "Failed to get all cart items", "details": str(e)}), 500
 
+def find_cart_line(cart, menuItemId):
+    """Return the cart line of menuItemId, or None"""
+    for existing_item in cart['items']:
+        if existing_item['menuItemId'] == menuItemId:
+            return existing_item
+    return None
+
 @user_cart_bp.route('/addNewItem', methods=['POST'])
 def add_new_Item():
     """Add new item to cart""" 
@@ -97,7 +101,7 @@ def add_new_Item():
         restaurantId = data['restaurantId'].strip()
         userId = data['userId'].strip()
         
-        menuItem = MenuItem.find_item_by_id(menuItemId)
+        menuItem = MenuItem.find_item_by_id(menuItemId, projection=MenuItem.STOCK_VIEW)
         if not menuItem:
             current_app.logger.warning(
                     "AddCartItemFailed | restaurantId=%s | userId=%s | reason=MenuItemNotFound",
@@ -117,11 +121,27 @@ def add_new_Item():
             "totalPrice": menuItem['price'] * defaultItemQuantity
         }
         
-        # Check if cart exist for this user
-        cart = Cart.find_cart_by_userId(userId)
-        # If cart exist
-        if cart:
-            # then check if the item adding to cart is from same restaurant (have same restaurantId)
+        # Each step is a single conditional write; the cart is only read when none of them matched
+        updated_cart = None
+        for _ in range(CART_UPDATE_MAX_ATTEMPTS):
+            # Item already in cart: increase its quantity and total price
+            updated_cart = Cart.increment_item_quantity(userId, menuItemId, menuItem['price'], defaultItemQuantity, restaurantId=restaurantId)
+            if updated_cart:
+                break
+            # Item not in cart: append it
+            updated_cart = Cart.push_item(userId, restaurantId, item)
+            if updated_cart:
+                break
+            # Cart not exist: create new cart with this item
+            updated_cart = Cart.create_cart_if_absent(restaurantId, userId, item)
+            if updated_cart:
+                break
+            
+            cart = Cart.find_cart_by_userId(userId)
+            if not cart:
+                # Cart was deleted in between, try again
+                continue
+            # Check if the item adding to cart is from same restaurant (have same restaurantId)
             if cart['restaurantId'] != restaurantId:
                 current_app.logger.warning(
                     "AddCartItemFailed | restaurantId=%s | userId=%s | reason=DifferentRestaurantId",
@@ -139,51 +159,25 @@ def add_new_Item():
                 return jsonify({
                     "error": "You cannot add items while cart is locked!"
                 }), 405
-            
-            # Check the item exist in the list
-            # if item exist in cart increase its quantity and total price
-            itemExists = False
-            for existing_item in cart['items']:
-                if existing_item['menuItemId'] == item['menuItemId']:
-                    itemExists = True
-                    existing_item['quantity'] += item['quantity']
-                    existing_item['totalPrice'] += item['totalPrice']
+            # Item is in cart at an older price: increase it at the price it was added with
+            existing_item = find_cart_line(cart, menuItemId)
+            if existing_item:
+                updated_cart = Cart.increment_item_quantity(userId, menuItemId, existing_item['price'], defaultItemQuantity, restaurantId=restaurantId)
+                if updated_cart:
                     break
-                
-            if not itemExists:               
-                # Append item
-                cart['items'].append(item)
-                
-            # Calculate total amount
-            totalAmount = 0
-            for item in cart['items']:
-                totalAmount += item['totalPrice']
-            
-            # Save updated cart
-            success = Cart.update_cart(cart['id'], {"items": cart['items'], "totalAmount": totalAmount})
-            
-            if success:
-                updated_cart = Cart.find_cart_by_id(cart['id'])
-                current_app.logger.info(
-                    "CartItemAdded | id=%s | restaurantId=%s | userId=%s",
-                    cart["id"], restaurantId, userId
-                )
-                return jsonify({"message": "Item added to cart successfully", "cart": updated_cart}), 200  
-            
-        else:
-            # If Cart not exist create new cart and add item in it.
-            new_cart = Cart(restaurantId, userId, [item])
-            
-            # Create cart
-            saved_id = new_cart.save()
-            
-            updated_cart = Cart.find_cart_by_id(saved_id)
-            current_app.logger.info(
-                "CartItemAdded | id=%s | restaurantId=%s | userId=%s",
-                saved_id, restaurantId, userId
+        
+        if not updated_cart:
+            current_app.logger.warning(
+                "AddCartItemFailed | restaurantId=%s | userId=%s | reason=ConcurrentCartUpdate",
+                restaurantId, userId
             )
-            
-            return jsonify({"message": "Item added to cart successfully", "cart": updated_cart}), 200    
+            return jsonify({"error": "Cart was updated by another request. Please retry."}), 409
+        
+        current_app.logger.info(
+            "CartItemAdded | id=%s | restaurantId=%s | userId=%s",
+            updated_cart["id"], restaurantId, userId
+        )
+        return jsonify({"message": "Item added to cart successfully", "cart": updated_cart}), 200  
           
     except Exception as e:
         current_app.logger.error(
@@ -214,7 +208,7 @@ def increaseItemQuantity():
         userId = data['userId'].strip()
         
         # Check if menuItem available in stock
-        menuItem = MenuItem.find_item_by_id(menuItemId)  
+        menuItem = MenuItem.find_item_by_id(menuItemId, projection=MenuItem.STOCK_VIEW)
         if not menuItem:
             current_app.logger.warning("IncreaseCartItemQuantityFailed | id=%s | userId=%s | reason=MenuItemNotExist")
             return jsonify({"error": "Invalid Request! Menu Item does not exist"}), 404 
@@ -223,17 +217,19 @@ def increaseItemQuantity():
             current_app.logger.warning("IncreaseCartItemQuantityFailed | id=%s | userId=%s | reason=MenuItemIsOutOfStock")
             return jsonify({"error": "Menu Item is currently Out of Stock!", "userId": userId}), 409      
         
-        # Check if cart exist for this user  
-        cart = Cart.find_cart_by_userId(userId)
-        cartId = cart['id']
-        if not cart:
-            # If Cart not exist
-            current_app.logger.warning(
-                "IncreaseCartItemQuantityFailed | id=%s | userId=%s | reason=CartNotExists",
-                cartId, userId
-            )
-            return jsonify({"error": "Invalid Request! Cart not exist.", "cartId": cartId}), 404       
-        else:
+        # Increase quantity and total price in one conditional write
+        updated_cart = Cart.increment_item_quantity(userId, menuItemId, menuItem['price'])
+        if not updated_cart:
+            # Nothing matched: read the cart to find out why
+            cart = Cart.find_cart_by_userId(userId)
+            if not cart:
+                # If Cart not exist
+                current_app.logger.warning(
+                    "IncreaseCartItemQuantityFailed | userId=%s | reason=CartNotExists",
+                    userId
+                )
+                return jsonify({"error": "Invalid Request! Cart not exist."}), 404
+            cartId = cart['id']
             # Check if the cart is locked
             if cart["status"] == CartStatus.LOCKED.value:
                 current_app.logger.warning(
@@ -244,48 +240,32 @@ def increaseItemQuantity():
                     "error": "You cannot increase items quantity while cart is locked!"
                 }), 405
             # Check menuItem exist in this cart  
-            itemExists = False
-            for existing_item in cart['items']:
-                if existing_item['menuItemId'] == menuItemId:
-                    itemExists = True
-                    existing_item['quantity'] += 1
-                    existing_item['totalPrice'] += existing_item['price']
-                    founded_item = existing_item
-                    break
-            if not itemExists:
+            existing_item = find_cart_line(cart, menuItemId)
+            if not existing_item:
                 # If item not exist
                 current_app.logger.warning(
                     "IncreaseCartItemQuantityFailed | id=%s | menuItemId=%s | userId=%s | reason=ItemNotExistsInCart",
                     cartId, menuItemId, userId
                 )
                 return jsonify({"error": "Invalid Request! Item not exist in Cart.", "cartId": cartId}), 404
-            
-            # Calculate total amount
-            totalAmount = 0                                                                                                                                             
-            for item in cart['items']:
-                totalAmount += item['totalPrice']
-                
-            # Save updated cart
-            success = Cart.update_cart(cart['id'], {"items": cart['items'], "totalAmount": totalAmount})
-            
-            if success:
-                # Get updated menuItem data
-                # Get menu item details and restaurant name details
-                updated_cart = Cart.find_cart_by_id(cart['id'])
-                updated_item = None
-                # Check menuItem exist in this cart  
-                for existing_item in updated_cart['items']:
-                    if existing_item['menuItemId'] == menuItemId:
-                        menuItem = MenuItem.find_item_by_id(existing_item["menuItemId"])
-                        restaurant = Restaurant.find_by_id(menuItem["restaurantId"])
-                        menuItem['restaurantName'] = restaurant['name']
-                        existing_item['menuItem'] = menuItem
-                        updated_item = existing_item
-                current_app.logger.info(
-                    "IncreaseCartItemQuantitySuccess | id=%s | userId=%s",
-                    cart["id"], userId
+            # Item was added at an older price: increase it at that price
+            updated_cart = Cart.increment_item_quantity(userId, menuItemId, existing_item['price'])
+            if not updated_cart:
+                current_app.logger.warning(
+                    "IncreaseCartItemQuantityFailed | id=%s | userId=%s | reason=ConcurrentCartUpdate",
+                    cartId, userId
                 )
-                return jsonify({"message": "Item quantity increased successfully!", "cartItem": updated_item}), 200    
+                return jsonify({"error": "Cart was updated by another request. Please retry.", "cartId": cartId}), 409
+        
+        # Get menu item details and restaurant name details
+        updated_item = find_cart_line(updated_cart, menuItemId)
+        if updated_item:
+            CartService.hydrateCartItems([updated_item])
+        current_app.logger.info(
+            "IncreaseCartItemQuantitySuccess | id=%s | userId=%s",
+            updated_cart["id"], userId
+        )
+        return jsonify({"message": "Item quantity increased successfully!", "cartItem": updated_item}), 200    
     except Exception as e:
         current_app.logger.error(
             "IncreaseCartItemQuantityException | error=%s\n%s",
@@ -314,94 +294,73 @@ def decreaseItemQuantity():
         userId = data['userId'].strip()
         
         # Check if menuItem available in stock
-        menuItem = MenuItem.find_item_by_id(menuItemId)  
+        menuItem = MenuItem.find_item_by_id(menuItemId, projection=MenuItem.STOCK_VIEW)
         if not menuItem:
             current_app.logger.warning("DecreaseCartItemQuantityFailed | id=%s | userId=%s | reason=MenuItemNotExist")
             return jsonify({"error": "Invalid Request! Menu Item does not exist"}), 404 
         
-        ### I think this checker is not necessary for this api. Ask chatgpt whether i should include this or not
-        # if menuItem['availableQuantity'] < 1:
-        #     current_app.logger.warning("IncreaseCartItemQuantityFailed | id=%s | userId=%s | reason=MenuItemIsOutOfStock")
-        #     return jsonify({"error": "Menu Item is Out of Stock!", "cartId": cartId}), 500      
-        
-        # Check if cart exist for this user  
-        cart = Cart.find_cart_by_userId(userId)
-        cartId = cart['id']
-        if not cart:
-            # If Cart not exist
-            current_app.logger.warning(
-                "DecreaseCartItemQuantityFailed | id=%s | userId=%s | reason=CartNotExists",
-                cartId, userId
-            )
-            return jsonify({"error": "Invalid Request! Cart not exist.", "cartId": cartId}), 404  
-          
-        # Check if the cart is locked
-        if cart["status"] == CartStatus.LOCKED.value:
-            current_app.logger.warning(
-                "DecreaseCartItemQuantityFailed | userId=%s | reason=CartLocked",
-                userId
-            )
-            return jsonify({
-                "error": "You cannot decrease items quantity while cart is locked!"
-            }), 405   
-            
-        # Check menuItem exist in this cart  
-        itemExists = False
-        for existing_item in cart['items']:
-            if existing_item['menuItemId'] == menuItemId:
-                itemExists = True
-                # Check if the quantity is above 1
-                if existing_item['quantity'] > 1:
-                    # Decrease cart item quantity and price
-                    existing_item['quantity'] -= 1
-                    existing_item['totalPrice'] -= existing_item['price']
-                else:
-                    cart['items'].remove(existing_item) 
-                break        
-        if not itemExists:
-            # If item not exist
-            current_app.logger.warning(
-                "DecreaseCartItemQuantityFailed | id=%s | menuItemId=%s | userId=%s | reason=ItemNotExistsInCart",
-                cartId, menuItemId, userId
-            )
-            return jsonify({"error": "Invalid Request! Item not exist in Cart.", "cartId": cartId}), 404
-        
-        if len(cart['items']) == 0:
-            # delete this cart
-            success = Cart.delete_cart(cartId)
-            if success:
-                current_app.logger.info(
-                    "DecreaseCartItemQuantityFailed | id=%s | userId=%s",
-                    cartId, userId
+        # Decrease quantity and total price, or remove the line when its last unit is taken out
+        updated_cart = Cart.decrement_item_quantity(userId, menuItemId, menuItem['price'])
+        if not updated_cart:
+            updated_cart = Cart.remove_item(userId, menuItemId, last_unit_only=True)
+        if not updated_cart:
+            # Nothing matched: read the cart to find out why
+            cart = Cart.find_cart_by_userId(userId)
+            if not cart:
+                # If Cart not exist
+                current_app.logger.warning(
+                    "DecreaseCartItemQuantityFailed | userId=%s | reason=CartNotExists",
+                    userId
                 )
-                return jsonify({"message": "Item quantity decreased successfully! Cart Deleted!", "cartItem": None}), 200 
-        else:        
-            # Calculate total amount
-            totalAmount = 0                                                                                                                                             
-            for item in cart['items']:
-                totalAmount += item['totalPrice'] 
-        
-        # Save updated cart
-        success = Cart.update_cart(cart['id'], {"items": cart['items'], "totalAmount": totalAmount})
-            
-        if success:
-            # Get updated menuItem data
-            updated_item = None
+                return jsonify({"error": "Invalid Request! Cart not exist."}), 404  
+            cartId = cart['id']
+            # Check if the cart is locked
+            if cart["status"] == CartStatus.LOCKED.value:
+                current_app.logger.warning(
+                    "DecreaseCartItemQuantityFailed | userId=%s | reason=CartLocked",
+                    userId
+                )
+                return jsonify({
+                    "error": "You cannot decrease items quantity while cart is locked!"
+                }), 405   
             # Check menuItem exist in this cart  
-            updated_cart = Cart.find_cart_by_id(cart['id'])
-            for existing_item in updated_cart['items']:
-                if existing_item['menuItemId'] == menuItemId:
-                    menuItem = MenuItem.find_item_by_id(existing_item["menuItemId"])
-                    restaurant = Restaurant.find_by_id(menuItem["restaurantId"])
-                    menuItem['restaurantName'] = restaurant['name']
-                    existing_item['menuItem'] = menuItem
-                    updated_item = existing_item           
+            existing_item = find_cart_line(cart, menuItemId)
+            if not existing_item:
+                # If item not exist
+                current_app.logger.warning(
+                    "DecreaseCartItemQuantityFailed | id=%s | menuItemId=%s | userId=%s | reason=ItemNotExistsInCart",
+                    cartId, menuItemId, userId
+                )
+                return jsonify({"error": "Invalid Request! Item not exist in Cart.", "cartId": cartId}), 404
+            # Item was added at an older price: decrease it at that price
+            updated_cart = Cart.decrement_item_quantity(userId, menuItemId, existing_item['price'])
+            if not updated_cart:
+                updated_cart = Cart.remove_item(userId, menuItemId, last_unit_only=True)
+            if not updated_cart:
+                current_app.logger.warning(
+                    "DecreaseCartItemQuantityFailed | id=%s | userId=%s | reason=ConcurrentCartUpdate",
+                    cartId, userId
+                )
+                return jsonify({"error": "Cart was updated by another request. Please retry.", "cartId": cartId}), 409
+        
+        if len(updated_cart['items']) == 0:
+            # delete this cart
+            Cart.delete_cart_if_empty(updated_cart['id'])
             current_app.logger.info(
-                "DecreaseCartItemQuantitySuccess | id=%s | userId=%s",
-                cart["id"], userId
+                "DecreaseCartItemQuantitySuccess | id=%s | userId=%s | cartDeleted=true",
+                updated_cart['id'], userId
             )
-            return jsonify({"message": "Item quantity decreased successfully!", "cartItem": updated_item}), 200    
+            return jsonify({"message": "Item quantity decreased successfully! Cart Deleted!", "cartItem": None}), 200 
         
+        # Get updated menuItem data (None when the line was removed)
+        updated_item = find_cart_line(updated_cart, menuItemId)
+        if updated_item:
+            CartService.hydrateCartItems([updated_item])
+        current_app.logger.info(
+            "DecreaseCartItemQuantitySuccess | id=%s | userId=%s",
+            updated_cart["id"], userId
+        )
+        return jsonify({"message": "Item quantity decreased successfully!", "cartItem": updated_item}), 200    
     
     except Exception as e:
         current_app.logger.error(
@@ -429,10 +388,19 @@ def delete_Item():
         menuItemId = data['menuItemId'].strip()
         userId = data['userId'].strip()
         
-        # Check if cart exist for this user
-        cart = Cart.find_cart_by_userId(userId)
-        # If cart exist
-        if cart:
+        # Remove item and recompute total amount in one conditional write
+        updated_cart = Cart.remove_item(userId, menuItemId)
+        if not updated_cart:
+            # Nothing matched: read the cart to find out why
+            cart = Cart.find_cart_by_userId(userId)
+            if not cart:
+                # If Cart not exist
+                current_app.logger.warning(
+                    "CartItemDeleteFailed | userId=%s | reason=CartNotExists",
+                    userId
+                )
+                return jsonify({"error": "Invalid Request! Cart not exist."}), 404    
+            cartId = cart['id']
             # Check if the cart is locked
             if cart["status"] == CartStatus.LOCKED.value:
                 current_app.logger.warning(
@@ -442,67 +410,28 @@ def delete_Item():
                 return jsonify({
                     "error": "You cannot delete item while cart is locked!"
                 }), 405
-            cartId = cart
-            # Check the item exist in the list
-            # if item exist in cart increase its quantity and total price
-            itemExists = False
-            for existing_item in cart['items']:
-                if existing_item['menuItemId'] == menuItemId:
-                    itemExists = True
-                    founded_item = existing_item
-                    break
-                
-            if not itemExists:
-                 # If item not exist
-                current_app.logger.warning(
-                    "CartItemDeleteFailed | id=%s | menuItemId=%s | userId=%s | reason=ItemNotExistsInCart",
-                    cartId, menuItemId, userId
-                )
-                return jsonify({"error": "Invalid Request! Item not exist in Cart.", "cartId": cartId}), 404     
-            
-            # If item exist               
-            # Remove item
-            cart['items'].remove(founded_item) 
-            
-            if len(cart['items']) == 0:
-                # delete this cart
-                success = Cart.delete_cart(cartId)
-                if success:
-                    current_app.logger.info(
-                        "CartItemDeleted | id=%s | userId=%s",
-                        cartId, userId
-                    )
-                    return jsonify({"message": "Item removed from cart successfully! Cart Deleted!", "cartId": cartId}), 200 
-            else:        
-                # Calculate total amount
-                totalAmount = 0                                                                                                                                             
-                for item in cart['items']:
-                    totalAmount += item['totalPrice']
-            
-            # Save updated cart
-            success = Cart.update_cart(cart['id'], {"items": cart['items'], "totalAmount": totalAmount})
-            
-            if success:
-                updated_cart = Cart.find_cart_by_id(cart['id'])
-                current_app.logger.info(
-                    "CartItemDeleted | id=%s | userId=%s",
-                    cart["id"], userId
-                )
-                return jsonify({"message": "Item removed from cart successfully", "cartId": cartId}), 200
-            else:
-                current_app.logger.warning(
-                    "CartItemDeleteFailed | id=%s | userId=%s | reason=CartUpdateFailed",
-                    cart["id"], userId
-                )
-                return jsonify({"error": "Failed to update cart.", "cartId": cartId}), 500  
-            
-        else:
-            # If Cart not exist
+            # If item not exist
             current_app.logger.warning(
-                "CartItemDeleteFailed | id=%s | userId=%s | reason=CartNotExists",
+                "CartItemDeleteFailed | id=%s | menuItemId=%s | userId=%s | reason=ItemNotExistsInCart",
+                cartId, menuItemId, userId
+            )
+            return jsonify({"error": "Invalid Request! Item not exist in Cart.", "cartId": cartId}), 404     
+        
+        cartId = updated_cart['id']
+        if len(updated_cart['items']) == 0:
+            # delete this cart
+            Cart.delete_cart_if_empty(cartId)
+            current_app.logger.info(
+                "CartItemDeleted | id=%s | userId=%s | cartDeleted=true",
                 cartId, userId
             )
-            return jsonify({"error": "Invalid Request! Cart not exist.", "cartId": cartId}), 404    
+            return jsonify({"message": "Item removed from cart successfully! Cart Deleted!", "cartId": cartId}), 200 
+        
+        current_app.logger.info(
+            "CartItemDeleted | id=%s | userId=%s",
+            cartId, userId
+        )
+        return jsonify({"message": "Item removed from cart successfully", "cartId": cartId}), 200
           
     except Exception as e:
         current_app.logger.error(
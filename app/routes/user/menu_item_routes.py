@@ -6,6 +6,7 @@ from app.models.restaurant import Restaurant
 from app.models.user import User
 from app.utils.aws_utils import MAX_IMAGES, delete_images_from_s3, delete_s3_folder, upload_images_to_s3
 from app.utils.decorators import login_required, admin_required
+from app.utils.pagination import COUNT_MODES, build_pagination, decode_cursor
 from firebase_admin import auth as firebase_auth
 from bson.objectid import ObjectId
 from werkzeug.utils import secure_filename
@@ -23,6 +24,10 @@ def get_all_items_in_restaurants_of_users_city():
         # Get pagination parameters with defaults
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 10))
+        # Opaque keyset cursor from the previous page (takes precedence over page)
+        cursor = request.args.get('cursor')
+        # Total count mode: exact | estimate (capped) | none
+        count_mode = request.args.get('count', 'exact')
         
         # Validate pagination parameters
         if page < 1:
@@ -34,36 +39,41 @@ def get_all_items_in_restaurants_of_users_city():
         if page_size > 100:  # Limit maximum page size
             current_app.logger.warning(f"Failed to Get all items in restaurants of users city | userId={user_id} | Page size cannot exceed 100")
             return jsonify({"error": "Page size cannot exceed 100"}), 400
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                current_app.logger.warning(f"Failed to Get all items in restaurants of users city | userId={user_id} | Invalid cursor")
+                return jsonify({"error": "Invalid cursor"}), 400
+        if count_mode not in COUNT_MODES:
+            current_app.logger.warning(f"Failed to Get all items in restaurants of users city | userId={user_id} | Invalid count mode")
+            return jsonify({"error": f"count must be one of {', '.join(COUNT_MODES)}"}), 400
         
         if not user_id:
             current_app.logger.warning(f"Failed to Get all items in restaurants of users city | userId={user_id} | user_id is required")
             return jsonify({"error": "user_id is required"}), 400
 
         # Get the user's city location    
-        user = User.find_by_id(user_id)
+        user = User.find_by_id(user_id, projection=User.CITY_VIEW)
         
         city = user['address']['city'] 
         
         # Find out all restaurants in user's city
-        restaurants = Restaurant.find_by_city(city)
+        restaurants = Restaurant.find_by_city(city, projection={"name": 1})
         restaurant_ids = [r["_id"] for r in restaurants]
+        restaurant_name_map = {r["_id"]: r.get("name") for r in restaurants}
 
-        # Count total items
-        total_items = MenuItem.find_items_by_restaurant_ids(restaurant_ids, count_only=True)
-        
-        total_pages = (total_items + page_size - 1) // page_size
         # Calculate skip and limit for pagination
         skip = (page - 1) * page_size
         
-        # Fetch paginated menu items
-        items_cursor = MenuItem.find_items_by_restaurant_ids(restaurant_ids, skip=skip, limit=page_size)
-
-        items = list(items_cursor)
+        # Fetch paginated menu items and the total count (two indexed queries, see find_page_with_total)
+        items, total_items, total_is_exact = MenuItem.find_items_page_by_restaurant_ids(
+            restaurant_ids, skip=skip, limit=page_size, cursor=cursor, count_mode=count_mode
+        )
         
-        # Fetch corresponding restaurant name
+        # Attach restaurant name from the city lookup above (no extra queries)
         for item in items:
-            restaurant = Restaurant.find_by_id(item['restaurantId'])
-            item['restaurantName'] = restaurant['name']
+            item['restaurantName'] = restaurant_name_map.get(item['restaurantId'])
         
         current_app.logger.info(
             "getAllItemsInRestaurantsOfUsersCitySuccess | user_id=%s",
@@ -73,14 +83,7 @@ def get_all_items_in_restaurants_of_users_city():
         return jsonify({
             "message": "Fetched menu items successfully",
             "menuItems": items,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_items": total_items,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+            "pagination": build_pagination(page, page_size, items, "created_at", total_items, total_is_exact, cursor)
         }), 200 
     except Exception as e:
         current_app.logger.error(
@@ -99,6 +102,10 @@ def get_all_items_in_restaurant():
         # Get pagination parameters with defaults
         page = int(request.args.get('page', 1))
         page_size = int(request.args.get('page_size', 10))
+        # Opaque keyset cursor from the previous page (takes precedence over page)
+        cursor = request.args.get('cursor')
+        # Total count mode: exact | estimate (capped) | none
+        count_mode = request.args.get('count', 'exact')
         
         # Validate pagination parameters
         if page < 1:
@@ -110,27 +117,33 @@ def get_all_items_in_restaurant():
         if page_size > 100:  # Limit maximum page size
             current_app.logger.warning(f"Failed to Get all items in restaurant | restaurantId={restaurant_id} | Page size cannot exceed 100")
             return jsonify({"error": "Page size cannot exceed 100"}), 400
+        if cursor:
+            try:
+                decode_cursor(cursor)
+            except ValueError:
+                current_app.logger.warning(f"Failed to Get all items in restaurant | restaurantId={restaurant_id} | Invalid cursor")
+                return jsonify({"error": "Invalid cursor"}), 400
+        if count_mode not in COUNT_MODES:
+            current_app.logger.warning(f"Failed to Get all items in restaurant | restaurantId={restaurant_id} | Invalid count mode")
+            return jsonify({"error": f"count must be one of {', '.join(COUNT_MODES)}"}), 400
         
         if not restaurant_id:
             current_app.logger.warning(f"Failed to Get all items in restaurant | restaurantId={restaurant_id} | restaurant_id is required")
             return jsonify({"error": "restaurant_id is required"}), 400
 
-        # Count total items
-        total_items = MenuItem.find_items_by_restaurant_id(restaurant_id, count_only=True)
-        
-        total_pages = (total_items + page_size - 1) // page_size
         # Calculate skip and limit for pagination
         skip = (page - 1) * page_size
         
-        # Fetch paginated menu items
-        items_cursor = MenuItem.find_items_by_restaurant_id(restaurant_id, skip=skip, limit=page_size)
-
-        items = list(items_cursor)
+        # Fetch paginated menu items and the total count (two indexed queries, see find_page_with_total)
+        items, total_items, total_is_exact = MenuItem.find_items_page_by_restaurant_id(
+            restaurant_id, skip=skip, limit=page_size, cursor=cursor, count_mode=count_mode
+        )
         
-        # Fetch corresponding restaurant name
+        # Fetch corresponding restaurant name (cached summary, all items share one restaurant)
+        restaurant_summaries = Restaurant.find_summaries_by_ids([item['restaurantId'] for item in items])
         for item in items:
-            restaurant = Restaurant.find_by_id(item['restaurantId'])
-            item['restaurantName'] = restaurant['name']
+            restaurant = restaurant_summaries.get(item['restaurantId']) or {}
+            item['restaurantName'] = restaurant.get('name')
         
         current_app.logger.info(
             "getAllItemsInRestaurant | restaurant_id=%s",
@@ -140,14 +153,7 @@ def get_all_items_in_restaurant():
         return jsonify({
             "message": "Fetched menu items successfully",
             "menuItems": items,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total_items": total_items,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_prev": page > 1
-            }
+            "pagination": build_pagination(page, page_size, items, "created_at", total_items, total_is_exact, cursor)
         }), 200 
     except Exception as e:
         current_app.logger.error(
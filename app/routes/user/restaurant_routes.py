@@ -26,7 +26,7 @@ def get_restaurant_details():
             return jsonify({"error": "restaurant_id is required"}), 400
 
         # Get the restaurant's details   
-        restaurant = Restaurant.find_by_id(restaurant_id)
+        restaurant = Restaurant.find_by_id(restaurant_id, projection=Restaurant.PROFILE_VIEW)
         
         current_app.logger.info(
             "getRestaurantDetailsSuccess | restaurantId=%s",
@@ -3,6 +3,7 @@ from flask import Blueprint, app, request, jsonify, session, current_app
 from app.models.user import User
 from app.utils.decorators import login_required, admin_required
 from firebase_admin import auth as firebase_auth
+from app.services.auth_directory_service import AuthDirectoryService
 from bson.objectid import ObjectId
 
 user_bp = Blueprint('users', __name__)
@@ -74,16 +75,14 @@ def update_profile():
         
         id = data['id']       
         
-        # Update user
-        success = User.update_user(id, update_data)
-        if not success:
+        # Update user and get updated user data
+        user = User.update_and_fetch(id, update_data)
+        if not user:
             current_app.logger.warning(
                 "UpdateUserProfileFailed | reason=FailedToUpdateUserProfile",
             )
             return jsonify({"error": "Failed to update profile"}), 500
         
-        # Get updated user data
-        user = User.find_by_id(id)
         user_data = {
             "id": user['_id'],
             "email": user['email'],
@@ -131,6 +130,7 @@ def delete_user():
         # --- Step 2: Delete from Firebase Authentication ---
         try:
             firebase_auth.delete_user(id)
+            AuthDirectoryService.forgetFirebaseUid(id)
         except firebase_auth.UserNotFoundError:
             current_app.logger.warning(
                 "DeleteUserFailed | reason=UserNotFoundInFirebase",
@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
+from firebase_admin import auth as firebase_auth
+from app.core.constansts import (
+    AUTH_DIRECTORY_CACHE_MAX_SIZE,
+    AUTH_DIRECTORY_LOOKUP_WORKERS,
+    AUTH_DIRECTORY_NEGATIVE_TTL_SECONDS,
+    AUTH_DIRECTORY_POSITIVE_TTL_SECONDS,
+)
+
+# Process-local cache of Firebase phone -> uid lookups for the phone auth flows.
+# Found phones are kept longer than missing ones, since a missing phone turns into
+# a user as soon as its registration completes. Entries are refreshed here on create
+# and dropped on delete; other processes see those changes once the TTL runs out.
+_found = TTLCache(maxsize=AUTH_DIRECTORY_CACHE_MAX_SIZE, ttl=AUTH_DIRECTORY_POSITIVE_TTL_SECONDS)
+_missing = TTLCache(maxsize=AUTH_DIRECTORY_CACHE_MAX_SIZE, ttl=AUTH_DIRECTORY_NEGATIVE_TTL_SECONDS)
+_cache_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=AUTH_DIRECTORY_LOOKUP_WORKERS, thread_name_prefix="firebase-lookup")
+
+class AuthDirectoryService:
+
+    @staticmethod
+    def findFirebaseUidByPhone(phone: str, fresh: bool = False):
+        """
+        Firebase uid of the account with this phone, None if there is none (cached).
+        fresh=True skips the cache (the answer still refreshes it).
+        """
+        with _cache_lock:
+            if not fresh and phone in _found:
+                return _found[phone]
+            if not fresh and phone in _missing:
+                return None
+        try:
+            uid = firebase_auth.get_user_by_phone_number(phone).uid
+        except firebase_auth.UserNotFoundError:
+            uid = None
+        with _cache_lock:
+            if uid:
+                _missing.pop(phone, None)
+                _found[phone] = uid
+            else:
+                _found.pop(phone, None)
+                _missing[phone] = True
+        return uid
+
+    @staticmethod
+    def lookupPhone(phone: str, existsInMongo, fresh: bool = False):
+        """
+        Answer both "is the phone in MongoDB" (existsInMongo(phone), run on the calling
+        thread so it keeps the request context) and "which Firebase uid has it" at once.
+        The Firebase lookup only goes out on a cache miss, on the lookup pool, overlapping the Mongo query.
+        The cache is per process and can outlive a delete made by another worker, so only the
+        OTP send paths may use it; flows that create, link or sign in accounts pass fresh=True.
+        Returns (exists_in_mongo, firebase_uid or None)
+        """
+        with _cache_lock:
+            cached = not fresh and (phone in _found or phone in _missing)
+        if cached:
+            return existsInMongo(phone), AuthDirectoryService.findFirebaseUidByPhone(phone)
+        firebase_lookup = _executor.submit(AuthDirectoryService.findFirebaseUidByPhone, phone, fresh)
+        exists_in_mongo = existsInMongo(phone)
+        return exists_in_mongo, firebase_lookup.result()
+
+    @staticmethod
+    def rememberFirebaseUser(phone: str, uid: str):
+        """Record a Firebase account created by this process"""
+        with _cache_lock:
+            _missing.pop(phone, None)
+            _found[phone] = uid
+
+    @staticmethod
+    def forgetFirebaseUid(uid: str):
+        """Drop the cached phone of a deleted Firebase account"""
+        with _cache_lock:
+            for phone in [phone for phone, cached_uid in _found.items() if cached_uid == uid]:
+                _found.pop(phone, None)
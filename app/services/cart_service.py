@@ -0,0 +1,29 @@
+from app.models.menu_item import MenuItem
+from app.models.restaurant import Restaurant
+
+class CartService:
+    
+    @staticmethod
+    def hydrateCartItems(cartItems: list):
+        """
+        Attach menu item details (with restaurantName) to each cart line.
+        Loads all menu items of the page with one $in query and their distinct
+        restaurants through the cached summary lookup, then joins them in memory.
+        """
+        if not cartItems:
+            return cartItems
+        
+        menuItems = MenuItem.find_items_by_ids([cartItem["menuItemId"] for cartItem in cartItems])
+        menuItem_map = {menuItem["id"]: menuItem for menuItem in menuItems}
+        
+        restaurant_summaries = Restaurant.find_summaries_by_ids(
+            [menuItem["restaurantId"] for menuItem in menuItems]
+        )
+        
+        for cartItem in cartItems:
+            menuItem = menuItem_map.get(cartItem["menuItemId"])
+            if menuItem:
+                restaurant = restaurant_summaries.get(menuItem["restaurantId"]) or {}
+                menuItem["restaurantName"] = restaurant.get("name")
+            cartItem["menuItem"] = menuItem
+        return cartItems
@@ -1,21 +1,26 @@
+from datetime import datetime
 from app import mongo
 from app.models.cart import Cart, CartStatus
-from app.models.payment import Payment
+from app.models.menu_item import MenuItem
+from app.models.payment import Payment, PaymentMode, PaymentStatus
 from app.services.payment_service import PaymentService
 from app.services.pricing_service import PricingService
 from app.models.order import Order, OrderStatus
+from app.services.order_events import OrderEvents
+from app.services.order_expiry_service import OrderExpiryService
 from app.core.exceptions import BusinessException
 from pymongo.errors import PyMongoError
 
 class CheckoutService:
     
     @staticmethod
-    def placeOrder(userId: str, name: str, address: str, phone: str):
+    def placeOrder(userId: str, name: str, address: str, phone: str, now: datetime = None):
         client = mongo.cx
         session = client.start_session()
 
         try:
-            with session.start_transaction():
+            # Order events are published once the transaction commits
+            with OrderEvents.publishAfterCommit(session), session.start_transaction():
 
                 cart = Cart.find_cart_by_userId(userId, session)
                 if not cart:
@@ -24,6 +29,18 @@ class CheckoutService:
                         message="Cart not found"
                     )   
 
+                # Checked before the cart lock: a pending order is what keeps the cart locked
+                pending_order = Order.find_pending_order_by_userId(userId=userId, session=session)
+                if pending_order:
+                    if not OrderExpiryService.isExpired(pending_order, now):
+                        raise BusinessException(
+                            code="OLD_ORDER_PENDING",
+                            message="Old order is still pending"
+                        )
+                    # Expired but not swept yet: expire it here (unlocks the cart, releases its stock)
+                    OrderExpiryService.expireOrders([pending_order], session, now)
+                    cart = Cart.find_cart_by_userId(userId, session)
+
                 if cart["status"] == CartStatus.LOCKED.value:
                     raise BusinessException(
                         code="CART_LOCKED",
@@ -36,12 +53,13 @@ class CheckoutService:
                         message="Cart is empty"
                     )                     
 
-                pending_order = Order.find_pending_order_by_userId(userId=userId, session=session)
-                if pending_order:
+                # Reserve stock for all cart lines; rolled back with the transaction on failure
+                reserved = MenuItem.reserve_stock(cart["items"], session=session)
+                if not reserved:
                     raise BusinessException(
-                        code="OLD_ORDER_PENDING",
-                        message="Old order is still pending"
-                    )  
+                        code="OUT_OF_STOCK",
+                        message="Some items in the cart are out of stock"
+                    )
 
                 pricing = PricingService.calculate(cart["totalAmount"])
 
@@ -63,8 +81,17 @@ class CheckoutService:
                     
                 result = PaymentService.generatePaymentRequest(orderId=order_id, session=session)
                 
-                # Update payment id for the order
-                Order.update_order(orderId=order_id,update_data={"paymentId": result["paymentId"]},session=session)                     
+                # Update payment id (and the mirrored payment fields) for the order and record the stock reservation
+                Order.update_order(
+                    orderId=order_id,
+                    update_data={
+                        "paymentId": result["paymentId"],
+                        "paymentStatus": PaymentStatus.PENDING.value,
+                        "paymentMode": PaymentMode.NOT_SELECTED.value,
+                        "inventoryReserved": True
+                    },
+                    session=session
+                )                     
 
                 return {
                     "orderId": order_id,
@@ -81,7 +108,7 @@ class CheckoutService:
         session = client.start_session()
 
         try:
-            with session.start_transaction():
+            with OrderEvents.publishAfterCommit(session), session.start_transaction():
                 
                 #  Verify order is PENDING_PAYMENT
                 order = Order.find_order_by_id(orderId,session=session)
@@ -100,6 +127,9 @@ class CheckoutService:
                         message="Failed to delete payment."
                     )   
                 
+                # Release reserved stock
+                CheckoutService.releaseReservedStock(order, session=session)
+                
                 # Delete Order
                 success = Order.delete_order(orderId= orderId, session=session)
                 if not success:
@@ -121,4 +151,13 @@ class CheckoutService:
                 }   
         
         finally:
-            session.end_session()    
\ No newline at end of file
+            session.end_session()
+    
+    @staticmethod
+    def releaseReservedStock(order, session):
+        """Give back the stock reserved for an order at checkout (no-op if nothing was reserved)"""
+        if not order.get("inventoryReserved"):
+            return False
+        MenuItem.release_stock(order["items"], session=session)
+        Order.update_order(orderId=order["id"], update_data={"inventoryReserved": False}, session=session)
+        return True
@@ -0,0 +1,89 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+from app.core.constansts import IMAGE_VARIANT_SIZES, IMAGE_VARIANT_WEBP_QUALITY, IMAGE_VARIANT_WORKERS
+from app.extensions import s3_client, S3_BUCKET, S3_REGION
+from app.models.menu_item import MenuItem
+from app.utils.aws_utils import s3_url, variant_key
+
+# Menu item images are stored as uploaded; this stage adds bounded-size WebP copies
+# (IMAGE_VARIANT_SIZES) next to them and records their URLs in MenuItem.imageVariants:
+#   [{"source": <image url>, "full": <url>, "medium": <url>, "thumb": <url>}]
+# Work runs after the response on a bounded pool of this process: one job per item, which
+# renders its images one after another. Pillow releases the GIL while decoding, resizing
+# and encoding, so jobs of different items run side by side.
+_executor = ThreadPoolExecutor(max_workers=IMAGE_VARIANT_WORKERS, thread_name_prefix="image-variants")
+
+class ImageVariantService:
+
+    @staticmethod
+    def renderVariants(data: bytes):
+        """Resize and re-encode one image to WebP, returns {variant: bytes} (never upscales)"""
+        largest = max(IMAGE_VARIANT_SIZES.values())
+        with Image.open(io.BytesIO(data)) as source:
+            # JPEG: decode at a reduced scale when the photo is much larger than the biggest variant
+            source.draft("RGB", (largest, largest))
+            image = ImageOps.exif_transpose(source)
+            has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+            variants = {}
+            # Largest first, each variant resized from the previous one
+            for variant, size in sorted(IMAGE_VARIANT_SIZES.items(), key=lambda entry: -entry[1]):
+                image.thumbnail((size, size), Image.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, "WEBP", quality=IMAGE_VARIANT_WEBP_QUALITY, method=4)
+                variants[variant] = buffer.getvalue()
+        return variants
+
+    @staticmethod
+    def buildVariants(sourceKey: str, data: bytes = None):
+        """
+        Render and upload the variants of the image at sourceKey (read from S3 when data is None).
+        Returns {"source", <variant>: url, ...}, or None when the file is not a readable image.
+        """
+        if data is None:
+            data = s3_client.get_object(Bucket=S3_BUCKET, Key=sourceKey)["Body"].read()
+        try:
+            rendered = ImageVariantService.renderVariants(data)
+        except (UnidentifiedImageError, OSError):
+            return None
+
+        entry = {"source": s3_url(S3_BUCKET, S3_REGION, sourceKey)}
+        for variant, body in rendered.items():
+            key = variant_key(sourceKey, variant)
+            s3_client.put_object(
+                Bucket=S3_BUCKET,
+                Key=key,
+                Body=body,
+                ContentType="image/webp",
+                CacheControl="public, max-age=31536000"
+            )
+            entry[variant] = s3_url(S3_BUCKET, S3_REGION, key)
+        return entry
+
+    @staticmethod
+    def processItemImagesInBackground(app, itemId: str, sources):
+        """
+        Build the variants of an item's new images after the response, on the variant pool, so
+        requests never wait for it, and record them on the item. One bad image (S3 error,
+        decompression bomb, ...) is logged and skipped without failing the others.
+        sources: [(s3 key, bytes or None)]; with no sources it only drops variants of removed images.
+        """
+        def job():
+            with app.app_context():
+                variants = []
+                for key, data in sources:
+                    try:
+                        entry = ImageVariantService.buildVariants(key, data)
+                    except Exception as e:
+                        entry = None
+                        app.logger.warning("ImageVariantsFailed | itemId=%s | key=%s | reason=%s", itemId, key, str(e))
+                    if entry:
+                        variants.append(entry)
+                try:
+                    MenuItem.set_image_variants(itemId, variants)
+                except Exception as e:
+                    app.logger.warning("ImageVariantsFailed | itemId=%s | reason=%s", itemId, str(e))
+
+        return _executor.submit(job)
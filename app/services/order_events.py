@@ -0,0 +1,248 @@
+import base64
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from bson import json_util
+from pymongo.errors import OperationFailure, PyMongoError
+from app import mongo
+from app.core.constansts import ORDER_EVENTS_BUFFER_SIZE, ORDER_STREAM_HEARTBEAT_SECONDS
+from app.utils.serializers import serialize_doc
+
+# Order change feed for the restaurant dashboard (GET /streamOrders).
+#
+# Two sources, picked with ORDER_EVENTS_SOURCE = auto | changestream | memory:
+#   changestream: a MongoDB change stream on orders and orderTombstones (replica sets /
+#                 sharded clusters only). Deletes are read from the tombstone Order.delete_order
+#                 writes with them, which carries the restaurantId the delete event lacks.
+#                 Event ids are change stream resume tokens, so a reconnect resumes exactly.
+#   memory:       an in-process bus fed by the Order model writes. Event ids are sequence
+#                 numbers into a bounded ring buffer; it only sees writes made by this
+#                 process, so it is refused when the server runs more than one worker
+#                 (WEB_CONCURRENCY > 1): clients then poll getAllOrders?updatedSince instead.
+# When a reconnect cannot be resumed the stream sends a "reset" event and the client
+# refetches with getAllOrders.
+#
+# Every open stream holds a server thread for as long as it stays connected, so the
+# server must run threaded workers (the Dockerfile uses gunicorn -k gthread); on sync
+# workers a handful of dashboards would take every worker.
+
+_CHANGE_STREAM_PREFIX = "cs."
+_MEMORY_PREFIX = "mem."
+_CHANGE_STREAM_OPERATIONS = {"insert": "created", "update": "updated", "replace": "updated"}
+
+class OrderEventBus:
+    """Bounded in-process buffer of order events with blocking reads"""
+
+    def __init__(self, capacity: int):
+        self.epoch = uuid.uuid4().hex[:12]
+        self._events = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        self._seq = 0
+
+    def publish(self, restaurantId: str, payload: dict):
+        with self._condition:
+            self._seq += 1
+            self._events.append((self._seq, restaurantId, payload))
+            self._condition.notify_all()
+
+    def latest_seq(self):
+        with self._condition:
+            return self._seq
+
+    def read(self, restaurantId: str, after_seq: int, timeout: float):
+        """
+        Wait up to timeout seconds for events of a restaurant published after after_seq
+        Returns:
+            (events, position, lost): events as (seq, payload) pairs, the sequence number to
+            read after next time, and whether events after after_seq were already evicted
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                lost = bool(self._events) and after_seq < self._events[0][0] - 1
+                events = [(seq, payload) for seq, rid, payload in self._events if seq > after_seq and rid == restaurantId]
+                if events or lost:
+                    return events, self._seq, lost
+                # Nothing for this restaurant yet: skip past other restaurants' events and wait
+                after_seq = self._seq
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], after_seq, False
+                self._condition.wait(remaining)
+
+def _worker_count():
+    """Server worker processes, from WEB_CONCURRENCY (read by gunicorn for its default -w)"""
+    try:
+        return int(os.getenv("WEB_CONCURRENCY", "1"))
+    except ValueError:
+        return 1
+
+_bus = OrderEventBus(ORDER_EVENTS_BUFFER_SIZE)
+# Events written inside a transaction, held per session until it commits
+_pending = {}
+_change_streams_supported = None
+
+def _encode_token(token):
+    return _CHANGE_STREAM_PREFIX + base64.urlsafe_b64encode(json_util.dumps(token).encode()).decode()
+
+def _decode_token(event_id):
+    try:
+        return json_util.loads(base64.urlsafe_b64decode(event_id[len(_CHANGE_STREAM_PREFIX):].encode()))
+    except Exception:
+        return None
+
+def _format_event(event_id, event_type, payload, dumps):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {dumps(payload)}")
+    return "\n".join(lines) + "\n\n"
+
+def _heartbeat():
+    return ": keep-alive\n\n"
+
+def _order_payload(event_type, order):
+    if event_type == "deleted":
+        return {"type": event_type, "orderId": str(order["_id"]) if "_id" in order else order.get("id")}
+    return {"type": event_type, "order": serialize_doc(order)}
+
+class OrderEvents:
+
+    @staticmethod
+    def publish(eventType: str, order, session=None):
+        """
+        Publish an order change ("created", "updated" or "deleted") to the in-process bus.
+        Inside a transaction wrapped by publishAfterCommit the event waits for the commit.
+        """
+        if not order or not order.get("restaurantId"):
+            # Projected documents without restaurantId cannot be routed to a stream
+            return
+        event = (order["restaurantId"], _order_payload(eventType, order))
+        if session is not None and getattr(session, "in_transaction", False) and id(session) in _pending:
+            _pending[id(session)].append(event)
+            return
+        _bus.publish(*event)
+
+    @staticmethod
+    @contextmanager
+    def publishAfterCommit(session):
+        """
+        Hold the order events written with session until its transaction commits.
+        Enter it before the transaction so it exits after the commit:
+            with OrderEvents.publishAfterCommit(session), session.start_transaction(): ...
+        """
+        _pending[id(session)] = []
+        try:
+            yield
+        except BaseException:
+            _pending.pop(id(session), None)
+            raise
+        for event in _pending.pop(id(session), []):
+            _bus.publish(*event)
+
+    @staticmethod
+    def source():
+        """
+        Resolve ORDER_EVENTS_SOURCE ("auto" checks once whether the server supports change streams).
+        Returns None when only the memory source is possible but the server runs several
+        workers, each of which would see only its own writes.
+        """
+        source = OrderEvents._resolveSource()
+        if source == "memory" and _worker_count() > 1:
+            return None
+        return source
+
+    @staticmethod
+    def _resolveSource():
+        global _change_streams_supported
+        source = os.getenv("ORDER_EVENTS_SOURCE", "auto").lower()
+        if source in ("changestream", "memory"):
+            return source
+        if _change_streams_supported is None:
+            try:
+                hello = mongo.cx.admin.command("hello")
+                _change_streams_supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+            except PyMongoError:
+                return "memory"
+        return "changestream" if _change_streams_supported else "memory"
+
+    @staticmethod
+    def streamRestaurantOrders(restaurantId: str, lastEventId: str, dumps, source: str, heartbeatSeconds: float = ORDER_STREAM_HEARTBEAT_SECONDS):
+        """
+        Yield server-sent event chunks with the order changes of a restaurant from source
+        (as returned by source()), resuming after lastEventId when it is still resumable,
+        with keep-alive comments when idle.
+        """
+        if source == "changestream":
+            return OrderEvents._streamFromChangeStream(restaurantId, lastEventId, dumps, heartbeatSeconds)
+        return OrderEvents._streamFromBus(restaurantId, lastEventId, dumps, heartbeatSeconds)
+
+    @staticmethod
+    def _streamFromChangeStream(restaurantId, lastEventId, dumps, heartbeatSeconds):
+        # Order deletes carry only the order id, so they are routed by the tombstone
+        # inserted in the same write instead (never sent to other restaurants' streams)
+        pipeline = [{"$match": {"$or": [
+            {"ns.coll": "orders", "operationType": {"$in": ["insert", "update", "replace"]}, "fullDocument.restaurantId": restaurantId},
+            {"ns.coll": "orderTombstones", "operationType": "insert", "fullDocument.restaurantId": restaurantId}
+        ]}}]
+        resume_token = _decode_token(lastEventId) if lastEventId and lastEventId.startswith(_CHANGE_STREAM_PREFIX) else None
+        reset_reason = "not_resumable" if lastEventId and resume_token is None else None
+
+        try:
+            stream = mongo.db.watch(pipeline, full_document="updateLookup", resume_after=resume_token, max_await_time_ms=1000)
+        except OperationFailure:
+            if resume_token is None:
+                raise
+            # Resume point fell out of the oplog
+            stream = mongo.db.watch(pipeline, full_document="updateLookup", max_await_time_ms=1000)
+            reset_reason = "history_lost"
+
+        with stream:
+            if reset_reason:
+                yield _format_event(None, "reset", {"reason": reset_reason}, dumps)
+            last_sent = time.monotonic()
+            while stream.alive:
+                change = stream.try_next()
+                if change is None:
+                    if time.monotonic() - last_sent >= heartbeatSeconds:
+                        last_sent = time.monotonic()
+                        yield _heartbeat()
+                    continue
+                document = change.get("fullDocument")
+                if not document:
+                    # Updated document was deleted before the lookup
+                    continue
+                if change["ns"]["coll"] == "orderTombstones":
+                    payload = {"type": "deleted", "orderId": document["orderId"]}
+                else:
+                    payload = _order_payload(_CHANGE_STREAM_OPERATIONS[change["operationType"]], document)
+                last_sent = time.monotonic()
+                yield _format_event(_encode_token(change["_id"]), "order", payload, dumps)
+
+    @staticmethod
+    def _streamFromBus(restaurantId, lastEventId, dumps, heartbeatSeconds):
+        after_seq = None
+        if lastEventId and lastEventId.startswith(_MEMORY_PREFIX):
+            epoch, _, seq = lastEventId[len(_MEMORY_PREFIX):].partition(".")
+            if epoch == _bus.epoch and seq.isdigit():
+                after_seq = int(seq)
+
+        if after_seq is None:
+            after_seq = _bus.latest_seq()
+            if lastEventId:
+                # Issued by another process or before a restart
+                yield _format_event(None, "reset", {"reason": "not_resumable"}, dumps)
+
+        while True:
+            events, position, lost = _bus.read(restaurantId, after_seq, heartbeatSeconds)
+            if lost:
+                yield _format_event(None, "reset", {"reason": "history_lost"}, dumps)
+            if not events and not lost:
+                yield _heartbeat()
+            for seq, payload in events:
+                yield _format_event(f"{_MEMORY_PREFIX}{_bus.epoch}.{seq}", "order", payload, dumps)
+            after_seq = position
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from app import mongo
+from app.core.constansts import ORDER_EXPIRY_BATCH_SIZE, ORDER_EXPIRY_INTERVAL_SECONDS, ORDER_EXPIRY_MAX_BATCHES
+from app.models.cart import Cart
+from app.models.menu_item import MenuItem
+from app.models.order import Order, OrderStatus
+from app.models.payment import Payment, PaymentStatus
+from app.services.order_events import OrderEvents
+
+# Sweeper metrics live in one jobMetrics document, so every sweeper process adds to the
+# same counters and `flask orders expiry-metrics` can read them from anywhere
+_METRICS_ID = "orderExpiry"
+
+class OrderExpiryService:
+
+    @staticmethod
+    def isExpired(order, now: datetime = None):
+        """True once a PENDING_PAYMENT order reached its expireAt (same boundary as the sweeper: expireAt <= now)"""
+        if order["status"] != OrderStatus.PENDING_PAYMENT.value or not order.get("expireAt"):
+            return False
+        expire_at = order["expireAt"]
+        if isinstance(expire_at, dict):
+            expire_at = datetime.fromisoformat(expire_at["$date"])
+        return expire_at <= (now or datetime.utcnow())
+
+    @staticmethod
+    def expireOrders(orders, session, now: datetime = None):
+        """
+        Expire pending orders inside the caller's transaction: orders -> EXPIRED, payments -> FAILED,
+        carts unlocked and reserved stock given back, one write per collection.
+        Returns the number of orders expired.
+        """
+        now = now or datetime.utcnow()
+        orders = [order for order in orders if order["status"] == OrderStatus.PENDING_PAYMENT.value]
+        if not orders:
+            return 0
+
+        expired = Order.expire_orders([order["id"] for order in orders], now, session=session)
+
+        payment_ids = [order["paymentId"] for order in orders if order.get("paymentId")]
+        if payment_ids:
+            Payment.fail_pending_payments(payment_ids, session=session)
+
+        Cart.unlock_carts([order["cartId"] for order in orders], session=session)
+
+        # Same release as CheckoutService.releaseReservedStock, summed over the batch
+        reserved_lines = [line for order in orders if order.get("inventoryReserved") for line in order["items"]]
+        if reserved_lines:
+            MenuItem.release_stock(reserved_lines, session=session)
+
+        for order in orders:
+            OrderEvents.publish("updated", {
+                **order,
+                "status": OrderStatus.EXPIRED.value,
+                "paymentStatus": PaymentStatus.FAILED.value,
+                "inventoryReserved": False,
+                "updatedAt": now
+            }, session=session)
+        return expired
+
+    @staticmethod
+    def sweep(batchSize: int = ORDER_EXPIRY_BATCH_SIZE, maxBatches: int = ORDER_EXPIRY_MAX_BATCHES, logger=None):
+        """
+        Expire every PENDING_PAYMENT order whose expireAt has passed, one transaction per batch.
+        A batch that fails (e.g. a write conflict with a payment completing) is left for the next run.
+        Returns the metrics of this run.
+        """
+        started = time.monotonic()
+        now = datetime.utcnow()
+        batch_sizes = []
+        expired_total = 0
+        failed_batches = 0
+        lag_seconds = None
+
+        for _ in range(maxBatches):
+            session = mongo.cx.start_session()
+            try:
+                with OrderEvents.publishAfterCommit(session), session.start_transaction():
+                    orders = Order.find_expired_pending_orders(now, batchSize, session=session)
+                    if orders and lag_seconds is None:
+                        oldest = datetime.fromisoformat(orders[0]["expireAt"]["$date"])
+                        lag_seconds = (now - oldest).total_seconds()
+                    expired = OrderExpiryService.expireOrders(orders, session, now)
+            except PyMongoError as e:
+                failed_batches += 1
+                if logger:
+                    logger.warning("OrderExpiryBatchFailed | reason=%s", str(e))
+                break
+            finally:
+                session.end_session()
+
+            batch_sizes.append(len(orders))
+            expired_total += expired
+            if len(orders) < batchSize:
+                break
+
+        duration = time.monotonic() - started
+        run = {
+            "lastRunAt": now.isoformat(),
+            "lastRunExpired": expired_total,
+            "lastRunBatchSizes": batch_sizes,
+            "lastLagSeconds": lag_seconds,
+            "lastDurationSeconds": round(duration, 3),
+            "lastOrdersPerSecond": round(expired_total / duration, 1) if duration > 0 else None,
+        }
+        try:
+            mongo.db.jobMetrics.update_one(
+                {"_id": _METRICS_ID},
+                {"$set": run, "$inc": {"runs": 1, "expiredTotal": expired_total, "failedBatches": failed_batches}},
+                upsert=True
+            )
+        except PyMongoError as e:
+            if logger:
+                logger.warning("OrderExpiryMetricsFailed | reason=%s", str(e))
+
+        if logger and (expired_total or failed_batches):
+            logger.info(
+                "OrderExpirySweepCompleted | expired=%s | batches=%s | lagSeconds=%s | ordersPerSecond=%s",
+                expired_total, batch_sizes, lag_seconds, run["lastOrdersPerSecond"]
+            )
+        return run
+
+    @staticmethod
+    def metrics():
+        """
+        Cumulative (runs, expiredTotal, failedBatches) and last-run sweeper metrics of all sweepers:
+        lastRunAt, lastRunExpired, lastRunBatchSizes, lastLagSeconds (age of the oldest expired order
+        found, i.e. how far behind the sweeper is), lastDurationSeconds, lastOrdersPerSecond.
+        Empty before the first sweep.
+        """
+        return mongo.db.jobMetrics.find_one({"_id": _METRICS_ID}, {"_id": 0}) or {}
+
+    @staticmethod
+    def startScheduler(app, intervalSeconds: int = ORDER_EXPIRY_INTERVAL_SECONDS):
+        """
+        Run sweep every intervalSeconds on an APScheduler background thread of this process.
+        For single-process servers; otherwise run `flask orders expiry-worker` once per deployment.
+        """
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        def job():
+            with app.app_context():
+                OrderExpiryService.sweep(logger=app.logger)
+
+        scheduler = BackgroundScheduler(daemon=True)
+        # coalesce/max_instances: a slow sweep is never run twice at the same time
+        scheduler.add_job(job, "interval", seconds=intervalSeconds, id="order_expiry", coalesce=True, max_instances=1)
+        scheduler.start()
+        return scheduler
@@ -1,8 +1,11 @@
 from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
 from app import mongo
 from app.core.exceptions import BusinessException
 from app.models.cart import Cart
 from app.models.order import Order, OrderStatus
+from app.services.order_events import OrderEvents
 from app.models.payment import Payment, PaymentMode, PaymentStatus
 
 class PaymentService:
@@ -55,7 +58,7 @@ class PaymentService:
         session = client.start_session()
 
         try:
-            with session.start_transaction():
+            with OrderEvents.publishAfterCommit(session), session.start_transaction():
                 
                 # Fetch payment
                 payment = Payment.find_payment_by_id(paymentId, session=session) 
@@ -112,5 +115,53 @@ class PaymentService:
                     "paymentId": paymentId
                 }
         finally:
-           session.end_session()         
-                   
\ No newline at end of file
+           session.end_session()
+
+    @staticmethod
+    def updatePaymentStatus(paymentId: str, paymentStatus: str):
+        """Set the payment status and its mirror on the order in one transaction, returns the updated order"""
+        client = mongo.cx
+        session = client.start_session()
+
+        try:
+            with OrderEvents.publishAfterCommit(session), session.start_transaction():
+                payment = Payment.update_and_fetch(paymentId, {"paymentStatus": paymentStatus}, session=session, projection={"orderId": 1})
+                if not payment:
+                    raise BusinessException(
+                        code="PAYMENT_NOT_FOUND",
+                        message="Payment not found"
+                    )
+                return Order.find_order_by_id(str(payment["orderId"]), session=session)
+        finally:
+            session.end_session()
+
+    @staticmethod
+    def syncOrderPaymentFields(batchSize: int = 500, dryRun: bool = False):
+        """
+        Backfill/repair paymentStatus and paymentMode on orders from their latest payment.
+        updatedAt is left alone so delta sync clients do not refetch every order.
+        Returns {"mismatched": n, "updated": n, "sample": [orderIds]}
+        """
+        mismatched = updated = 0
+        sample = []
+        batch = []
+
+        def flush():
+            nonlocal updated
+            if batch and not dryRun:
+                updated += mongo.db.orders.bulk_write(batch, ordered=False).modified_count
+            batch.clear()
+
+        for drift in Payment.find_order_mirror_drift():
+            mismatched += 1
+            if len(sample) < 10:
+                sample.append(str(drift["_id"]))
+            batch.append(UpdateOne(
+                {"_id": ObjectId(drift["_id"])},
+                {"$set": {"paymentStatus": drift["paymentStatus"], "paymentMode": drift["paymentMode"]}}
+            ))
+            if len(batch) >= batchSize:
+                flush()
+        flush()
+
+        return {"mismatched": mismatched, "updated": updated, "sample": sample}
@@ -0,0 +1,184 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from app.core.constansts import (
+    TWILIO_VERIFY_BREAKER_FAILURE_THRESHOLD,
+    TWILIO_VERIFY_BREAKER_RESET_SECONDS,
+    TWILIO_VERIFY_CONNECT_TIMEOUT_SECONDS,
+    TWILIO_VERIFY_MAX_RETRIES,
+    TWILIO_VERIFY_POOL_SIZE,
+    TWILIO_VERIFY_READ_TIMEOUT_SECONDS,
+)
+
+# Shared Twilio Verify client used by the user and restaurant phone auth routes.
+#
+# - One pooled requests.Session per process (keep-alive to verify.twilio.com)
+# - Connect/read timeouts on every call
+# - Retries only when Twilio cannot have acted on the request (connection not
+#   established, 429, 502/503/504), so an OTP is never sent twice
+# - A circuit breaker fails fast while Twilio keeps failing
+# TWILIO_VERIFY_TRANSPORT=fake swaps the HTTP transport for an in-process stand-in (load tests);
+# TWILIO_VERIFY_BASE_URL points the real transport at a local stub instead of Twilio.
+
+DEFAULT_BASE_URL = "https://verify.twilio.com/v2"
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+_RETRY_BACKOFF_BASE_SECONDS = 0.2
+_RETRY_BACKOFF_MAX_SECONDS = 2.0
+
+class TwilioVerifyError(Exception):
+    """Twilio Verify could not be reached (circuit open, timeout or connection failure)"""
+
+class RequestsTransport:
+    """POSTs form data to Twilio over a pooled keep-alive session"""
+
+    def __init__(self, account_sid, auth_token, base_url=DEFAULT_BASE_URL, pool_size=TWILIO_VERIFY_POOL_SIZE,
+                 connect_timeout=TWILIO_VERIFY_CONNECT_TIMEOUT_SECONDS, read_timeout=TWILIO_VERIFY_READ_TIMEOUT_SECONDS):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        # Retries are handled by TwilioVerifyClient, which knows which calls are safe to repeat
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def post(self, path, data):
+        """Returns (status_code, json body, headers)"""
+        response = self.session.post(f"{self.base_url}{path}", data=data, timeout=self.timeout)
+        try:
+            body = response.json()
+        except ValueError:
+            body = {"message": response.text}
+        return response.status_code, body, response.headers
+
+class FakeVerifyTransport:
+    """
+    In-process stand-in for Twilio Verify: every send succeeds and code_to_approve is approved.
+    latency_seconds simulates Twilio's response time.
+    """
+
+    def __init__(self, code_to_approve="123456", latency_seconds=0.0):
+        self.code_to_approve = code_to_approve
+        self.latency_seconds = latency_seconds
+
+    def post(self, path, data):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        if path.endswith("/VerificationCheck"):
+            status = "approved" if data.get("Code") == self.code_to_approve else "pending"
+            return 200, {"to": data.get("To"), "status": status, "valid": status == "approved"}, {}
+        return 201, {"to": data.get("To"), "channel": data.get("Channel"), "status": "pending"}, {}
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, lets one trial call through after reset_seconds"""
+
+    def __init__(self, failure_threshold=TWILIO_VERIFY_BREAKER_FAILURE_THRESHOLD, reset_seconds=TWILIO_VERIFY_BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._trial_in_flight or time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            # Half-open: a single trial call decides whether to close again
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+class TwilioVerifyClient:
+
+    def __init__(self, service_sid, transport, max_retries=TWILIO_VERIFY_MAX_RETRIES, breaker=None):
+        self.service_sid = service_sid
+        self.transport = transport
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+
+    def sendVerification(self, phone: str, channel: str = "sms"):
+        """Start a verification, returns (status_code, body); Twilio answers 201 on success"""
+        return self._post(f"/Services/{self.service_sid}/Verifications", {"To": phone, "Channel": channel})
+
+    def checkVerification(self, phone: str, code: str):
+        """Check a code, returns (status_code, body); the code is valid when body["status"] is approved"""
+        return self._post(f"/Services/{self.service_sid}/VerificationCheck", {"To": phone, "Code": code})
+
+    def _post(self, path, data):
+        if not self.breaker.allow():
+            raise TwilioVerifyError("Twilio Verify circuit is open")
+
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                status_code, body, headers = self.transport.post(path, data)
+            except requests.exceptions.RequestException as e:
+                if last_attempt or not _never_sent(e):
+                    # Read timeouts and dropped responses are not repeated: Twilio may have acted
+                    self.breaker.record_failure()
+                    raise TwilioVerifyError(f"Twilio Verify request failed: {e}") from e
+            except Exception:
+                self.breaker.record_failure()
+                raise
+            else:
+                if status_code not in RETRYABLE_STATUS_CODES or last_attempt:
+                    if status_code >= 500:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    return status_code, body
+                retry_after = headers.get("Retry-After", "")
+                if retry_after.isdigit() and int(retry_after) <= _RETRY_BACKOFF_MAX_SECONDS:
+                    time.sleep(int(retry_after))
+                    continue
+            # Exponential backoff with full jitter
+            time.sleep(random.uniform(0, min(_RETRY_BACKOFF_MAX_SECONDS, _RETRY_BACKOFF_BASE_SECONDS * 2 ** attempt)))
+
+def _never_sent(error):
+    """True when the connection was never established, so the request cannot have reached Twilio"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_twilio_verify_client():
+    """Process-wide client configured from the environment (TWILIO_SID, TWILIO_AUTH_TOKEN, VERIFY_SERVICE_SID)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if os.getenv("TWILIO_VERIFY_TRANSPORT", "requests").lower() == "fake":
+                    transport = FakeVerifyTransport(
+                        code_to_approve=os.getenv("TWILIO_FAKE_CODE", "123456"),
+                        latency_seconds=float(os.getenv("TWILIO_FAKE_LATENCY_MS", "0")) / 1000
+                    )
+                else:
+                    transport = RequestsTransport(
+                        os.getenv("TWILIO_SID"),
+                        os.getenv("TWILIO_AUTH_TOKEN"),
+                        base_url=os.getenv("TWILIO_VERIFY_BASE_URL", DEFAULT_BASE_URL)
+                    )
+                _client = TwilioVerifyClient(os.getenv("VERIFY_SERVICE_SID"), transport)
+    return _client
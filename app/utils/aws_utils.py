@@ -1,90 +1,230 @@
+import hashlib
 import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from werkzeug.utils import secure_filename
 from botocore.exceptions import ClientError, NoCredentialsError
 import boto3
+from boto3.s3.transfer import TransferConfig
 from urllib.parse import urlparse
+from app.core.constansts import (
+    IMAGE_VARIANT_SIZES,
+    S3_MAX_IMAGE_BYTES,
+    S3_MULTIPART_THRESHOLD_BYTES,
+    S3_PRESIGNED_POST_EXPIRES_SECONDS,
+    S3_UPLOAD_WORKERS,
+)
 
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 MAX_IMAGES = 3
+# Resized copies of an image live under <item folder>/variants/<filename>/<variant>.webp
+VARIANTS_FOLDER = "variants"
+
+# Images are uploaded in parallel across files, so each transfer is a single
+# PutObject on the calling pool thread (no multipart, no per-file thread pool)
+S3_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD_BYTES,
+    use_threads=False
+)
+HASH_CHUNK_BYTES = 1024 * 1024
+# Shared by all requests, so concurrent uploads stay bounded per process
+_upload_executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_WORKERS, thread_name_prefix="s3-upload")
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def upload_images_to_s3(s3_client, bucket_name, region, images, restaurant_id, folder, item_id, sub_folder=""):
+def image_prefix(folder, restaurant_id, item_id, sub_folder=""):
+    """S3 prefix ("folder") holding the images of one item"""
+    if sub_folder:
+        return f"{folder.rstrip('/')}/{restaurant_id}/{sub_folder.rstrip('/')}/{item_id}/"
+    return f"{folder.rstrip('/')}/{restaurant_id}/{item_id}/"
+
+def s3_url(bucket_name, region, key):
+    return f"https://{bucket_name}.s3.{region}.amazonaws.com/{key}"
+
+def variant_folder(source_key):
+    """Folder holding the resized WebP variants of source_key"""
+    folder, _, filename = source_key.rpartition("/")
+    return f"{folder}/{VARIANTS_FOLDER}/{filename}/"
+
+def variant_key(source_key, variant):
+    """Deterministic key of one resized WebP variant of source_key"""
+    return f"{variant_folder(source_key)}{variant}.webp"
+
+def is_variant_key(key):
+    return f"/{VARIANTS_FOLDER}/" in key
+
+def content_hash(image, chunk_size=HASH_CHUNK_BYTES):
+    """SHA-256 hex digest of a file, read in chunks; the file is rewound afterwards"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: image.read(chunk_size), b""):
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
+
+def content_key(prefix, image, sha256):
+    """Content-addressed key: the same bytes always map to the same object under prefix"""
+    # Same parse as allowed_file (secure_filename drops non-ASCII names down to the bare extension)
+    ext = image.filename.rsplit(".", 1)[1].lower()
+    return f"{prefix}{sha256}.{ext}"
+
+def presigned_key(prefix, filename):
+    """
+    Key for a presigned upload: a random id plus the file's extension. Like content_key, every
+    upload gets a key of its own, so presigning never overwrites a live (long-cached) object;
+    the client filename only supplies the extension.
     """
-    Reusable helper to upload one or more images to AWS S3.
+    ext = filename.rsplit(".", 1)[1].lower()
+    return f"{prefix}{uuid.uuid4().hex}.{ext}"
+
+def _upload_one(s3_client, bucket_name, region, image, s3_key, exists=False):
+    """Upload one file (skipped when the same content is already stored), returns its per-file result"""
+    result = {"filename": image.filename, "key": s3_key, "url": None, "error": None, "skipped": exists}
+    if exists:
+        result["url"] = s3_url(bucket_name, region, s3_key)
+        return result
+    try:
+        s3_client.upload_fileobj(
+            image,
+            bucket_name,
+            s3_key,
+            ExtraArgs={"ContentType": image.content_type},
+            Config=S3_TRANSFER_CONFIG
+        )
+        result["url"] = s3_url(bucket_name, region, s3_key)
+    except (NoCredentialsError, ClientError) as e:
+        result["error"] = str(e)
+    return result
+
+def upload_image_batch(s3_client, bucket_name, region, images, restaurant_id, folder, item_id, sub_folder="", rollback_on_failure=True, image_bytes=None):
+    """
+    Upload up to MAX_IMAGES images of one item concurrently.
+    All files are validated before S3 is touched; when the prefix already holds
+    MAX_IMAGES images they are replaced (removed with a single delete_objects call).
+    Keys are content-addressed (<sha256>.<ext>), so a file whose content is already
+    stored under the prefix is not uploaded again (its result has "skipped": True).
+    image_bytes: contents of images already read by the caller (hashed instead of re-reading the files)
     Returns:
-      uploaded_urls: list of only newly uploaded image URLs
-      existing_urls: list of existing image URLs (if needed)
-      error_message: str or None
+      {
+        "uploaded_urls": URLs of the newly uploaded images, in request order,
+        "existing_urls": URLs found under the prefix before the upload,
+        "results": [{"filename", "key", "url", "error", "skipped"}] per file,
+        "error": str or None
+      }
+      With rollback_on_failure, a partial upload is deleted again and uploaded_urls is empty.
     """
-    uploaded_urls = []
-    existing_urls = []
+    batch = {"uploaded_urls": [], "existing_urls": [], "results": [], "error": None}
+
+    # 1️⃣ Validate everything up front
+    if len(images) > MAX_IMAGES:
+        batch["error"] = f"Maximum {MAX_IMAGES} images are allowed."
+        return batch
+    for image in images:
+        if image.filename == "":
+            batch["error"] = "One of the image files has no filename."
+            return batch
+        if not allowed_file(image.filename):
+            batch["error"] = f"Unsupported file type: {image.filename}"
+            return batch
+
+    # 2️⃣ Hash the files to get their keys (on the pool, side by side, when read here)
+    prefix = image_prefix(folder, restaurant_id, item_id, sub_folder)
+    if image_bytes is not None:
+        hashes = [hashlib.sha256(data).hexdigest() for data in image_bytes]
+    else:
+        hashes = list(_upload_executor.map(content_hash, images))
+    new_keys = [content_key(prefix, image, sha256) for image, sha256 in zip(images, hashes)]
 
     try:
-        # 1️⃣ Determine base path and list existing images
-        if sub_folder:
-            prefix = f"{folder.rstrip('/')}/{restaurant_id}/{sub_folder.rstrip('/')}/{item_id}/"
-        else:
-            prefix = f"{folder.rstrip('/')}/{restaurant_id}/{item_id}/"
-
+        # 3️⃣ List existing images (this also tells which contents are already stored)
         existing_objs = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
-
-        if "Contents" in existing_objs:
-            for obj in existing_objs["Contents"]:
-                key = obj["Key"]
-                file_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{key}"
-                existing_urls.append(file_url)
-
-        existing_count = len(existing_urls)
-        print(f"Found {existing_count} existing images for item {item_id}")
-
-        # 2️⃣ Check max image count rule
-        if len(images) > MAX_IMAGES:
-            return None, None, f"Maximum {MAX_IMAGES} images are allowed."
-
-        # 3️⃣ If >= 3 → clear old images first
-        if existing_count >= 3:
-            print(f"Replacing {existing_count} existing images...")
-            for obj in existing_objs.get("Contents", []):
-                s3_client.delete_object(Bucket=bucket_name, Key=obj["Key"])
-            existing_count = 0  # reset count after clearing
-
-        # 4️⃣ Compute starting index for new images
-        start_index = existing_count + 1 if existing_count < 3 else 1
-
-        # 5️⃣ Upload new images
-        for index, image in enumerate(images):
-            if image.filename == "":
-                return None, None, "One of the image files has no filename."
-            if not allowed_file(image.filename):
-                return None, None, f"Unsupported file type: {image.filename}"
-
-            filename = secure_filename(image.filename)
-            # file_ext = filename.rsplit('.', 1)[1].lower()
-            # filename = f"image_{start_index + index}.{file_ext}"
-
-            if sub_folder:
-                s3_key = f"{folder.rstrip('/')}/{restaurant_id}/{sub_folder.rstrip('/')}/{item_id}/{filename}"
-            else:
-                s3_key = f"{folder.rstrip('/')}/{restaurant_id}/{item_id}/{filename}"
-
-            s3_client.upload_fileobj(
-                image,
-                bucket_name,
-                s3_key,
-                ExtraArgs={"ContentType": image.content_type}
+        existing_keys = [obj["Key"] for obj in existing_objs.get("Contents", [])]
+        # Variants do not count as images
+        image_keys = [key for key in existing_keys if not is_variant_key(key)]
+        batch["existing_urls"] = [s3_url(bucket_name, region, key) for key in image_keys]
+
+        # 4️⃣ Full → clear old images (and their variants) in one request, keeping re-sent ones
+        if len(image_keys) >= MAX_IMAGES:
+            kept = set(new_keys) & set(image_keys)
+            kept_folders = tuple(variant_folder(key) for key in kept)
+            stale_keys = [key for key in existing_keys if key not in kept and not key.startswith(kept_folders)]
+            if stale_keys:
+                s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={"Objects": [{"Key": key} for key in stale_keys], "Quiet": True}
+                )
+    except (NoCredentialsError, ClientError) as e:
+        print(f"S3 Upload Error: {e}")
+        batch["error"] = "Image upload failed. Please check server logs."
+        return batch
+
+    # 5️⃣ Upload concurrently on the shared bounded pool, each content once
+    stored = set(image_keys)
+    futures = {}
+    for image, s3_key in zip(images, new_keys):
+        if s3_key not in futures:
+            futures[s3_key] = _upload_executor.submit(_upload_one, s3_client, bucket_name, region, image, s3_key, s3_key in stored)
+    uploads = {s3_key: future.result() for s3_key, future in futures.items()}
+    batch["results"] = [{**uploads[s3_key], "filename": image.filename} for image, s3_key in zip(images, new_keys)]
+
+    failed = [result for result in uploads.values() if result["error"]]
+    if failed:
+        print(f"S3 Upload Error: {[result['error'] for result in failed]}")
+        batch["error"] = "Image upload failed. Please check server logs."
+        # Contents that were already stored before this batch are left alone
+        uploaded_keys = [result["key"] for result in uploads.values() if not result["error"] and not result["skipped"]]
+        if rollback_on_failure and uploaded_keys:
+            s3_client.delete_objects(
+                Bucket=bucket_name,
+                Delete={"Objects": [{"Key": key} for key in uploaded_keys], "Quiet": True}
             )
+            for result in batch["results"]:
+                if not result["error"] and not result["skipped"]:
+                    result["url"] = None
+                    result["error"] = "Rolled back, another image of the batch failed."
+            return batch
 
-            file_url = f"https://{bucket_name}.s3.{region}.amazonaws.com/{s3_key}"
-            uploaded_urls.append(file_url)
+    batch["uploaded_urls"] = list(dict.fromkeys(result["url"] for result in batch["results"] if not result["error"]))
+    return batch
 
-        # ✅ Return only newly uploaded images in `uploaded_urls`
-        return uploaded_urls, existing_urls, None
+def upload_images_to_s3(s3_client, bucket_name, region, images, restaurant_id, folder, item_id, sub_folder=""):
+    """
+    Reusable helper to upload one or more images to AWS S3 (see upload_image_batch).
+    Returns:
+      uploaded_urls: list of only newly uploaded image URLs
+      existing_urls: list of existing image URLs (if needed)
+      error_message: str or None
+    """
+    batch = upload_image_batch(s3_client, bucket_name, region, images, restaurant_id, folder, item_id, sub_folder)
+    if batch["error"]:
+        return None, None, batch["error"]
+    return batch["uploaded_urls"], batch["existing_urls"], None
 
-    except (NoCredentialsError, ClientError) as e:
-        print(f"S3 Upload Error: {e}")
-        return None, None, "Image upload failed. Please check server logs."
+def presign_image_upload(s3_client, bucket_name, s3_key, content_type, expires_in=S3_PRESIGNED_POST_EXPIRES_SECONDS):
+    """
+    Presigned POST policy for uploading one image straight from the client to s3_key.
+    The policy pins the key and Content-Type and caps the size at S3_MAX_IMAGE_BYTES.
+    Returns {"url", "fields"}: POST the fields plus the file (last) as multipart/form-data to url.
+    """
+    return s3_client.generate_presigned_post(
+        Bucket=bucket_name,
+        Key=s3_key,
+        Fields={"Content-Type": content_type},
+        Conditions=[
+            {"Content-Type": content_type},
+            ["content-length-range", 1, S3_MAX_IMAGE_BYTES]
+        ],
+        ExpiresIn=expires_in
+    )
+
+def find_uploaded_image(s3_client, bucket_name, s3_key):
+    """head_object of an uploaded image, None if there is no such object"""
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=s3_key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
 
 def delete_s3_folder(s3_client, bucket_name: str, folder_prefix: str) -> dict:
     """
@@ -229,6 +369,9 @@ def delete_images_from_s3(image_urls: list[str], s3_client=None) -> dict:
                 key = parsed.path.lstrip('/').split('?')[0]
 
                 objects_by_bucket.setdefault(bucket, []).append({'Key': key})
+                # Resized variants go with their image
+                if not is_variant_key(key):
+                    objects_by_bucket[bucket].extend({'Key': variant_key(key, variant)} for variant in IMAGE_VARIANT_SIZES)
             except Exception as e:
                 errors.append(f"Invalid URL {url}: {e}")
 
@@ -0,0 +1,54 @@
+from datetime import datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, fall back to the stdlib provider
+    orjson = None
+
+def _default(value):
+    """Encode BSON types the same way serialize_doc does; defer everything else to Flask."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return DefaultJSONProvider.default(value)
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """
+    Stdlib JSON provider that also encodes ObjectId and datetime.
+    Used when orjson is not installed.
+    """
+    default = staticmethod(_default)
+
+class OrjsonProvider(MongoJSONProvider):
+    """
+    JSON provider backed by orjson.
+    - ObjectId -> str, datetime -> {"$date": ISO_STRING} (same shape as serialize_doc)
+    - Honours sort_keys, compact/debug indentation and a custom `default` like the default provider
+    """
+    def _options(self, sort_keys=None, indent=None):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if (self.sort_keys if sort_keys is None else sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._options(kwargs.get("sort_keys"), kwargs.get("indent"))
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent=indent))
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+def get_json_provider_class():
+    """Return the fastest available JSON provider class"""
+    return OrjsonProvider if orjson is not None else MongoJSONProvider
@@ -11,3 +11,45 @@ def flatten(d, parent_key="", sep="."):
         else:
             items.append((new_key, v))
     return dict(items)
+
+def find_page_with_total(collection, query, sort, skip=None, limit=None, page_query=None, count_mode="exact", count_cap=1000, projection=None):
+    """
+    Fetch one page of documents together with the total match count.
+    Two round trips: the page is a limited find on the sort index and the total a
+    count_documents on the same index (no documents are fetched for it). A single $facet
+    would save the round trip but runs the whole match set through the aggregation
+    pipeline on every page; here a keyset page N stays as cheap as page 1 and the count
+    can be capped ("estimate") or skipped ("none").
+    Args:
+        collection: pymongo collection
+        query: filter that defines the total
+        sort: list of (field, direction) tuples
+        skip, limit: page window
+        page_query: extra filter applied to the page only (e.g. a keyset cursor)
+        count_mode:
+            "exact": count every matching document
+            "estimate": count stops after count_cap documents (never cutting off the page),
+                        skipped entirely when page_query is given
+            "none": no count
+        projection: fields to return for the page documents
+    Returns:
+        (documents, total, total_is_exact) where total is None when not counted
+    """
+    full_query = {"$and": [query, page_query]} if page_query else query
+    documents = collection.find(full_query, projection).sort(sort)
+    if skip:
+        documents = documents.skip(skip)
+    if limit is not None:
+        documents = documents.limit(limit)
+    documents = list(documents)
+
+    if count_mode == "none" or (count_mode == "estimate" and page_query):
+        return documents, None, False
+
+    if count_mode == "estimate" and limit is not None:
+        # Stop counting at the cap, but past the end of this page
+        window = max(count_cap, (skip or 0) + limit + 1)
+        total = collection.count_documents(query, limit=window)
+        return documents, total, total < window
+
+    return documents, collection.count_documents(query), True
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+
+def encode_cursor(doc, sort_field):
+    """
+    Build an opaque keyset cursor from the last serialized document of a page.
+    Encodes (sort_field, id) so the next page can resume right after this document.
+    """
+    value = doc[sort_field]
+    if isinstance(value, dict) and "$date" in value:
+        value = value["$date"]
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, doc["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor into (datetime, ObjectId).
+    Raises ValueError if the cursor is malformed.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(value), ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId) as e:
+        raise ValueError("Invalid cursor") from e
+
+def keyset_condition(sort_field, cursor):
+    """Filter matching documents after the cursor for a (sort_field desc, _id desc) order"""
+    sort_value, doc_id = decode_cursor(cursor)
+    return {
+        "$or": [
+            {sort_field: {"$lt": sort_value}},
+            {sort_field: sort_value, "_id": {"$lt": doc_id}},
+        ]
+    }
+
+def apply_keyset_cursor(query, sort_field, cursor):
+    """
+    Restrict query to documents after the cursor for a (sort_field desc, _id desc) order.
+    Served from the {..., sort_field: -1, _id: -1} index, so page N costs the same as page 1.
+    """
+    return {"$and": [query, keyset_condition(sort_field, cursor)]}
+
+def next_page_cursor(items, page_size, sort_field):
+    """Cursor for the page after items, or None when items is the last page"""
+    if not items or len(items) < page_size:
+        return None
+    return encode_cursor(items[-1], sort_field)
+
+def format_watermark(value):
+    """Render a UTC datetime as the updatedSince watermark returned to clients"""
+    return value.isoformat()
+
+def parse_watermark(value):
+    """
+    Parse an updatedSince watermark into (naive UTC datetime, ObjectId or None).
+    A watermark is either a time (ISO 8601, UTC) or, for a truncated delta batch,
+    a keyset cursor (encode_cursor on updatedAt) naming the last change returned.
+    Raises ValueError if the watermark is malformed.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except AttributeError as e:
+        raise ValueError("Invalid watermark") from e
+    except ValueError:
+        try:
+            return decode_cursor(value)
+        except ValueError as e:
+            raise ValueError("Invalid watermark") from e
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed, None
+
+COUNT_MODES = ("exact", "estimate", "none")
+
+def build_pagination(page, page_size, items, sort_field, total_count, total_is_exact=True, cursor=None):
+    """
+    Build the pagination block returned by list endpoints.
+    has_next falls back to the keyset cursor when the total is unknown or estimated.
+    """
+    next_cursor = next_page_cursor(items, page_size, sort_field)
+    total_pages = (total_count + page_size - 1) // page_size if total_count is not None else None
+    if cursor or total_count is None or not total_is_exact:
+        has_next = next_cursor is not None
+    else:
+        has_next = page < total_pages
+    return {
+        "page": page,
+        "page_size": page_size,
+        "total_items": total_count,
+        "total_pages": total_pages,
+        "total_is_exact": total_count is not None and total_is_exact,
+        "has_next": has_next,
+        "has_prev": page > 1 or bool(cursor),
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,43 @@
+import copy
+from flask import g, has_request_context
+
+# Per-request memo of cheap lookups (existence checks) and identity map of documents,
+# stored on flask.g and dropped at teardown with the request.
+# Outside a request context every call goes to the loader.
+
+_MISSING = object()
+
+def _memo():
+    memo = g.get("_request_memo")
+    if memo is None:
+        memo = g._request_memo = {}
+    return memo
+
+def memoize_in_request(collection, key, loader):
+    """
+    Return the value memoized for (collection, key) in this request, calling loader() on the first use.
+    """
+    if not has_request_context():
+        return loader()
+    entries = _memo().setdefault(collection, {})
+    value = entries.get(key, _MISSING)
+    if value is _MISSING:
+        value = entries[key] = loader()
+    return value
+
+def forget_in_request(collection):
+    """Drop everything memoized for a collection in this request (call after writes to it)"""
+    if has_request_context():
+        _memo().pop(collection, None)
+
+def load_in_request(collection, key, loader, bypass=False):
+    """
+    Request-scoped identity map for documents.
+    The first load of (collection, key) in a request goes to loader(); later loads are served
+    from memory. Every caller gets its own deep copy, so mutating a result never leaks into the map.
+    Model writes drop the collection's entries through forget_in_request.
+    Set bypass for reads that must not be shared (transaction sessions, projections).
+    """
+    if bypass or not has_request_context():
+        return loader()
+    return copy.deepcopy(memoize_in_request(collection, ("doc",) + tuple(key), loader))
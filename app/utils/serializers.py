@@ -1,6 +1,9 @@
 from bson import ObjectId
 from datetime import datetime
 
+# Values of these exact types are already JSON-serializable and are returned as-is
+_ATOMIC_TYPES = frozenset({str, int, float, bool, type(None)})
+
 def serialize_object_id(value):
     """Convert ObjectId to string safely."""
     if isinstance(value, ObjectId):
@@ -15,28 +18,63 @@ def serialize_datetime(value):
 
 def serialize_doc(doc):
     """
-    Recursively convert MongoDB document into clean JSON-serializable dict.
+    Convert MongoDB document (or list of documents) into clean JSON-serializable data in one pass.
     - Converts _id -> id
     - Converts ObjectId to string
     - Converts datetime to { "$date": ISO_STRING }
+    Dispatches on the exact type of each value; subclasses (e.g. SON) take the slower isinstance path.
     """
-    if isinstance(doc, list):
-        return [serialize_doc(d) for d in doc]
+    doc_type = type(doc)
+    if doc_type is list:
+        return [_serialize_dict(d) if type(d) is dict else _serialize_value(d) for d in doc]
+    if doc_type is dict:
+        return _serialize_dict(doc)
+    return _serialize_value(doc)
 
-    if isinstance(doc, dict):
-        new_doc = {}
-        for k, v in doc.items():
+def _serialize_dict(doc):
+    new_doc = {}
+    for k, v in doc.items():
+        value_type = type(v)
+        if k == "_id":
             # Rename _id -> id
-            if k == "_id":
-                new_doc["id"] = serialize_object_id(v)
-            else:
-                new_doc[k] = serialize_doc(v)
-        return new_doc
+            new_doc["id"] = str(v) if value_type is ObjectId else serialize_object_id(v)
+        elif value_type in _ATOMIC_TYPES:
+            new_doc[k] = v
+        elif value_type is ObjectId:
+            new_doc[k] = str(v)
+        elif value_type is datetime:
+            new_doc[k] = {"$date": v.isoformat()}
+        elif value_type is dict:
+            new_doc[k] = _serialize_dict(v)
+        elif value_type is list:
+            new_doc[k] = [
+                item if type(item) in _ATOMIC_TYPES else _serialize_value(item)
+                for item in v
+            ]
+        else:
+            new_doc[k] = _serialize_value(v)
+    return new_doc
 
-    # Handle special types
-    if isinstance(doc, ObjectId):
-        return serialize_object_id(doc)
-    if isinstance(doc, datetime):
-        return serialize_datetime(doc)
+def _serialize_value(value):
+    value_type = type(value)
+    if value_type in _ATOMIC_TYPES:
+        return value
+    if value_type is dict:
+        return _serialize_dict(value)
+    if value_type is list:
+        return [_serialize_value(item) for item in value]
+    if value_type is ObjectId:
+        return str(value)
+    if value_type is datetime:
+        return {"$date": value.isoformat()}
 
-    return doc
+    # Subclasses of the handled types
+    if isinstance(value, dict):
+        return _serialize_dict(value)
+    if isinstance(value, list):
+        return [_serialize_value(item) for item in value]
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return serialize_datetime(value)
+    return value
@@ -0,0 +1,104 @@
+"""
+Measure the latency of /getAllOrders and /allItems with the stdlib JSON provider
+(before) vs the orjson provider (after).
+
+Each route runs end to end through the Flask test client: argument parsing, the
+route code, serialize_doc on the page and the JSON response. The model layer is
+stubbed to return a page of order / menu item shaped documents, so no MongoDB is
+needed and the difference between the two runs is the response encoding.
+
+Usage:
+    python benchmarks/json_provider_benchmark.py --page-size 100 --repeat 200
+"""
+import argparse
+import os
+import sys
+import timeit
+from unittest import mock
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.dirname(__file__))
+# Importing the app package loads the Firebase service account; nothing here talks to Firebase
+mock.patch("firebase_admin.credentials.Certificate").start()
+
+from app.models.menu_item import MenuItem
+from app.models.order import Order
+from app.models.payment import Payment
+from app.models.restaurant import Restaurant
+from app.models.user import User
+from app.routes.restaurant.restaurant_order_routes import restaurant_order_bp
+from app.routes.user.menu_item_routes import user_menu_item_bp
+from app.utils.json_provider import OrjsonProvider, orjson
+from app.utils.serializers import serialize_doc
+from serializer_benchmark import make_menu_item, make_order
+
+RESTAURANT_ID = "restaurant-1"
+
+def stub_models(page_size):
+    """Patch the finders the two routes call with in-memory pages (fresh copies per call, like the real finders)"""
+    orders = [{**make_order(), "restaurantId": RESTAURANT_ID, "paymentStatus": "PENDING"} for _ in range(page_size)]
+    items = [{**make_menu_item(), "restaurantId": RESTAURANT_ID} for _ in range(page_size)]
+    patches = [
+        mock.patch.object(Restaurant, "exists", staticmethod(lambda restaurant_id: True)),
+        mock.patch.object(Payment, "find_payments_by_orderIds", staticmethod(lambda order_ids: [])),
+        mock.patch.object(
+            Order, "find_orders_page_by_restaurantId",
+            staticmethod(lambda *args, **kwargs: (serialize_doc(orders), 1000, True))
+        ),
+        mock.patch.object(User, "find_by_id", staticmethod(lambda *args, **kwargs: {"address": {"city": "Pune"}})),
+        mock.patch.object(
+            Restaurant, "find_by_city",
+            staticmethod(lambda *args, **kwargs: [{"_id": RESTAURANT_ID, "name": "Spice Route"}])
+        ),
+        mock.patch.object(
+            MenuItem, "find_items_page_by_restaurant_ids",
+            staticmethod(lambda *args, **kwargs: (serialize_doc(items), 1000, True))
+        ),
+    ]
+    for patch in patches:
+        patch.start()
+
+def make_app(provider_class):
+    """Bare Flask app with the two blueprints mounted as in create_app"""
+    app = Flask(__name__)
+    app.json = provider_class(app)
+    app.register_blueprint(restaurant_order_bp, url_prefix="/api/restaurants/order")
+    app.register_blueprint(user_menu_item_bp, url_prefix="/api/users/menuItems")
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if orjson is None:
+        raise SystemExit("orjson is not installed; nothing to compare")
+
+    stub_models(args.page_size)
+    providers = {
+        "stdlib": DefaultJSONProvider,
+        "orjson": OrjsonProvider,
+    }
+    routes = {
+        "/getAllOrders": f"/api/restaurants/order/getAllOrders?restaurant_id={RESTAURANT_ID}&status=PENDING_PAYMENT&page_size={args.page_size}",
+        "/allItems": f"/api/users/menuItems/allItems?user_id=user-1&page_size={args.page_size}",
+    }
+
+    for route, url in routes.items():
+        timings = {}
+        for label, provider_class in providers.items():
+            client = make_app(provider_class).test_client()
+            response = client.get(url)
+            if response.status_code != 200:
+                raise SystemExit(f"{route} answered {response.status_code}: {response.get_data(as_text=True)}")
+            timings[label] = min(timeit.repeat(lambda: client.get(url), number=args.repeat, repeat=5)) / args.repeat
+        print(
+            f"{route:14s} page of {args.page_size}: stdlib {timings['stdlib'] * 1e6:8.1f} us | "
+            f"orjson {timings['orjson'] * 1e6:8.1f} us | speedup x{timings['stdlib'] / timings['orjson']:.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
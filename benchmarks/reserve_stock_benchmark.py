@@ -0,0 +1,117 @@
+"""
+Measure how many items per second checkout can reserve under contention.
+
+Many threads reserve stock for carts drawn from a small set of hot menu items
+by calling MenuItem.reserve_stock itself (one unordered bulk_write of guarded
+$inc operations) inside a transaction, aborted when a line is short, as
+CheckoutService.placeOrder does.
+
+Needs a replica set (transactions). Uses a scratch database that is dropped at the end.
+
+Usage:
+    MONGO_URI=mongodb://localhost:27017/?replicaSet=rs0 python benchmarks/reserve_stock_benchmark.py \
+        --threads 16 --checkouts 2000 --items 20 --hot-items 5 --stock 100000
+"""
+import argparse
+import importlib.util
+import os
+import random
+import sys
+import threading
+import time
+import types
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Load the model directly so the Foodylicious app (and its credentials) is not initialized;
+# the placeholder app package hands the model the scratch database as app.mongo
+def _load(name, *path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(__file__), "..", *path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+for _package in ("app", "app.core", "app.utils", "app.models"):
+    sys.modules.setdefault(_package, types.ModuleType(_package)).__path__ = []
+_load("app.core.constansts", "app", "core", "constansts.py")
+for _module in ("mongo_utils", "pagination", "request_cache", "serializers"):
+    _load(f"app.utils.{_module}", "app", "utils", f"{_module}.py")
+
+def load_menu_item_model(db):
+    sys.modules["app"].mongo = types.SimpleNamespace(db=db)
+    return _load("app.models.menu_item", "app", "models", "menu_item.py").MenuItem
+
+def reserve(MenuItem, client, lines):
+    """Reserve stock for lines in one transaction. Returns 'ok', 'out_of_stock' or 'conflict'"""
+    with client.start_session() as session:
+        try:
+            with session.start_transaction():
+                if not MenuItem.reserve_stock(lines, session=session):
+                    session.abort_transaction()
+                    return "out_of_stock"
+        except PyMongoError:
+            # WriteConflict / TransientTransactionError from a concurrent checkout on the same item
+            return "conflict"
+    return "ok"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--checkouts", type=int, default=2000, help="Total checkouts across all threads")
+    parser.add_argument("--items", type=int, default=20, help="Menu items in the restaurant")
+    parser.add_argument("--hot-items", type=int, default=5, help="Items every cart contains one of")
+    parser.add_argument("--lines", type=int, default=3, help="Lines per cart")
+    parser.add_argument("--stock", type=int, default=100000, help="Initial availableQuantity per item")
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/?replicaSet=rs0"))
+    db = client["reserve_stock_benchmark"]
+    db.menuItems.drop()
+    item_ids = db.menuItems.insert_many(
+        [{"name": f"item-{i}", "availableQuantity": args.stock} for i in range(args.items)]
+    ).inserted_ids
+    hot_ids = item_ids[:args.hot_items]
+    MenuItem = load_menu_item_model(db)
+
+    counts = {"ok": 0, "out_of_stock": 0, "conflict": 0}
+    reserved_units = [0]
+    lock = threading.Lock()
+    per_thread = args.checkouts // args.threads
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(per_thread):
+            # Cart lines as stored on carts/orders; reserve_stock sums repeated items
+            lines = [{"menuItemId": str(rng.choice(hot_ids)), "quantity": rng.randint(1, 3)}]
+            lines += [
+                {"menuItemId": str(menuItemId), "quantity": rng.randint(1, 3)}
+                for menuItemId in rng.sample(item_ids, args.lines - 1)
+            ]
+            outcome = reserve(MenuItem, client, lines)
+            with lock:
+                counts[outcome] += 1
+                if outcome == "ok":
+                    reserved_units[0] += sum(line["quantity"] for line in lines)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    remaining = sum(item["availableQuantity"] for item in db.menuItems.find({}, {"availableQuantity": 1}))
+    total_checkouts = per_thread * args.threads
+    print(f"checkouts:          {total_checkouts} in {elapsed:.2f}s ({total_checkouts / elapsed:.0f}/s)")
+    print(f"reserved:           {counts['ok']} checkouts, {reserved_units[0]} items ({reserved_units[0] / elapsed:.0f} items/s)")
+    print(f"out of stock:       {counts['out_of_stock']}")
+    print(f"write conflicts:    {counts['conflict']}")
+    # Stock must be conserved: nothing oversold, nothing lost to aborted transactions
+    print(f"stock conserved:    {remaining + reserved_units[0] == args.stock * args.items}")
+
+    client.drop_database(db.name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compare the wall time of replacing a menu item's images the old way and with
+app.utils.aws_utils.upload_image_batch.
+
+  serial:   one delete_object per existing image, then one upload_fileobj per image
+            (the flow upload_images_to_s3 used before)
+  parallel: upload_image_batch itself: one delete_objects call, then the uploads
+            on its bounded thread pool (single PutObject each)
+  resent:   upload_image_batch with images already stored (content-addressed keys,
+            so nothing is uploaded again)
+
+Runs against an in-memory S3 (moto), so every S3 call gets an artificial
+--latency-ms delay to stand in for the round trip to AWS.
+
+Usage:
+    pip install -r requirements-dev.txt
+    python benchmarks/s3_upload_benchmark.py --rounds 20 --images 3 --size-kb 400 --latency-ms 40
+"""
+import argparse
+import importlib.util
+import io
+import os
+import statistics
+import sys
+import time
+import types
+import boto3
+from moto import mock_aws
+from werkzeug.datastructures import FileStorage
+
+BUCKET = "foody-licious-benchmark"
+REGION = "us-east-1"
+FOLDER, RESTAURANT_ID, SUB_FOLDER, ITEM_ID = "restaurants", "restaurant", "menu_items", "item"
+
+# Load the modules directly so the Foodylicious app (and its credentials) is not initialized
+def _load(name, *path):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(os.path.dirname(__file__), "..", *path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+for _package in ("app", "app.core", "app.utils"):
+    sys.modules.setdefault(_package, types.ModuleType(_package)).__path__ = []
+_load("app.core.constansts", "app", "core", "constansts.py")
+aws_utils = _load("app.utils.aws_utils", "app", "utils", "aws_utils.py")
+
+def file_storages(images):
+    return [FileStorage(io.BytesIO(data), filename=name, content_type="image/jpeg") for name, data in images]
+
+def serial_replace(s3, images):
+    prefix = aws_utils.image_prefix(FOLDER, RESTAURANT_ID, ITEM_ID, SUB_FOLDER)
+    existing = s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix).get("Contents", [])
+    for obj in existing:
+        s3.delete_object(Bucket=BUCKET, Key=obj["Key"])
+    for image in file_storages(images):
+        s3.upload_fileobj(image, BUCKET, prefix + image.filename, ExtraArgs={"ContentType": image.content_type})
+
+def batch_replace(s3, images):
+    batch = aws_utils.upload_image_batch(
+        s3, BUCKET, REGION, file_storages(images), RESTAURANT_ID, FOLDER, ITEM_ID, SUB_FOLDER,
+        image_bytes=[data for _, data in images]
+    )
+    if batch["error"]:
+        raise RuntimeError(batch["error"])
+    return batch
+
+def measure(label, rounds, replace):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        replace()
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"{label:<9} median {statistics.median(timings):8.1f} ms   p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.1f} ms")
+    return statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--images", type=int, default=3)
+    parser.add_argument("--size-kb", type=int, default=400)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+
+    with mock_aws():
+        s3 = boto3.client("s3", region_name=REGION)
+        s3.create_bucket(Bucket=BUCKET)
+
+        def add_latency(**kwargs):
+            time.sleep(args.latency_ms / 1000)
+        s3.meta.events.register("before-send.s3", add_latency)
+
+        def new_images():
+            # Fresh content every round, so content-addressed uploads are never skipped
+            return [(f"image_{i}.jpg", os.urandom(args.size_kb * 1024)) for i in range(args.images)]
+
+        print(f"{args.images} images x {args.size_kb} KB, {args.latency_ms:.0f} ms per S3 call, {args.rounds} rounds")
+
+        # Every round replaces a full prefix, like an item update with MAX_IMAGES images
+        serial_replace(s3, new_images())
+        serial = measure("serial", args.rounds, lambda: serial_replace(s3, new_images()))
+        parallel = measure("parallel", args.rounds, lambda: batch_replace(s3, new_images()))
+
+        images = new_images()
+        batch_replace(s3, images)
+        resent = measure("resent", args.rounds, lambda: batch_replace(s3, images))
+
+        print(f"speedup   {serial / parallel:.2f}x (parallel), {serial / resent:.2f}x (resent)")
+
+if __name__ == "__main__":
+    main()
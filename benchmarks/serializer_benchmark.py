@@ -0,0 +1,105 @@
+"""
+Micro-benchmark: serialize_doc (type-dispatch, one pass) vs the previous recursive implementation.
+
+Builds menu-item and order shaped documents (ObjectIds, datetimes, nested item lists)
+and times serializing a page of them with both implementations.
+
+Usage:
+    python benchmarks/serializer_benchmark.py --docs 100 --repeat 200
+"""
+import argparse
+import importlib.util
+import os
+import timeit
+from datetime import datetime
+from bson import ObjectId
+
+# Load app/utils/serializers.py directly so the Flask app (and its credentials) is not initialized
+_SERIALIZERS_PATH = os.path.join(os.path.dirname(__file__), "..", "app", "utils", "serializers.py")
+_spec = importlib.util.spec_from_file_location("serializers", _SERIALIZERS_PATH)
+serializers = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(serializers)
+
+def legacy_serialize_doc(doc):
+    """The recursive serialize_doc this benchmark compares against."""
+    if isinstance(doc, list):
+        return [legacy_serialize_doc(d) for d in doc]
+
+    if isinstance(doc, dict):
+        new_doc = {}
+        for k, v in doc.items():
+            if k == "_id":
+                new_doc["id"] = str(v) if isinstance(v, ObjectId) else v
+            else:
+                new_doc[k] = legacy_serialize_doc(v)
+        return new_doc
+
+    if isinstance(doc, ObjectId):
+        return str(doc)
+    if isinstance(doc, datetime):
+        return {"$date": doc.isoformat()}
+
+    return doc
+
+def make_menu_item():
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(),
+        "restaurantId": str(ObjectId()),
+        "name": "Paneer Butter Masala",
+        "description": "Cottage cheese in a rich tomato and butter gravy",
+        "price": 240,
+        "images": [f"https://example.com/menu_items/{i}.jpg" for i in range(3)],
+        "availableQuantity": 25,
+        "ingredients": ["paneer", "butter", "tomato", "cream", "spices"],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+def make_order():
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(),
+        "cartId": str(ObjectId()),
+        "restaurantId": str(ObjectId()),
+        "userId": str(ObjectId()),
+        "name": "Customer",
+        "address": "221B Baker Street",
+        "phone": "+910000000000",
+        "items": [
+            {"menuItemId": str(ObjectId()), "quantity": 2, "price": 120, "totalPrice": 240}
+            for _ in range(4)
+        ],
+        "totalCartAmount": 960,
+        "gstCharges": 48.0,
+        "platformFees": 5,
+        "deliveryCharges": 30,
+        "grandTotalAmount": 1043.0,
+        "status": "PENDING_PAYMENT",
+        "paymentId": str(ObjectId()),
+        "expireAt": now,
+        "createdAt": now,
+        "updatedAt": now,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100, help="Documents per page")
+    parser.add_argument("--repeat", type=int, default=200, help="Pages serialized per measurement")
+    args = parser.parse_args()
+
+    for label, factory in (("menuItems", make_menu_item), ("orders", make_order)):
+        page = [factory() for _ in range(args.docs)]
+        assert serializers.serialize_doc(page) == legacy_serialize_doc(page)
+
+        legacy = min(timeit.repeat(lambda: legacy_serialize_doc(page), number=args.repeat, repeat=5))
+        current = min(timeit.repeat(lambda: serializers.serialize_doc(page), number=args.repeat, repeat=5))
+        per_page_legacy = legacy / args.repeat * 1e6
+        per_page_current = current / args.repeat * 1e6
+        print(
+            f"{label:10s} page of {args.docs}: legacy {per_page_legacy:8.1f} us | "
+            f"serialize_doc {per_page_current:8.1f} us | speedup x{legacy / current:.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
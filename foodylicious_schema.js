@@ -208,6 +208,9 @@ db.createCollection("feedback", {
 });
 
 // Create indexes for better performance
+// NOTE: The indexes the API actually queries are declared in app/core/indexes.py
+// and created by the app on startup (or `flask indexes ensure`). The ones below
+// only cover this sample schema.
 db.users.createIndex({ "id": 1 }, { unique: true });
 db.users.createIndex({ "email": 1 }, { unique: true });
 db.users.createIndex({ "phone": 1 });
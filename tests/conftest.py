@@ -0,0 +1,5 @@
+from unittest import mock
+
+# Importing the app package loads the Firebase service account at import time;
+# the unit tests never talk to Firebase, so no credentials file is needed.
+mock.patch("firebase_admin.credentials.Certificate").start()
@@ -0,0 +1,124 @@
+import hashlib
+import io
+import boto3
+import pytest
+from moto import mock_aws
+from werkzeug.datastructures import FileStorage
+from app.utils.aws_utils import image_prefix, presigned_key, s3_url, upload_image_batch, variant_key
+
+BUCKET = "foody-licious-test"
+REGION = "us-east-1"
+PREFIX = image_prefix("restaurants", "restaurant-1", "item-1", "menu_items")
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with mock_aws():
+        client = boto3.client("s3", region_name=REGION)
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def image(data, filename="photo.jpg"):
+    return FileStorage(io.BytesIO(data), filename=filename, content_type="image/jpeg")
+
+
+def content_key(data, ext="jpg"):
+    return f"{PREFIX}{hashlib.sha256(data).hexdigest()}.{ext}"
+
+
+def stored_keys(s3):
+    return sorted(obj["Key"] for obj in s3.list_objects_v2(Bucket=BUCKET, Prefix=PREFIX).get("Contents", []))
+
+
+def upload(s3, images, **kwargs):
+    return upload_image_batch(s3, BUCKET, REGION, images, "restaurant-1", "restaurants", "item-1", "menu_items", **kwargs)
+
+
+def test_uploads_each_file_under_its_content_key(s3):
+    contents = [b"first", b"second", b"third"]
+
+    batch = upload(s3, [image(data, f"photo_{i}.jpg") for i, data in enumerate(contents)])
+
+    assert batch["error"] is None
+    assert batch["uploaded_urls"] == [s3_url(BUCKET, REGION, content_key(data)) for data in contents]
+    assert [(result["filename"], result["skipped"], result["error"]) for result in batch["results"]] == [
+        ("photo_0.jpg", False, None), ("photo_1.jpg", False, None), ("photo_2.jpg", False, None)
+    ]
+    assert stored_keys(s3) == sorted(content_key(data) for data in contents)
+    stored = s3.get_object(Bucket=BUCKET, Key=content_key(b"second"))
+    assert stored["Body"].read() == b"second"
+    assert stored["ContentType"] == "image/jpeg"
+
+
+def test_non_ascii_filename_keeps_its_extension(s3):
+    batch = upload(s3, [image(b"photo", "फोटो.JPG")])
+
+    assert batch["error"] is None
+    assert stored_keys(s3) == [content_key(b"photo")]
+
+
+def test_same_content_is_not_uploaded_again(s3):
+    upload(s3, [image(b"photo", "a.jpg")])
+
+    batch = upload(s3, [image(b"photo", "renamed.jpg"), image(b"photo", "copy.jpg")], image_bytes=[b"photo", b"photo"])
+
+    assert [result["skipped"] for result in batch["results"]] == [True, True]
+    assert batch["uploaded_urls"] == [s3_url(BUCKET, REGION, content_key(b"photo"))]
+    assert stored_keys(s3) == [content_key(b"photo")]
+
+
+def test_full_folder_is_replaced_but_resent_images_are_kept(s3):
+    upload(s3, [image(b"old-1"), image(b"old-2"), image(b"keep")])
+    s3.put_object(Bucket=BUCKET, Key=variant_key(content_key(b"keep"), "thumb"), Body=b"webp")
+    s3.put_object(Bucket=BUCKET, Key=variant_key(content_key(b"old-1"), "thumb"), Body=b"webp")
+
+    batch = upload(s3, [image(b"keep"), image(b"new")])
+
+    assert batch["error"] is None
+    assert [result["skipped"] for result in batch["results"]] == [True, False]
+    assert len(batch["existing_urls"]) == 3
+    assert stored_keys(s3) == sorted([
+        content_key(b"keep"),
+        content_key(b"new"),
+        variant_key(content_key(b"keep"), "thumb"),
+    ])
+
+
+def test_failed_upload_rolls_back_the_rest_of_the_batch(s3, monkeypatch):
+    upload(s3, [image(b"stored")])
+    real_upload = s3.upload_fileobj
+
+    def failing_upload(fileobj, bucket, key, **kwargs):
+        if key == content_key(b"broken"):
+            raise s3.exceptions.ClientError({"Error": {"Code": "500", "Message": "boom"}}, "PutObject")
+        return real_upload(fileobj, bucket, key, **kwargs)
+    monkeypatch.setattr(s3, "upload_fileobj", failing_upload)
+
+    batch = upload(s3, [image(b"stored"), image(b"fine"), image(b"broken")])
+
+    assert batch["error"] == "Image upload failed. Please check server logs."
+    assert batch["uploaded_urls"] == []
+    results = {result["key"]: result for result in batch["results"]}
+    assert results[content_key(b"fine")]["error"].startswith("Rolled back")
+    assert "boom" in results[content_key(b"broken")]["error"]
+    # Only what this batch wrote is removed; content stored before stays
+    assert stored_keys(s3) == [content_key(b"stored")]
+
+
+def test_unsupported_file_is_rejected_before_touching_s3(s3):
+    batch = upload(s3, [image(b"ok"), image(b"text", "notes.txt")])
+
+    assert batch["error"] == "Unsupported file type: notes.txt"
+    assert stored_keys(s3) == []
+
+
+def test_presigned_keys_are_fresh_and_ignore_the_filename():
+    first, second = presigned_key(PREFIX, "../photo.JPG"), presigned_key(PREFIX, "../photo.JPG")
+
+    assert first != second
+    for key in (first, second):
+        assert key.startswith(PREFIX) and key.endswith(".jpg")
+        assert "photo" not in key and "/" not in key[len(PREFIX):]
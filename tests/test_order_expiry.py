@@ -0,0 +1,119 @@
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta
+import pytest
+from app.core.exceptions import BusinessException
+from app.models.order import OrderStatus
+from app.services import checkout_service
+from app.services.checkout_service import CheckoutService
+from app.services.order_expiry_service import OrderExpiryService
+
+NOW = datetime(2026, 10, 17, 12, 0, 0)
+TICK = timedelta(milliseconds=1)
+
+
+def pending_order(expire_at, serialized=False):
+    return {
+        "id": "order-1",
+        "status": OrderStatus.PENDING_PAYMENT.value,
+        "cartId": "cart-1",
+        "expireAt": {"$date": expire_at.isoformat()} if serialized else expire_at,
+    }
+
+
+# ------------------------
+# OrderExpiryService.isExpired
+# ------------------------
+
+@pytest.mark.parametrize("serialized", [False, True], ids=["datetime", "$date"])
+@pytest.mark.parametrize("expire_at, expired", [
+    (NOW + TICK, False),
+    (NOW, True),
+    (NOW - TICK, True),
+], ids=["tick-before", "at-expireAt", "tick-after"])
+def test_is_expired_boundaries(expire_at, expired, serialized):
+    assert OrderExpiryService.isExpired(pending_order(expire_at, serialized), NOW) is expired
+
+
+def test_is_expired_only_for_pending_payment():
+    order = {**pending_order(NOW - TICK), "status": OrderStatus.CONFIRMED.value}
+    assert OrderExpiryService.isExpired(order, NOW) is False
+
+
+def test_is_expired_without_expire_at():
+    order = {**pending_order(NOW), "expireAt": None}
+    assert OrderExpiryService.isExpired(order, NOW) is False
+
+
+# ------------------------
+# CheckoutService.placeOrder: pending order found at checkout
+# ------------------------
+
+class FakeSession:
+    def start_transaction(self):
+        return nullcontext()
+
+    def end_session(self):
+        pass
+
+
+class FakeClient:
+    def start_session(self):
+        return FakeSession()
+
+
+@pytest.fixture
+def checkout(monkeypatch):
+    """placeOrder with every collection faked; records the inline expiry calls"""
+    calls = {"expired": []}
+    locked_cart = {"id": "cart-1", "status": "LOCKED", "items": [{"menuItemId": "item-1", "quantity": 1}], "totalAmount": 100}
+    unlocked_cart = {**locked_cart, "status": "ACTIVE"}
+    carts = {"current": locked_cart}
+
+    def expire_orders(orders, session, now=None):
+        calls["expired"].append((orders, now))
+        carts["current"] = unlocked_cart
+        return len(orders)
+
+    @contextmanager
+    def publish_after_commit(session):
+        yield
+
+    monkeypatch.setattr(checkout_service, "mongo", type("FakeMongo", (), {"cx": FakeClient()})())
+    monkeypatch.setattr(checkout_service.OrderEvents, "publishAfterCommit", publish_after_commit)
+    monkeypatch.setattr(checkout_service.OrderExpiryService, "expireOrders", expire_orders)
+    monkeypatch.setattr(checkout_service.Cart, "find_cart_by_userId", lambda userId, session=None: carts["current"])
+    monkeypatch.setattr(checkout_service.Cart, "lock_cart", lambda cartId, session=None: True)
+    monkeypatch.setattr(checkout_service.MenuItem, "reserve_stock", lambda items, session=None: True)
+    monkeypatch.setattr(checkout_service.PricingService, "calculate", lambda amount: {"grandTotalAmount": amount})
+    monkeypatch.setattr(checkout_service.Order, "create_from_cart", lambda **kwargs: "order-2")
+    monkeypatch.setattr(checkout_service.Order, "update_order", lambda **kwargs: True)
+    monkeypatch.setattr(checkout_service.PaymentService, "generatePaymentRequest", lambda orderId, session=None: {"paymentId": "payment-2"})
+
+    def place(order, now=NOW):
+        monkeypatch.setattr(checkout_service.Order, "find_pending_order_by_userId", lambda userId, session=None: order)
+        return CheckoutService.placeOrder("user-1", "Name", "Address", "+10000000000", now=now)
+
+    return place, calls
+
+
+@pytest.mark.parametrize("serialized", [False, True], ids=["datetime", "$date"])
+@pytest.mark.parametrize("expire_at", [NOW, NOW - TICK], ids=["at-expireAt", "tick-after"])
+def test_place_order_expires_stale_pending_order_inline(checkout, expire_at, serialized):
+    place, calls = checkout
+    order = pending_order(expire_at, serialized)
+
+    result = place(order)
+
+    assert calls["expired"] == [([order], NOW)]
+    assert result["orderId"] == "order-2"
+
+
+@pytest.mark.parametrize("serialized", [False, True], ids=["datetime", "$date"])
+def test_place_order_rejects_pending_order_one_tick_before_expiry(checkout, serialized):
+    place, calls = checkout
+
+    with pytest.raises(BusinessException) as error:
+        place(pending_order(NOW + TICK, serialized))
+
+    assert error.value.code == "OLD_ORDER_PENDING"
+    assert calls["expired"] == []